@@ -1,14 +1,34 @@
 """
 Camera streaming module for festival projects.
 
-This module provides functionality to stream from a camera, 
+This module provides functionality to stream from a camera,
 apply adjustments to footage, and make it available on a flask website.
+
+Submodules are imported on first access, so importing the package does
+not load Flask, OpenCV or the audio and keyboard libraries.
 """
+import importlib
 
-from .core import CameraStream
-from .utils.sound_utils import Sound
-from .utils.camera_utils import Camera
+__version__ = "0.1.0"
 
-from .filters import *
+# Names imported on first access, by module
+_lazy_names = {
+    "CameraStream": ".core",
+    "Sound": ".utils.sound_utils",
+    "Camera": ".utils.camera_utils",
+}
 
-__version__ = "0.1.0"
\ No newline at end of file
+def __getattr__(name):
+    module = _lazy_names.get(name)
+    if module is None:
+        if name.startswith("__"):
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+        # Filters and the filter helpers of `from .filters import *`
+        filters = importlib.import_module(".filters", __name__)
+        if name not in filters.__all__:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+        value = getattr(filters, name)
+    else:
+        value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -1,29 +1,27 @@
-from core import CameraStream
-from utils.sound_utils import Sound
-from filters import _get_filters_from_list, \
-                    horizontal_flip, \
-                    _filters, \
-                    EventsManager, \
-                    Event
+# Heavy modules (Flask, OpenCV, keyboard, sounddevice) are imported by the
+# commands that use them, so listing filters or testing the camera starts fast
 import argparse
-import webbrowser
 import time
 
-def _test_sound(sound) -> None:
+def _test_sound() -> None:
     """
     Test the camera stream.
     """
-    result = sound.test_sound()
+    from utils.sound_utils import Sound
+
+    result = Sound().test_sound()
     if result:
         print("Sound is working.")
     else:
         print("Sound is not working. Please check the sound connection.")
 
-def _test_camera(camera_stream) -> None:
+def _test_camera(source, capture) -> None:
     """
     Test the camera stream.
     """
-    result = camera_stream.camera.test_camera()
+    from utils.camera_utils import Camera
+
+    result = Camera(source, capture=capture).test_camera()
     if result:
         print("Camera is working.")
     else:
@@ -40,11 +38,80 @@ def _preview(camera_stream) -> None:
         print(e)
 
 
+def _list_filters() -> None:
+    """
+    List the filters and their descriptions, without importing them.
+    """
+    from filters import _describe_filters
+
+    print("Available filters:")
+    for name, settings in _describe_filters().items():
+        if not settings["registered"]:
+            continue
+        state = "" if settings["enabled"] else " (disabled)"
+        print(f"{name}{state}: {settings['description']}" if settings["description"]
+              else f"{name}{state}")
+
+
+def _probe(source, capture) -> None:
+    """
+    List the capture modes the camera accepts and their measured frame rate.
+    """
+    from utils import probe_modes
+
+    print(f"Probing camera {source}, this takes a few seconds per mode...")
+    try:
+        results = probe_modes(source, capture.backend)
+    except ValueError as e:
+        print(e)
+        return
+
+    print(f"{'requested':<24}{'actual':<24}{'measured':>12}")
+    for result in results:
+        requested, actual = result["requested"], result["actual"]
+        requested = f"{requested['fourcc']} {requested['width']}x{requested['height']}@{requested['fps']:g}"
+        actual = f"{actual['fourcc'] or '?'} {actual['width']}x{actual['height']}@{actual['fps']:g}"
+        note = "" if result["accepted"] else "  (not accepted)"
+        print(f"{requested:<24}{actual:<24}{result['measured_fps']:>8.1f} FPS{note}")
+
+
+def _start_audio(camera_stream, source):
+    """
+    Start the audio engine read by the audio-reactive filters.
+    """
+    from sounds import AudioEngine
+
+    if source == "default":
+        source = None
+    elif source.isdigit():
+        source = int(source)
+    engine = AudioEngine(source, metrics=camera_stream.metrics)
+    engine.start()
+    print(f"Analyzing audio from {'the default input' if source is None else source}.")
+    return engine
+
+
 def _stream(camera_stream, args):
-    camera_stream.start_stream(host=args.host, port=args.port)
+    audio = _start_audio(camera_stream, args.audio) if args.audio else None
+    try:
+        camera_stream.start_stream(
+            host=args.host,
+            port=args.port,
+            jpeg_quality=args.jpeg_quality,
+            jpeg_optimize=args.jpeg_optimize,
+            jpeg_progressive=args.jpeg_progressive,
+            output_width=args.output_width,
+            server=args.server,
+        )
+    except Exception:
+        if audio is not None:
+            audio.stop()
+        raise
 
     # Open browser if requested
     if args.open_browser:
+        import webbrowser
+
         url = f"http://{args.host}:{args.port}/"
         print(f"Opening browser to {url}")
         time.sleep(1)  # Give the server a moment to start
@@ -57,6 +124,8 @@ def _stream(camera_stream, args):
     except KeyboardInterrupt:
         print("\nStopping camera stream...")
         camera_stream.stop_stream()
+        if audio is not None:
+            audio.stop()
 
 
 def main() -> None:
@@ -64,6 +133,14 @@ def main() -> None:
     Main function to parse arguments and run the camera stream test.
     """
     parser = argparse.ArgumentParser(description="Camera Stream Test")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["stream", "bench", "probe"],
+        default="stream",
+        help="Run the camera stream, benchmark the frame pipeline, or list the capture "
+             "modes of the camera (default is stream)",
+    )
     parser.add_argument(
         "-i",
         "--camera_source",
@@ -101,6 +178,134 @@ def main() -> None:
         default=7277,
         help="Port number for the stream server (default is 7277)",
     )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=None,
+        help="Target frame rate of the stream (default is the camera frame rate)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["any", "v4l2", "dshow", "msmf", "avfoundation", "gstreamer", "ffmpeg"],
+        default=None,
+        help="OpenCV capture backend, e.g. v4l2 on Linux (default is the config, or any)",
+    )
+    parser.add_argument(
+        "--fourcc",
+        default=None,
+        help="Pixel format requested from the camera, e.g. MJPG for 1080p30 on USB cameras",
+    )
+    parser.add_argument("--width", type=int, default=None, help="Capture width in pixels")
+    parser.add_argument("--height", type=int, default=None, help="Capture height in pixels")
+    parser.add_argument(
+        "--capture-fps",
+        type=float,
+        default=None,
+        help="Frame rate requested from the camera (see --fps to pace the stream)",
+    )
+    parser.add_argument(
+        "--buffer-size",
+        type=int,
+        default=None,
+        help="Number of frames buffered by the camera driver, 1 for the lowest latency",
+    )
+    parser.add_argument(
+        "--passthrough",
+        action="store_true",
+        help="Relay the JPEG frames of an MJPG camera without re-encoding them while no filter is active",
+    )
+    parser.add_argument(
+        "--threaded-capture",
+        action="store_true",
+        help="Grab frames on a dedicated thread and always process the newest one",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Number of workers filtering frames concurrently (default is 0 to filter on the capture thread)",
+    )
+    parser.add_argument(
+        "--worker-type",
+        choices=["thread", "process"],
+        default="thread",
+        help="Use threads for OpenCV/NumPy filters or processes for pure-Python filters (default is thread)",
+    )
+    parser.add_argument(
+        "--server",
+        choices=["flask", "async"],
+        default="flask",
+        help="Use the threaded Flask server, or the aiohttp server for many viewers (default is flask)",
+    )
+    parser.add_argument(
+        "--jpeg-quality",
+        type=int,
+        default=None,
+        help="JPEG quality of the stream from 1 to 100 (default is the OpenCV default)",
+    )
+    parser.add_argument(
+        "--jpeg-optimize",
+        action="store_true",
+        help="Optimize the JPEG Huffman tables of the stream",
+    )
+    parser.add_argument(
+        "--jpeg-progressive",
+        action="store_true",
+        help="Encode the stream as progressive JPEGs",
+    )
+    parser.add_argument(
+        "--output-width",
+        type=int,
+        default=None,
+        help="Scale the stream down to this width (default is the capture width)",
+    )
+    parser.add_argument(
+        "--no-metrics",
+        action="store_true",
+        help="Do not time the stages of the frame pipeline for /metrics and /stats.json",
+    )
+    parser.add_argument(
+        "--no-watch-config",
+        action="store_true",
+        help="Do not reload filters_config.json when it changes while streaming",
+    )
+    parser.add_argument(
+        "--skip-unchanged",
+        nargs="?",
+        type=float,
+        const=3.0,
+        default=None,
+        metavar="THRESHOLD",
+        help="Reuse the filtered and encoded previous frame when no tile changed by more "
+             "than THRESHOLD gray levels, and only filter the changed tiles when the "
+             "filters allow it (default threshold is 3)",
+    )
+    parser.add_argument(
+        "--frame-sink",
+        nargs="?",
+        const="default",
+        default=None,
+        help="Also write the raw processed frames to a memory-mapped file for local "
+             "consumers such as TouchDesigner (default path is camera_stream.frames in "
+             "/dev/shm or the temporary directory)",
+    )
+    parser.add_argument(
+        "--replay-buffer",
+        type=float,
+        default=0,
+        help="Memory of the instant-replay buffer in MB, saved with POST /recorder/replay "
+             "(default is 0 to disable it)",
+    )
+    parser.add_argument(
+        "--replay-key",
+        default=None,
+        help="Key saving the replay buffer when pressed, e.g. r",
+    )
+    parser.add_argument(
+        "--record-dir",
+        default="recordings",
+        help="Directory of the replays and recordings (default is recordings)",
+    )
     parser.add_argument(
         "--open-browser",
         action="store_true",
@@ -110,37 +315,140 @@ def main() -> None:
 
     parser.add_argument("-T", "--test-sound", action="store_true", help="Test sound device")
     # Sound arguments
+    parser.add_argument(
+        "--audio",
+        nargs="?",
+        const="default",
+        default=None,
+        help="Analyze audio for audio-reactive filters while streaming: an input device "
+             "index or name, or the path of a WAV file (default is the default input)",
+    )
+
+    # Benchmark arguments
+    parser.add_argument(
+        "--bench-source",
+        default="synthetic",
+        help="Frame source of the benchmark: synthetic or the path of a video file (default is synthetic)",
+    )
+    parser.add_argument(
+        "--resolution",
+        nargs="+",
+        default=["720p"],
+        help="Resolutions to benchmark, e.g. 720p 1080p 1280x720 (default is 720p)",
+    )
+    parser.add_argument(
+        "--frames",
+        type=int,
+        default=200,
+        help="Number of frames timed per benchmark (default is 200)",
+    )
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=3,
+        help="Number of HTTP clients of the end-to-end benchmark, 0 to skip it (default is 3)",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=5.0,
+        help="Duration of the end-to-end benchmark in seconds (default is 5)",
+    )
+    parser.add_argument(
+        "--source-fps",
+        type=float,
+        default=None,
+        help="Frame rate of the benchmark source (default is as fast as possible)",
+    )
+    parser.add_argument(
+        "--hold-key",
+        default=None,
+        help="Key held down during the benchmark, e.g. space for zoom snapshots",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="Path of the JSON benchmark report",
+    )
     args = parser.parse_args()
 
+    if args.list_filters or args.filters == ['all']:
+        _list_filters()
+        return
+
+    if args.test_sound:
+        _test_sound()
+        return
+
+    from utils import CaptureSettings
+    from filters import _get_capture_config
+
+    source = int(args.camera_source) if str.isdigit(args.camera_source) else args.camera_source
+    capture = CaptureSettings.from_config(_get_capture_config()).with_overrides(
+        backend=args.backend,
+        fourcc=args.fourcc,
+        width=args.width,
+        height=args.height,
+        fps=args.capture_fps,
+        buffer_size=args.buffer_size,
+    )
+
+    if args.command == "probe":
+        _probe(source, capture)
+        return
+
+    if args.command == "bench":
+        from bench.suite import run as run_bench
+        run_bench(
+            source=args.bench_source,
+            resolutions=args.resolution,
+            filters=args.filters,
+            iterations=args.frames,
+            clients=args.clients,
+            duration=args.duration,
+            workers=args.workers,
+            source_fps=args.source_fps,
+            hold_key=args.hold_key,
+            output=args.output,
+        )
+        return
+
+    if args.test_camera:
+        _test_camera(source, capture)
+        return
+
+    from core import CameraStream
+    from filters import _get_filters_from_list, horizontal_flip, EventsManager
+
+    frame_sink = args.frame_sink
+    if frame_sink == "default":
+        from utils.frame_sink import DEFAULT_PATH as frame_sink
+
+    # Only the modes running the filters listen to the keyboard
     EventsManager()
     camera_stream = CameraStream(
-        source=(
-            int(args.camera_source)
-            if str.isdigit(args.camera_source)
-            else args.camera_source
-        )
+        source=source,
+        fps=args.fps,
+        workers=args.workers,
+        worker_type=args.worker_type,
+        metrics=not args.no_metrics,
+        threaded_capture=args.threaded_capture,
+        capture=capture,
+        passthrough=args.passthrough,
+        watch_config=not args.no_watch_config,
+        replay_bytes=int(args.replay_buffer * 1024 * 1024),
+        record_dir=args.record_dir,
+        replay_key=args.replay_key,
+        frame_sink=frame_sink,
+        change_threshold=args.skip_unchanged,
     )
-    sound = Sound()
 
     filters = [horizontal_flip]
     if args.filters:
-        if args.filters == ['all'] or args.list_filters:
-            print("Available filters:")
-            for name, _ in _filters():
-                print(name)
-            return
         filters.extend(_get_filters_from_list(args.filters))
         camera_stream.add_filter(filters)
 
-    if args.test_camera:
-        _test_camera(camera_stream)
-        return
-
-    if args.test_sound:
-        _test_sound(sound)
-        return
-
-
     if args.preview:
         try:
             camera_stream.camera.preview_camera()
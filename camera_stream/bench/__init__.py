@@ -0,0 +1,7 @@
+"""
+Benchmarks for the camera streaming module.
+
+The full suite runs with `python camera_stream bench`. Run the
+micro-benchmarks from the camera_stream directory, e.g.:
+    python -m bench.minimize_colors
+"""
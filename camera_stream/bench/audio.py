@@ -0,0 +1,70 @@
+"""
+Benchmark of the audio analysis per hop, on a WAV file or a generated
+signal, without an audio device.
+
+Usage (from the camera_stream directory):
+    python -m bench.audio [--wav song.wav] [--seconds 10]
+"""
+
+import argparse
+import time
+import numpy as np
+from sounds import AudioEngine
+
+SAMPLERATE = 44100
+
+
+def _generated_signal(seconds, bpm=120):
+    """
+    Generate a tone with a decaying kick drum on every beat.
+    """
+    t = np.arange(int(seconds * SAMPLERATE)) / SAMPLERATE
+    signal = 0.2 * np.sin(2 * np.pi * 440 * t)
+    kick = 0.8 * np.sin(2 * np.pi * 60 * t[:4000]) * np.exp(-t[:4000] * 30)
+    for beat in np.arange(0, seconds, 60 / bpm):
+        start = int(beat * SAMPLERATE)
+        end = min(start + len(kick), len(signal))
+        signal[start:end] += kick[:end - start]
+    return np.clip(signal, -1, 1).astype(np.float32)
+
+
+def run(wav=None, seconds=10.0, fft_sizes=(1024, 2048, 4096)):
+    """
+    Analyze the signal with every FFT size and print the results.
+
+    :param wav: Path of a WAV file (default is None for a generated signal at 120 BPM).
+    :param seconds: Duration of the generated signal.
+    :param fft_sizes: FFT sizes to compare.
+    :return: Dictionary of results per FFT size.
+    """
+    results = {}
+    for fft_size in fft_sizes:
+        engine = AudioEngine(wav, samplerate=SAMPLERATE, fft_size=fft_size, hop_size=512)
+        samples = engine.wav if engine.wav is not None else _generated_signal(seconds)
+        start = time.perf_counter()
+        hops = engine.process(samples)
+        elapsed = time.perf_counter() - start
+
+        duration = len(samples) / engine.samplerate
+        features = engine.features
+        results[fft_size] = {
+            "hops": hops,
+            "us_per_hop": elapsed * 1e6 / hops if hops else None,
+            "realtime_factor": duration / elapsed if elapsed else None,
+            "beats": features.beats,
+            "bpm": features.bpm,
+        }
+        bpm = f"{features.bpm:.1f}" if features.bpm else "-"
+        print(f"FFT {fft_size:>5}: {results[fft_size]['us_per_hop']:8.1f} us/hop, "
+              f"{results[fft_size]['realtime_factor']:7.0f}x real time, "
+              f"{features.beats} beats, {bpm} BPM")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audio analysis benchmark")
+    parser.add_argument("--wav", default=None, help="Path of a WAV file")
+    parser.add_argument("--seconds", type=float, default=10.0,
+                        help="Duration of the generated signal (default is 10)")
+    args = parser.parse_args()
+    run(args.wav, args.seconds)
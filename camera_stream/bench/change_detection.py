@@ -0,0 +1,93 @@
+"""
+Benchmark of the change detection of the filter pipeline on a static shot:
+frames that did not change, frames where a small region changed, and
+frames that changed whole, compared with filtering every frame.
+
+Usage (from the camera_stream directory):
+    python -m bench.change_detection [--resolution 720p 1080p] [--frames 100] [--threshold 3]
+"""
+
+import argparse
+import time
+import numpy as np
+from filters import FilterPipeline, horizontal_flip, minimize_colors, triangulate_effect
+from .sources import SyntheticCapture, parse_resolution
+
+# Filter sets: tiled, tiled with a mirrored region, and expensive
+FILTER_SETS = {
+    "minimize_colors": [minimize_colors],
+    "flip+minimize_colors": [horizontal_flip, minimize_colors],
+    "triangulate_effect": [triangulate_effect],
+}
+
+
+def _scenes(frame, frames):
+    """
+    Get the input frames of each scene: a static shot with camera noise, a
+    static shot with a small moving region, and a fully changing shot.
+    """
+    rng = np.random.default_rng(0)
+    height, width = frame.shape[:2]
+    noise = [np.clip(frame + rng.normal(0, 2, frame.shape), 0, 255).astype(np.uint8)
+             for _ in range(4)]
+    moving = []
+    for index in range(frames):
+        moved = noise[index % len(noise)].copy()
+        x = (index * 16) % (width - 128)
+        moved[height // 2:height // 2 + 96, x:x + 128] = 255
+        moving.append(moved)
+    changing = [np.roll(frame, index * 8, axis=1) for index in range(4)]
+    return {
+        "static": [noise[i % len(noise)] for i in range(frames)],
+        "moving region": moving,
+        "changing": [changing[i % len(changing)] for i in range(frames)],
+    }
+
+
+def _time_per_frame(pipeline, frames):
+    """
+    Run a pipeline on every frame and get the mean time per frame in ms.
+    """
+    pipeline(frames[0])  # Warm up and build the stages
+    start = time.perf_counter()
+    for frame in frames:
+        pipeline(frame)
+    return (time.perf_counter() - start) * 1000 / len(frames)
+
+
+def run(resolutions=("720p",), frames=100, threshold=3.0):
+    """
+    Run the benchmark at every resolution and print the results.
+
+    :param resolutions: Resolutions to benchmark, e.g. ("720p", "1080p").
+    :param frames: Number of frames per scene.
+    :param threshold: Change threshold of the pipeline.
+    :return: Dictionary of results per resolution, filter set and scene.
+    """
+    results = {}
+    for resolution in resolutions:
+        width, height = parse_resolution(resolution)
+        scenes = _scenes(SyntheticCapture(width, height).read()[1], frames)
+        results[resolution] = {}
+        print(f"{resolution}:")
+        for name, hooks in FILTER_SETS.items():
+            results[resolution][name] = {}
+            for scene, inputs in scenes.items():
+                full_ms = _time_per_frame(FilterPipeline(hooks), inputs)
+                detected_ms = _time_per_frame(FilterPipeline(hooks, change_threshold=threshold),
+                                              inputs)
+                results[resolution][name][scene] = {"full_ms": full_ms, "detected_ms": detected_ms}
+                print(f"  {name:<21} {scene:<14} every frame {full_ms:7.2f} ms, "
+                      f"with detection {detected_ms:7.2f} ms ({full_ms / detected_ms:.1f}x)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Change detection benchmark")
+    parser.add_argument("--resolution", nargs="+", default=["720p"],
+                        help="Resolutions, e.g. 720p 1080p (default is 720p)")
+    parser.add_argument("--frames", type=int, default=100, help="Frames per scene (default is 100)")
+    parser.add_argument("--threshold", type=float, default=3.0,
+                        help="Change threshold in gray levels (default is 3)")
+    args = parser.parse_args()
+    run(args.resolution, args.frames, args.threshold)
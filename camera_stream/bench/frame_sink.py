@@ -0,0 +1,188 @@
+"""
+Benchmark of the raw frame sink compared with the JPEG path, for a local
+consumer in another process that needs the pixels, like TouchDesigner.
+
+The JPEG consumer reads /frames and decodes each frame; the sink consumer
+maps the newest frame from the memory-mapped file. Both measure the
+latency from the capture time to having the pixels.
+
+Usage (from the camera_stream directory):
+    python -m bench.frame_sink [--resolution 720p 1080p] [--duration 5] [--source-fps 30]
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import tempfile
+import time
+import cv2
+import numpy as np
+from utils import EncodeSettings, FRAME_HEADER, FrameSink, SharedFrameReader
+from utils.jpeg_cache import encode_frame
+from .sources import SyntheticCapture, parse_resolution
+from .suite import _free_port, _summarize
+
+
+def _consume_sink(path, duration, results):
+    """
+    Consumer process of the sink: map the newest frame without copying it.
+    """
+    reader = SharedFrameReader(path)
+    reader.open()
+    latencies = []
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            shared = reader.read(wait=0.5)
+            if shared is None:
+                continue
+            shared.frame[0, 0]  # The pixels are readable in place
+            latencies.append((time.time() - shared.timestamp) * 1000)
+    finally:
+        reader.close()
+    results.put({"latency_ms": latencies, "retries": reader.retries})
+
+
+def _consume_jpeg(port, duration, results):
+    """
+    Consumer process of the JPEG path: read /frames, decode, and ack.
+    """
+    deadline = time.monotonic() + duration
+    while True:
+        try:
+            stream = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            stream.request("GET", "/frames")
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)  # The server is starting
+    response = stream.getresponse()
+    stream_id = response.getheader("X-Stream-Id")
+    acks = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+
+    latencies = []
+    try:
+        while time.monotonic() < deadline:
+            header = response.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            sequence, captured, _, length = FRAME_HEADER.unpack(header)
+            jpeg = response.read(length)
+            cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            latencies.append((time.time() - captured) * 1000)
+            acks.request("POST", f"/ack?stream={stream_id}&seq={sequence}")
+            acks.getresponse().read()
+    finally:
+        stream.close()
+        acks.close()
+    results.put({"latency_ms": latencies})
+
+
+def _run_consumer(target, args, width, height, source_fps, duration, sink_path=None):
+    """
+    Stream a synthetic source and run a consumer process against it.
+    """
+    from core import CameraStream
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    port = _free_port()
+    camera_stream = CameraStream(SyntheticCapture(width, height, source_fps), metrics=False,
+                                 watch_config=False, frame_sink=sink_path)
+    camera_stream.start_stream(host="127.0.0.1", port=port)
+    consumer = context.Process(target=target, args=(*args(port), duration, results))
+    consumer.start()
+    try:
+        result = results.get(timeout=duration + 30)
+    finally:
+        consumer.join(timeout=5)
+        camera_stream.stop_stream()
+
+    latencies = result.pop("latency_ms")
+    summary = _summarize(latencies)
+    summary["fps"] = len(latencies) / duration
+    summary.update(result)
+    return summary
+
+
+def _frame_cost(frame, iterations=50):
+    """
+    Per-frame cost of each path in one process, without the transport.
+    """
+    settings = EncodeSettings()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        jpeg = encode_frame(frame, settings)
+        cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    jpeg_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    path = os.path.join(tempfile.gettempdir(), f"bench_{os.getpid()}.frames")
+    sink = FrameSink(path=path, max_width=frame.shape[1], max_height=frame.shape[0])
+    sink.open()
+    reader = SharedFrameReader(path)
+    reader.open()
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            sink.write(frame)
+            reader.read()
+        sink_ms = (time.perf_counter() - start) * 1000 / iterations
+        start = time.perf_counter()
+        for _ in range(iterations):
+            sink.write(frame)
+            reader.read(copy=True)
+        sink_copy_ms = (time.perf_counter() - start) * 1000 / iterations
+    finally:
+        reader.close()
+        sink.close()
+    return {"jpeg_ms": jpeg_ms, "sink_ms": sink_ms, "sink_copy_ms": sink_copy_ms,
+            "jpeg_bytes": len(jpeg)}
+
+
+def run(resolutions=("720p",), duration=5.0, source_fps=30.0):
+    """
+    Run the benchmark at every resolution and print the results.
+
+    :param resolutions: Resolutions to benchmark, e.g. ("720p", "1080p").
+    :param duration: Duration of each end-to-end run in seconds.
+    :param source_fps: Frame rate of the synthetic source (None for as fast
+                       as possible).
+    :return: Dictionary of results per resolution.
+    """
+    results = {}
+    for resolution in resolutions:
+        width, height = parse_resolution(resolution)
+        frame = SyntheticCapture(width, height).read()[1]
+        sink_path = os.path.join(tempfile.gettempdir(), f"bench_sink_{os.getpid()}.frames")
+
+        cost = _frame_cost(frame)
+        jpeg = _run_consumer(_consume_jpeg, lambda port: (port,), width, height,
+                             source_fps, duration)
+        sink = _run_consumer(_consume_sink, lambda port: (sink_path,), width, height,
+                             source_fps, duration, sink_path)
+        results[resolution] = {"frame_cost": cost, "jpeg": jpeg, "sink": sink}
+
+        print(f"{resolution}: encode+decode {cost['jpeg_ms']:.2f} ms, "
+              f"sink write+map {cost['sink_ms']:.2f} ms "
+              f"(+copy {cost['sink_copy_ms']:.2f} ms) per frame")
+        for name, summary in (("JPEG /frames", jpeg), ("frame sink", sink)):
+            if not summary.get("frames"):
+                print(f"  {name:<13} no frames")
+                continue
+            print(f"  {name:<13} {summary['fps']:6.1f} FPS, latency p50 {summary['p50_ms']:6.2f} ms, "
+                  f"p95 {summary['p95_ms']:6.2f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Raw frame sink benchmark")
+    parser.add_argument("--resolution", nargs="+", default=["720p"],
+                        help="Resolutions, e.g. 720p 1080p (default is 720p)")
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="Duration of each end-to-end run in seconds (default is 5)")
+    parser.add_argument("--source-fps", type=float, default=30.0,
+                        help="Frame rate of the source, 0 for as fast as possible (default is 30)")
+    args = parser.parse_args()
+    run(args.resolution, args.duration, args.source_fps or None)
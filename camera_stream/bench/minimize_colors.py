@@ -0,0 +1,82 @@
+"""
+Benchmark of the lookup-table minimize_colors against the float version.
+
+Usage (from the camera_stream directory):
+    python -m bench.minimize_colors [--frames 200] [--color-levels 42]
+"""
+
+import argparse
+import time
+import numpy as np
+from filters.basic_filters import _color_lut, _apply_color_lut
+
+RESOLUTIONS = {
+    "720p": (720, 1280),
+    "1080p": (1080, 1920),
+}
+
+
+def _float_minimize_colors(frame, color_levels):
+    """
+    Previous implementation of minimize_colors, kept as the reference.
+    """
+    minimized_frame = np.floor(frame / color_levels) * color_levels
+    return np.uint8(minimized_frame)
+
+
+def _time_per_frame(func, frames):
+    """
+    Run a function on every frame and get the mean time per frame in ms.
+    """
+    func(frames[0])  # Warm up
+    start = time.perf_counter()
+    for frame in frames:
+        func(frame)
+    return (time.perf_counter() - start) * 1000 / len(frames)
+
+
+def run(frames=200, color_levels=42):
+    """
+    Run the benchmark at every resolution and print the results.
+
+    :param frames: Number of frames to process per implementation.
+    :param color_levels: Color levels passed to minimize_colors.
+    :return: Dictionary of results per resolution.
+    """
+    results = {}
+    lut = _color_lut(color_levels, color_levels, color_levels)
+    rng = np.random.default_rng(0)
+
+    for name, (height, width) in RESOLUTIONS.items():
+        # A few distinct frames so the caches are not always warm
+        inputs = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+        inputs = [inputs[i % len(inputs)] for i in range(frames)]
+        out = np.empty_like(inputs[0])
+
+        identical = all(
+            np.array_equal(_float_minimize_colors(frame, color_levels), _apply_color_lut(frame, lut))
+            for frame in inputs[:4]
+        )
+        float_ms = _time_per_frame(lambda f: _float_minimize_colors(f, color_levels), inputs)
+        lut_ms = _time_per_frame(lambda f: _apply_color_lut(f, lut, out), inputs)
+
+        results[name] = {
+            "float_ms": float_ms,
+            "lut_ms": lut_ms,
+            "speedup": float_ms / lut_ms,
+            "identical": identical,
+        }
+        print(
+            f"{name}: float {float_ms:.2f} ms, LUT {lut_ms:.2f} ms "
+            f"({float_ms / lut_ms:.1f}x), identical output: {identical}"
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="minimize_colors benchmark")
+    parser.add_argument("--frames", type=int, default=200, help="Frames per implementation")
+    parser.add_argument("--color-levels", type=int, default=42, help="Color levels")
+    args = parser.parse_args()
+    run(frames=args.frames, color_levels=args.color_levels)
@@ -0,0 +1,80 @@
+"""
+Benchmark of the per-frame transfer overhead to a worker process, with
+the SharedFramePool compared to pickling the frames.
+
+Usage (from the camera_stream directory):
+    python -m bench.shared_frames [--frames 100]
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils import OrderedFramePool
+
+RESOLUTIONS = {
+    "720p": (720, 1280, 3),
+    "1080p": (1080, 1920, 3),
+}
+
+
+def _touch(frame):
+    """
+    Minimal worker function: write one pixel so the frame is really used.
+    """
+    frame[0, 0, 0] = 255
+    return frame
+
+
+def _time_pool(frame, frames, shared_memory):
+    """
+    Send frames through an OrderedFramePool with one worker process and get
+    the mean round-trip time per frame in ms.
+    """
+    pool = OrderedFramePool(_touch, 1, use_processes=True, shared_memory=shared_memory,
+                            max_pending=1)
+    pool.start()
+    try:
+        # Warm up, so starting the process and the pool is not measured
+        pool.submit(frame, timeout=None)
+        pool.get(timeout=None)
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            pool.submit(frame, timeout=None)
+            pool.get(timeout=None)
+        return (time.perf_counter() - start) * 1000 / frames
+    finally:
+        pool.close()
+
+
+def run(frames=100):
+    """
+    Run the benchmark at every resolution and print the results.
+
+    :param frames: Number of frames to send per transport.
+    :return: Dictionary of results per resolution.
+    """
+    results = {}
+    for name, shape in RESOLUTIONS.items():
+        frame = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+        pickle_ms = _time_pool(frame, frames, shared_memory=False)
+        shared_ms = _time_pool(frame, frames, shared_memory=True)
+        results[name] = {
+            "frame_mb": frame.nbytes / 1e6,
+            "pickle_ms": pickle_ms,
+            "shared_memory_ms": shared_ms,
+            "speedup": pickle_ms / shared_ms,
+        }
+        print(
+            f"{name} ({frame.nbytes / 1e6:.1f} MB): pickle {pickle_ms:.2f} ms, "
+            f"shared memory {shared_ms:.2f} ms ({pickle_ms / shared_ms:.1f}x) per frame"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared-memory frame transport benchmark")
+    parser.add_argument("--frames", type=int, default=100, help="Frames per transport")
+    args = parser.parse_args()
+    run(frames=args.frames)
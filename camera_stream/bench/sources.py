@@ -0,0 +1,205 @@
+"""
+Frame sources for benchmarks, usable wherever a cv2.VideoCapture is.
+"""
+
+import time
+import cv2
+import numpy as np
+
+
+def parse_resolution(resolution):
+    """
+    Parse a resolution such as "1280x720" or "720p".
+
+    :return: Tuple of (width, height).
+    """
+    presets = {"480p": (640, 480), "720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+    if resolution.lower() in presets:
+        return presets[resolution.lower()]
+    width, height = resolution.lower().split("x")
+    return int(width), int(height)
+
+
+class _Pacer:
+    def __init__(self, fps=None):
+        """
+        Pace reads at a frame rate, like a live camera.
+
+        :param fps: Frame rate (default is None to not wait).
+        """
+        self.fps = fps
+        self._next_time = None
+
+    def wait(self):
+        if not self.fps:
+            return
+        now = time.monotonic()
+        if self._next_time is None:
+            self._next_time = now
+        delay = self._next_time - now
+        if delay > 0:
+            time.sleep(delay)
+        # Do not try to catch up more than one frame after a stall
+        self._next_time = max(self._next_time + 1.0 / self.fps, now - 1.0 / self.fps)
+
+
+class SyntheticCapture:
+    def __init__(self, width=1280, height=720, fps=None):
+        """
+        Generated moving test pattern.
+
+        The pattern has gradients, edges and noise so filters and the JPEG
+        encoder do realistic work.
+
+        :param width: Width of the frames.
+        :param height: Height of the frames.
+        :param fps: Frame rate to pace read() at (default is None to return
+                    frames as fast as possible).
+        """
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_index = 0
+        self.opened = True
+        self.raw = False  # Return JPEG bytes like an MJPG camera in raw mode
+        self._jpegs = {}  # Encoded frames by pattern offset, the camera's encoder
+        self._pacer = _Pacer(fps)
+
+        rng = np.random.default_rng(0)
+        yy, xx = np.mgrid[0:height, 0:2 * width]
+        pattern = np.dstack([
+            (xx * 255 // (2 * width)),
+            (yy * 255 // max(1, height - 1)),
+            ((xx // 40 + yy // 40) % 2) * 160 + 40,
+        ]).astype(np.uint8)
+        noise = rng.integers(0, 24, pattern.shape, dtype=np.uint8)
+        self._pattern = cv2.add(pattern, noise)
+        self._frame = np.empty((height, width, 3), dtype=np.uint8)
+
+    def isOpened(self):
+        return self.opened
+
+    def grab(self):
+        if not self.opened:
+            return False
+        self._pacer.wait()
+        self.frame_index += 1
+        return True
+
+    def _draw(self, offset, frame):
+        # Scroll the pattern and move a bright disc across it
+        frame[...] = self._pattern[:, offset:offset + self.width]
+        center = (int(offset), self.height // 2)
+        cv2.circle(frame, center, self.height // 6, (255, 255, 255), -1)
+        return frame
+
+    def retrieve(self, image=None, flag=0):
+        offset = (self.frame_index * 8) % self.width
+        if self.raw:
+            jpeg = self._jpegs.get(offset)
+            if jpeg is None:
+                jpeg = self._jpegs[offset] = cv2.imencode(".jpg", self._draw(offset, self._frame))[1]
+            return True, jpeg.reshape(1, -1).copy()
+
+        if image is None or image.shape != self._frame.shape:
+            return True, self._draw(offset, self._frame).copy()
+        return True, self._draw(offset, image)
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps or 0)
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FORMAT:
+            self.raw = value == -1
+            return True
+        return False
+
+    def release(self):
+        self.opened = False
+
+
+class FileCapture:
+    def __init__(self, path, width=None, height=None, fps=None, loop=True):
+        """
+        Recorded video file played as a camera.
+
+        :param path: Path of the video file.
+        :param width: Width to resize the frames to (default is the file width).
+        :param height: Height to resize the frames to (default is the file height).
+        :param fps: Frame rate to pace read() at (default is None to return
+                    frames as fast as possible).
+        :param loop: Rewind to the start at the end of the file.
+        """
+        self.path = path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.loop = loop
+        self._cap = cv2.VideoCapture(path)
+        self._pacer = _Pacer(fps)
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def grab(self):
+        self._pacer.wait()
+        if self._cap.grab():
+            return True
+        if not self.loop:
+            return False
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return self._cap.grab()
+
+    def retrieve(self, image=None, flag=0):
+        ret, frame = self._cap.retrieve()
+        if ret and self.width and self.height and \
+                (frame.shape[1], frame.shape[0]) != (self.width, self.height):
+            frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        if ret and image is not None:
+            image[...] = frame
+            frame = image
+        return ret, frame
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return 0.0  # Use the monotonic clock like a live camera
+        return self._cap.get(prop)
+
+    def set(self, prop, value):
+        return self._cap.set(prop, value)
+
+    def release(self):
+        self._cap.release()
+
+
+def open_source(source="synthetic", resolution="720p", fps=None):
+    """
+    Open a benchmark source.
+
+    :param source: "synthetic" for the generated pattern, or the path of a
+                   video file.
+    :param resolution: Resolution of the frames, e.g. "1280x720" or "720p".
+    :param fps: Frame rate to pace the source at (default is None for as
+                fast as possible).
+    :return: Capture object.
+    """
+    width, height = parse_resolution(resolution)
+    if source == "synthetic":
+        return SyntheticCapture(width, height, fps)
+    return FileCapture(source, width, height, fps)
@@ -0,0 +1,105 @@
+"""
+Startup-time benchmark of the command line.
+
+Runs the quick commands in fresh interpreters and fails when one exceeds
+its budget or imports a heavy module it does not need, so a new top-level
+import cannot slow them down unnoticed.
+
+Usage (from the camera_stream directory):
+    python -m bench.startup [--runs 5] [--budget-ms 200]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "__main__.py")
+
+# Modules that make the startup slow, or install hooks
+HEAVY_MODULES = ("cv2", "numpy", "flask", "werkzeug", "aiohttp", "keyboard", "sounddevice",
+                 "matplotlib", "skimage")
+
+# Command arguments, the modules it needs, and the code whose time is not
+# counted: the camera test cannot avoid importing OpenCV
+COMMANDS = {
+    "list-filters": (["--list-filters"], (), "pass"),
+    "help": (["--help"], (), "pass"),
+    "test-camera": (
+        # A missing file, so no camera is opened
+        ["--test-camera", "--camera_source", os.path.join(tempfile.gettempdir(), "missing.mp4")],
+        ("cv2", "numpy"),
+        "import cv2",
+    ),
+}
+
+
+def _time_run(command, runs):
+    """
+    Get the fastest wall time of a command over several runs, in ms.
+    """
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def _imported_modules(args):
+    """
+    Get the top-level packages a command imports, from -X importtime.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", MAIN, *args],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                            check=False)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            modules.add(name.split(".")[0])
+    return modules
+
+
+def run(runs=5, budget_ms=200.0):
+    """
+    Time every command and check it against the budget.
+
+    :param runs: Number of runs per command, the fastest is kept.
+    :param budget_ms: Maximum startup time of a command in ms, not
+                      counting the imports it cannot avoid.
+    :return: Tuple of (results by command, whether every command passed).
+    """
+    results = {}
+    passed = True
+    interpreter_ms = _time_run([sys.executable, "-c", "pass"], runs)
+    print(f"Interpreter startup: {interpreter_ms:.0f} ms")
+
+    for name, (args, needed, baseline) in COMMANDS.items():
+        total_ms = _time_run([sys.executable, MAIN, *args], runs)
+        baseline_ms = _time_run([sys.executable, "-c", baseline], runs)
+        startup_ms = max(total_ms - baseline_ms + interpreter_ms, interpreter_ms)
+        heavy = sorted(module for module in _imported_modules(args)
+                       if module in HEAVY_MODULES and module not in needed)
+        ok = startup_ms <= budget_ms and not heavy
+        passed = passed and ok
+        results[name] = {"total_ms": total_ms, "startup_ms": startup_ms,
+                         "heavy_modules": heavy, "passed": ok}
+
+        note = f", imports {', '.join(heavy)}" if heavy else ""
+        excluded = f" (+{baseline_ms - interpreter_ms:.0f} ms for '{baseline}')" \
+            if baseline != "pass" else ""
+        print(f"{name:<14}{startup_ms:6.0f} ms{excluded}  {'ok' if ok else 'FAIL'}{note}")
+    return results, passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Command-line startup benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command (default is 5)")
+    parser.add_argument("--budget-ms", type=float, default=200.0,
+                        help="Startup budget of each command in ms (default is 200)")
+    args = parser.parse_args()
+    _, passed = run(args.runs, args.budget_ms)
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,292 @@
+"""
+Frame-pipeline benchmark suite.
+
+Measures every registered filter, the full hook chain, JPEG encoding and
+the end-to-end /video_feed path with local HTTP clients, and writes the
+results as JSON so they can be compared between releases.
+
+Usage:
+    python camera_stream bench --resolution 720p 1080p --output bench.json
+"""
+
+import http.client
+import json
+import os
+import platform
+import socket
+import threading
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from filters import FilterPipeline, EventsManager, Event, _filters
+from filters.config import _load_filter
+from utils import EncodedFrameCache, EncodeSettings
+from .sources import open_source
+
+
+def _summarize(samples_ms):
+    """
+    Summarize per-frame latencies.
+
+    :param samples_ms: Per-frame latencies in milliseconds.
+    :return: Dictionary with the FPS and the latency percentiles.
+    """
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if not len(samples):
+        return {"frames": 0}
+    return {
+        "frames": int(len(samples)),
+        "fps": float(1000.0 / samples.mean()) if samples.mean() > 0 else None,
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def _measure(func, frames, iterations, alloc_iterations=20):
+    """
+    Time a frame function and measure its allocations.
+
+    :param func: Function called with each frame.
+    :param frames: Frames to cycle through.
+    :param iterations: Number of timed calls.
+    :param alloc_iterations: Number of calls traced for allocations.
+    :return: Latency summary with the bytes allocated per frame.
+    """
+    for frame in frames[:2]:
+        func(frame)  # Warm up caches and buffers
+
+    samples = []
+    for i in range(iterations):
+        frame = frames[i % len(frames)]
+        start = time.perf_counter()
+        func(frame)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    # Peak traced memory during a call is what the call allocated, NumPy
+    # arrays included
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(alloc_iterations):
+            frame = frames[i % len(frames)]
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func(frame)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+
+    summary = _summarize(samples)
+    summary["alloc_bytes_per_frame"] = float(np.mean(peaks)) if peaks else 0.0
+    return summary
+
+
+def bench_filters(frames, filters, iterations):
+    """
+    Benchmark each filter on its own through a FilterPipeline.
+    """
+    return {
+        name: _measure(FilterPipeline([func]), frames, iterations)
+        for name, func in filters
+    }
+
+
+def bench_hook_chain(frames, hooks, iterations):
+    """
+    Benchmark the full hook chain as the capture thread runs it.
+    """
+    return _measure(FilterPipeline(list(hooks)), frames, iterations)
+
+
+def bench_jpeg(frames, iterations, settings=EncodeSettings()):
+    """
+    Benchmark encoding a frame into a multipart chunk, cache excluded.
+    """
+    cache = EncodedFrameCache()
+    sequence = iter(range(1, 1 << 62))
+    return _measure(lambda frame: cache.get_chunk(next(sequence), frame, settings),
+                    frames, iterations)
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _read_stream(port, duration, result):
+    """
+    Read /video_feed like a browser and record the frame arrival times.
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    connection.request("GET", "/video_feed")
+    response = connection.getresponse()
+    arrivals, received = [], 0
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            chunk = response.read1(65536)
+            if not chunk:
+                break
+            received += len(chunk)
+            now = time.perf_counter()
+            arrivals.extend([now] * chunk.count(b"--frame\r\n"))
+    finally:
+        connection.close()
+    result["arrivals"] = arrivals
+    result["bytes"] = received
+
+
+def bench_end_to_end(capture, hooks, clients, duration, workers=0):
+    """
+    Benchmark the /video_feed path with local HTTP clients.
+
+    :return: Per-client frame interval summaries, drops and bytes received.
+    """
+    from core import CameraStream
+
+    camera_stream = CameraStream(source=capture, workers=workers)
+    if hooks:
+        camera_stream.add_filter(list(hooks))
+    port = _free_port()
+    camera_stream.start_stream(host="127.0.0.1", port=port)
+    time.sleep(0.5)  # Give the server a moment to start
+
+    results = [{} for _ in range(clients)]
+    threads = [
+        threading.Thread(target=_read_stream, args=(port, duration, result))
+        for result in results
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        camera_stream.stop_stream()
+
+    per_client = []
+    for result in results:
+        arrivals = result.get("arrivals", [])
+        summary = _summarize(np.diff(arrivals) * 1000 if len(arrivals) > 1 else [])
+        summary["bytes"] = result.get("bytes", 0)
+        per_client.append(summary)
+
+    published = camera_stream.frame_buffer.sequence
+    return {
+        "clients": clients,
+        "workers": workers,
+        "duration_s": duration,
+        "published_fps": published / duration,
+        "frame_interval": per_client,
+        "jpeg_cache": camera_stream.jpeg_cache.stats(),
+    }
+
+
+def run(source="synthetic", resolutions=("720p",), filters=None, iterations=200,
+        clients=3, duration=5.0, workers=0, source_fps=None, hold_key=None, output=None):
+    """
+    Run the benchmark suite.
+
+    :param source: "synthetic" or the path of a video file.
+    :param resolutions: Resolutions to benchmark, e.g. ("720p", "1920x1080").
+    :param filters: Names of the filters to benchmark (default is every
+                    enabled filter).
+    :param iterations: Number of timed frames per measurement.
+    :param clients: Number of local HTTP clients for the end-to-end run
+                    (0 to skip it).
+    :param duration: Duration of the end-to-end run in seconds.
+    :param workers: Number of filter workers of the end-to-end run.
+    :param source_fps: Frame rate to pace the source at in the end-to-end
+                       run (default is None for as fast as possible).
+    :param hold_key: Key to hold down during the run, e.g. "space" to
+                     benchmark zoom_in_effect with live snapshots.
+    :param output: Path of the JSON report (default is None to only print it).
+    :return: Report dictionary.
+    """
+    if filters:
+        selected = []
+        for name in filters:
+            func = _load_filter(name)
+            if func is not None:
+                selected.append((name, func))
+            else:
+                print(f"Filter '{name}' not found. Skipping...")
+    else:
+        selected = list(_filters())
+    hooks = [func for _, func in selected]
+
+    if hold_key:
+        EventsManager.add_event(Event(Event.KEY_EVENT, hold_key))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": source,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "opencv_threads": cv2.getNumThreads(),
+            "numpy": np.__version__,
+        },
+        "settings": {
+            "filters": [name for name, _ in selected],
+            "iterations": iterations,
+            "hold_key": hold_key,
+        },
+        "results": {},
+    }
+
+    for resolution in resolutions:
+        print(f"Benchmarking {resolution}...")
+        capture = open_source(source, resolution)
+        frames = [capture.read()[1] for _ in range(8)]
+        capture.release()
+
+        results = {
+            "filters": bench_filters(frames, selected, iterations),
+            "hook_chain": bench_hook_chain(frames, hooks, iterations),
+            "jpeg_encode": bench_jpeg(frames, iterations),
+        }
+        if clients:
+            results["end_to_end"] = bench_end_to_end(
+                open_source(source, resolution, source_fps), hooks, clients, duration, workers
+            )
+        report["results"][resolution] = results
+        _print_results(resolution, results)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {output}")
+    return report
+
+
+def _print_results(resolution, results):
+    """
+    Print a short summary of the results of a resolution.
+    """
+    def line(name, summary):
+        if not summary.get("frames"):
+            return f"  {name}: no frames"
+        text = (f"  {name}: {summary['fps']:.1f} FPS, p50 {summary['p50_ms']:.2f} ms, "
+                f"p95 {summary['p95_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms")
+        if "alloc_bytes_per_frame" in summary:
+            text += f", {summary['alloc_bytes_per_frame'] / 1e6:.2f} MB allocated per frame"
+        return text
+
+    print(f"{resolution}:")
+    for name, summary in results["filters"].items():
+        print(line(name, summary))
+    print(line("hook chain", results["hook_chain"]))
+    print(line("jpeg encode", results["jpeg_encode"]))
+    end_to_end = results.get("end_to_end")
+    if end_to_end:
+        print(f"  end to end: {end_to_end['published_fps']:.1f} FPS published to "
+              f"{end_to_end['clients']} clients")
+        for i, summary in enumerate(end_to_end["frame_interval"]):
+            print(line(f"client {i}", summary))
@@ -1,26 +1,104 @@
 """
 Core functionality of the camera streaming module.
 """
-from utils import Camera
-from filters import _get_filter
+from utils import Camera, FrameBuffer, EncodedFrameCache, EncodeSettings, FrameRateGovernor, \
+                  OrderedFramePool, StreamMetrics, AckGateRegistry, FRAME_HEADER, frame_header, \
+                  CaptureSettings, CompressedFrame, describe_capture, Recorder, FrameSink
+from filters import _get_filter, _get_capture_config, FilterPipeline, ConfigWatcher, \
+                    _describe_filters, _update_filter_settings, KeyTrigger, \
+                    _run_thread_pipeline, \
+                    _init_process_pipeline, \
+                    _process_hook_references, \
+                    _run_process_pipeline, \
+                    _process_context
+from servers import SERVERS
 import cv2
 import threading
-from flask import Flask, Response, render_template
+import functools
+from collections import deque
+from flask import Flask, Response, render_template, request, jsonify
 import time
 import os
 import sys
 
 class CameraStream:
-    def __init__(self, source=0):
+    def __init__(self, source=0, fps=None, workers=0, worker_type="thread", metrics=True,
+                 threaded_capture=False, capture=None, passthrough=False, watch_config=True,
+                 replay_bytes=0, record_dir="recordings", replay_key=None, frame_sink=None,
+                 change_threshold=None):
         """
         Initialize the camera stream with the given source
 
         :param source: Camera source (default is 0 for the default camera).
+        :param fps: Target frame rate of the stream (default is the camera frame rate).
+        :param workers: Number of workers filtering frames concurrently
+                        (default is 0 to filter on the capture thread).
+        :param worker_type: "thread" for filters that release the GIL, such as
+                            OpenCV and NumPy ones, or "process" for pure-Python
+                            filters (default is "thread").
+        :param metrics: Time every stage of the frame pipeline for /metrics
+                        and /stats.json (default is True).
+        :param threaded_capture: Grab frames on a dedicated thread so the
+                                 pipeline always starts from the newest one
+                                 (default is False).
+        :param capture: CaptureSettings of the camera (default is the
+                        "capture" section of the filters config).
+        :param passthrough: Send the JPEG frames of MJPG cameras to the
+                            clients as is while no filter changes the pixels
+                            (default is False).
+        :param watch_config: Reload the filters config file when it changes
+                             while streaming (default is True).
+        :param replay_bytes: Size in bytes of the instant-replay buffer of the
+                             encoded stream (default is 0 to disable it).
+        :param record_dir: Directory of the replays and recordings (default
+                           is "recordings").
+        :param replay_key: Key saving a replay when pressed (default is None).
+        :param frame_sink: Path of a memory-mapped file the processed frames
+                           are written to as raw pixels for local consumers,
+                           read with SharedFrameReader (default is None).
+        :param change_threshold: Reuse the filtered and encoded previous frame
+                                 when no tile of the frame changed by more
+                                 than this mean level from 0 to 255, and
+                                 only filter the changed tiles when the
+                                 filters allow it (default is None to filter
+                                 and encode every frame).
         """
-        self.camera = Camera(source)
+        if worker_type not in ("thread", "process"):
+            raise ValueError(f"Unknown worker type '{worker_type}'.")
+
+        self.metrics = StreamMetrics(enabled=metrics)
+        if capture is None:
+            capture = CaptureSettings.from_config(_get_capture_config())
+        self.camera = Camera(source, threaded=threaded_capture, capture=capture,
+                             passthrough=passthrough)
+        self.camera.metrics = self.metrics
+        self.change_threshold = change_threshold
+        self.camera.pipeline = FilterPipeline(self.camera.frame_hooks, metrics=self.metrics,
+                                              change_threshold=change_threshold)
         self.running = False
         self.app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), 'templates'))
-        self.server_thread = None
+        self.server = None
+        self.capture_thread = None
+        self.frame_buffer = FrameBuffer()
+        self.jpeg_cache = EncodedFrameCache()
+        self.jpeg_cache.metrics = self.metrics
+        self.encode_settings = EncodeSettings()
+        self.governor = FrameRateGovernor(fps)
+        self.workers = workers
+        self.worker_type = worker_type
+        self.frame_pool = None
+        self.emit_thread = None
+        self.capturing = False
+        self._pending_timestamps = deque()  # Capture times of the frames in the pool
+        self._worker_context_versions = None  # Versions last published to worker processes
+        self.passthrough_frames = 0
+        self.config_watcher = ConfigWatcher() if watch_config else None
+        self.frame_streams = AckGateRegistry()
+        self.recorder = Recorder(self.frame_buffer, self.jpeg_cache, replay_bytes, record_dir,
+                                 trigger=KeyTrigger(replay_key) if replay_key else None)
+        self.frame_sink_path = frame_sink
+        self.frame_sink = None
+        self._register_gauges()
 
         # Register Flask routes
         @self.app.route('/')
@@ -29,9 +107,164 @@ class CameraStream:
 
         @self.app.route('/video_feed')
         def video_feed():
-            return Response(self._generate_frames(),
+            # Optional quality tier, e.g. /video_feed?q=60&w=640
+            settings = self._open_tier(request.args.get('q', type=int),
+                                       request.args.get('w', type=int))
+            client = self.metrics.add_client(request.remote_addr, settings)
+            return Response(self._generate_frames(settings, client),
                             mimetype='multipart/x-mixed-replace; boundary=frame')
 
+        @self.app.route('/frames')
+        def frames():
+            # Binary frames for the canvas player, paced by /ack
+            settings = self._open_tier(request.args.get('q', type=int),
+                                       request.args.get('w', type=int))
+            gate = self.frame_streams.open()
+            client = self.metrics.add_client(request.remote_addr, settings)
+            return Response(self._generate_binary_frames(settings, gate, client),
+                            mimetype='application/octet-stream',
+                            headers={'X-Stream-Id': gate.stream_id,
+                                     'Cache-Control': 'no-store'})
+
+        @self.app.route('/ack', methods=['POST'])
+        def ack():
+            gate = self.frame_streams.get(request.args.get('stream', ''))
+            if gate is None:
+                return Response(status=404)
+            gate.ack(request.args.get('seq', 0, type=int))
+            latency = request.args.get('latency', type=float)
+            if latency is not None and self.metrics.enabled:
+                self.metrics.observe("glass_to_glass", latency / 1000.0)
+            return Response(status=204)
+
+        @self.app.route('/filters')
+        def filters():
+            return jsonify(_describe_filters())
+
+        @self.app.route('/filters/<name>', methods=['PATCH'])
+        def update_filter(name):
+            status, body = self._update_filter(name, request.get_json(silent=True),
+                                               request.args.get('save') in ('1', 'true'))
+            return jsonify(body), status
+
+        @self.app.route('/recorder')
+        def recorder():
+            return jsonify(self.recorder.status())
+
+        @self.app.route('/recorder/<action>', methods=['POST'])
+        def recorder_action(action):
+            status, body = self._recorder_action(action, request.args)
+            return jsonify(body), status
+
+        @self.app.route('/metrics')
+        def metrics():
+            return Response(self.metrics.prometheus(),
+                            mimetype='text/plain; version=0.0.4')
+
+        @self.app.route('/stats.json')
+        def stats():
+            return jsonify(self.metrics.snapshot())
+
+    def _open_tier(self, quality=None, width=None):
+        """
+        Get the encode tier of a new client from its q and w query
+        arguments. The tier must be released with jpeg_cache.close_tier()
+        when the client leaves.
+
+        :param quality: Requested JPEG quality, or None for the stream's.
+        :param width: Requested width, or None for the stream's.
+        :return: Encode settings of the client's tier.
+        """
+        settings = self.encode_settings.with_overrides(quality=quality, width=width)
+        return self.jpeg_cache.open_tier(settings, self.encode_settings)
+
+    def _update_filter(self, name, body, save=False):
+        """
+        Apply a PATCH /filters/<name> request.
+
+        :param name: Name of the filter.
+        :param body: JSON body with "enabled" and/or "parameters".
+        :param save: Also write the config file.
+        :return: Tuple of (HTTP status, JSON response).
+        """
+        if not isinstance(body, dict):
+            return 400, {"error": "Expected a JSON object."}
+        enabled = body.get('enabled')
+        if enabled is not None and not isinstance(enabled, bool):
+            return 400, {"error": "'enabled' must be true or false."}
+        parameters = body.get('parameters')
+        if parameters is not None and not isinstance(parameters, dict):
+            return 400, {"error": "'parameters' must be an object."}
+        try:
+            settings = _update_filter_settings(name, enabled, parameters, save)
+        except KeyError:
+            return 404, {"error": f"Unknown filter '{name}'."}
+        except (ValueError, OSError) as e:
+            return 400, {"error": str(e)}
+        return 200, {name: settings}
+
+    def _recorder_action(self, action, args):
+        """
+        Apply a POST /recorder/<action> request. The files are written in
+        the background, so the request returns before they are complete.
+
+        :param action: "replay", "start" or "stop".
+        :param args: Query arguments: "seconds" and "format" for a replay,
+                     "format" and "segment" in seconds to start recording.
+        :return: Tuple of (HTTP status, JSON response).
+        """
+        try:
+            if action == "replay":
+                seconds = args.get('seconds')
+                path = self.recorder.save_replay(
+                    float(seconds) if seconds else None, args.get('format', 'avi')
+                )
+            elif action == "start":
+                segment = args.get('segment')
+                path = self.recorder.start_recording(
+                    args.get('format', 'avi'), float(segment) if segment else None
+                )
+            elif action == "stop":
+                return 200, {"path": self.recorder.stop_recording()}
+            else:
+                return 404, {"error": f"Unknown recorder action '{action}'."}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except RuntimeError as e:
+            return 409, {"error": str(e)}
+        return 202, {"path": path}
+
+    def _register_gauges(self):
+        """
+        Export the counters of the stream components with the metrics.
+        """
+        self.metrics.gauge("published_frames", lambda: self.frame_buffer.sequence,
+                           "Frames published by the capture thread.")
+        self.metrics.gauge("skipped_frames", lambda: self.governor.skipped,
+                           "Frames skipped by the frame-rate governor.")
+        self.metrics.gauge("worker_dropped_frames",
+                           lambda: self.frame_pool.dropped if self.frame_pool else 0,
+                           "Frames dropped because every worker was busy.")
+        self.metrics.gauge("capture_dropped_frames",
+                           lambda: self.camera.reader.dropped if self.camera.reader else 0,
+                           "Frames grabbed by the capture reader but replaced by newer ones.")
+        self.metrics.gauge("passthrough_frames", lambda: self.passthrough_frames,
+                           "Camera JPEG frames relayed without decoding them.")
+        self.metrics.gauge("jpeg_cache_hits", lambda: self.jpeg_cache.stats()["hits"],
+                           "Chunks served from the JPEG cache.")
+        self.metrics.gauge("jpeg_cache_misses", lambda: self.jpeg_cache.stats()["misses"],
+                           "Frames encoded by the JPEG cache.")
+        self.metrics.gauge("replay_buffer_bytes", lambda: self.recorder.status()["replay"]["bytes"],
+                           "Bytes of JPEG frames held by the instant-replay buffer.")
+        self.metrics.gauge("recorder_dropped_frames", lambda: self.recorder.dropped_frames,
+                           "Frames not recorded because the disk writer fell behind.")
+        self.metrics.counter("unchanged_frames",
+                             "Frames with no changed tile, reusing the previous filtered frame.")
+        self.metrics.counter("tiled_frames", "Frames filtered only on their changed tiles.")
+        self.metrics.counter("reused_encodes", "JPEG encodes reused from an unchanged frame.")
+        self.metrics.counter("cpu_saved_seconds",
+                             "Time of the filters and encodes skipped on unchanged tiles and frames.")
+
     def add_filter(self, filter_func):
         """
         Add a filter function to the camera stream.
@@ -55,64 +288,372 @@ class CameraStream:
 
         self.camera.add_frame_hook(filter_func)
 
-    def _generate_frames(self):
+    def _capture_frames(self):
         """
-        Generator function that yields frames for the MJPEG stream.
+        Capture and process frames on a single thread and publish them to
+        the shared frame buffer, so the cost does not grow with the viewers.
+
+        With workers, frames are handed to the worker pool instead and
+        published by the emit thread.
         """
-        if not self.running:
-            return
+        self.capturing = True
+        while self.running:
+            try:
+                frame, timestamp = self.camera._read()
+                captured = time.time()
+                if not self.governor.accept(timestamp):
+                    continue
+                if isinstance(frame, CompressedFrame) and not self.camera.needs_pixels:
+                    # Nothing to filter: relay the camera's JPEG as is
+                    self.passthrough_frames += 1
+                    self.frame_buffer.publish(frame, captured)
+                    continue
+
+                if self.frame_pool is not None:
+                    compressed = isinstance(frame, CompressedFrame)
+                    if compressed:
+                        frame = frame.decode()
+                    if self.camera.pipeline.unchanged(frame):
+                        # Workers get frames out of order, so changes are
+                        # detected here and the previous output is reused
+                        self.frame_pool.repeat()
+                        self._pending_timestamps.append(captured)
+                        continue
+                    if not compressed and self.camera.reader is not None and \
+                            self.worker_type == "thread":
+                        # The reader reuses its arrays while workers are busy
+                        frame = frame.copy()
+                    if self.worker_type == "process":
+                        self._publish_worker_context()
+                    # Drop the frame rather than queue latency if workers are busy
+                    if self.frame_pool.submit(frame, timeout=0):
+                        self._pending_timestamps.append(captured)
+                    elif self.camera.pipeline.detector is not None:
+                        # The next frames must not be compared with this one
+                        self.camera.pipeline.detector.reset()
+                else:
+                    processed = self.camera._process(frame)
+                    if processed is frame and self.camera.reader is not None and \
+                            not isinstance(frame, CompressedFrame):
+                        # Clients encode published frames after the reader moved on
+                        processed = frame.copy()
+                    if self.camera.pipeline.repeated:
+                        # Without workers, this thread is the only publisher, so
+                        # the frame gets the next sequence
+                        sequence = self.frame_buffer.sequence
+                        self.jpeg_cache.repeat(sequence + 1, sequence)
+                    self.frame_buffer.publish(processed, captured)
+            except TimeoutError:
+                continue  # The camera stalled, keep waiting while running
+            except Exception as e:
+                print(f"Error capturing frame: {e}")
+                break
+
+        self.capturing = False
+        if self.frame_pool is None:
+            self.frame_buffer.close()
+
+    def _publish_worker_context(self):
+        """
+        Publish the filters config and the keys of this process to the
+        worker processes when either changed since the last frame.
+        """
+        context = _process_context()
+        versions = (context[0][0], context[1][0])
+        if versions != self._worker_context_versions:
+            self.frame_pool.publish(context)
+            self._worker_context_versions = versions
 
+    def _emit_frames(self):
+        """
+        Encode stage of the parallel mode: publish the frames of the worker
+        pool in capture order and encode them once for the clients.
+        """
         while self.running:
             try:
-                frame = self.camera._update()
-                _, buffer = cv2.imencode('.jpg', frame)
-                frame_data = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_data + b'\r\n')
-                time.sleep(0.005)  
+                frame = self.frame_pool.get()
+                if frame is None:
+                    if not self.capturing:
+                        break
+                    continue
+                # The pool returns frames in submission order
+                captured = self._pending_timestamps.popleft() if self._pending_timestamps else None
+                if frame is OrderedFramePool.REPEATED:
+                    # The frame did not change: publish the previous output
+                    # again with its JPEG
+                    previous = self.frame_buffer.sequence
+                    self.jpeg_cache.repeat(previous + 1, previous)
+                    frame = self.frame_buffer.frame
+                sequence = self.frame_buffer.publish(frame, captured)
+                if self.jpeg_cache.is_open(self.encode_settings):
+                    # Encode once here for the clients of the stream's tier
+                    self.jpeg_cache.get_jpeg(sequence, frame, self.encode_settings)
             except Exception as e:
-                print(f"Error generating frame: {e}")
+                print(f"Error processing frame: {e}")
                 break
 
-    def start_stream(self, host="127.0.0.1", port=7277):
+        self.frame_buffer.close()
+
+    def _create_frame_pool(self):
+        """
+        Create the worker pool of the parallel mode.
+        """
+        if self.worker_type == "process":
+            return OrderedFramePool(
+                _run_process_pipeline,
+                self.workers,
+                use_processes=True,
+                initializer=_init_process_pipeline,
+                initargs=(_process_hook_references(self.camera.frame_hooks),),
+                shared_memory=True,
+                shared_state=True,
+            )
+        return OrderedFramePool(
+            functools.partial(_run_thread_pipeline, self.camera.frame_hooks, metrics=self.metrics),
+            self.workers,
+        )
+
+    def _create_frame_sink(self):
+        """
+        Create the raw frame sink, with slots large enough for the capture
+        size.
+        """
+        width = int(self.camera.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.camera.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return FrameSink(self.frame_buffer, self.frame_sink_path,
+                         max(width, 1920), max(height, 1080))
+
+    def _generate_frames(self, settings=None, client=None):
+        """
+        Generator function that yields frames for the MJPEG stream.
+
+        :param settings: Encode settings of the client from _open_tier(),
+                         closed when the generator ends (default is the
+                         stream settings).
+        :param client: Optional ClientStats of the client, counting the
+                       frames and bytes sent and the frames it skipped.
+        """
+        if settings is None:
+            settings = self._open_tier()
+
+        if not self.running:
+            self.jpeg_cache.close_tier(settings)
+            if client is not None:
+                self.metrics.remove_client(client)
+            return
+
+        metrics = self.metrics
+        subscription = self.frame_buffer.subscribe()
+        try:
+            while self.running:
+                item = subscription.get()
+                if item is None:
+                    if subscription.closed:
+                        break
+                    continue
+                sequence, frame, _ = item
+                chunk = self.jpeg_cache.get_chunk(sequence, frame, settings)
+                if not metrics.enabled:
+                    yield chunk
+                    continue
+
+                # The server writes the chunk before resuming the generator
+                start = time.perf_counter()
+                yield chunk
+                metrics.observe("send", time.perf_counter() - start)
+                if client is not None:
+                    client.frames += 1
+                    client.bytes += len(chunk)
+                    client.dropped = subscription.dropped
+        except Exception as e:
+            print(f"Error generating frame: {e}")
+        finally:
+            self.frame_buffer.unsubscribe(subscription)
+            self.jpeg_cache.close_tier(settings)
+            if client is not None:
+                client.dropped = subscription.dropped
+                self.metrics.remove_client(client)
+
+    def _generate_binary_frames(self, settings, gate, client=None):
+        """
+        Generator function that yields binary frames for the canvas player.
+
+        Each frame is a FRAME_HEADER with the sequence number, the capture
+        and send times and the JPEG length, followed by the JPEG bytes. The
+        next frame is only sent once the client acknowledged the previous
+        one, so it is always the newest.
+
+        :param settings: Encode settings of the client from _open_tier(),
+                         closed when the generator ends.
+        :param gate: AckGate of the stream.
+        :param client: Optional ClientStats of the client.
+        """
+        if not self.running:
+            self.frame_streams.close(gate)
+            self.jpeg_cache.close_tier(settings)
+            if client is not None:
+                self.metrics.remove_client(client)
+            return
+
+        metrics = self.metrics
+        subscription = self.frame_buffer.subscribe()
+        try:
+            while self.running and not gate.closed:
+                gate.wait()
+                item = subscription.get()
+                if item is None:
+                    if subscription.closed:
+                        break
+                    continue
+                sequence, frame, captured = item
+                jpeg = self.jpeg_cache.get_jpeg(sequence, frame, settings)
+                gate.mark_sent(sequence)
+
+                start = time.perf_counter()
+                yield frame_header(sequence, captured, jpeg)
+                yield jpeg
+                if metrics.enabled:
+                    metrics.observe("send", time.perf_counter() - start)
+                    if client is not None:
+                        client.frames += 1
+                        client.bytes += FRAME_HEADER.size + len(jpeg)
+                        client.dropped = subscription.dropped
+        except Exception as e:
+            print(f"Error generating frame: {e}")
+        finally:
+            self.frame_buffer.unsubscribe(subscription)
+            self.frame_streams.close(gate)
+            self.jpeg_cache.close_tier(settings)
+            if client is not None:
+                client.dropped = subscription.dropped
+                self.metrics.remove_client(client)
+
+    def start_stream(self, host="127.0.0.1", port=7277, jpeg_quality=None,
+                     jpeg_optimize=False, jpeg_progressive=False, output_width=None,
+                     server="flask"):
         """
-        Start the Flask server to stream camera frames
+        Start the server to stream camera frames
 
         :param host: Host address to bind the server (default is "127.0.0.1")
         :param port: Port number to bind the server (default is 7277)
+        :param jpeg_quality: JPEG quality from 1 to 100 (default is the OpenCV default)
+        :param jpeg_optimize: Optimize the JPEG Huffman tables (default is False)
+        :param jpeg_progressive: Encode progressive JPEGs (default is False)
+        :param output_width: Width to scale the stream down to (default is the capture width)
+        :param server: "flask" for the threaded Flask server, or "async" for
+                       the aiohttp server serving every client from one
+                       event loop (default is "flask")
         """
         if self.running:
             raise RuntimeError("Camera stream is already running.")
+        if server not in SERVERS:
+            raise ValueError(f"Unknown server '{server}'.")
 
-        self.camera.cap = cv2.VideoCapture(self.camera.source)
+        self.camera.cap = self.camera.open()
 
         if not self.camera.cap.isOpened():
             raise ValueError(f"Camera source {self.camera.source} is not available.")
+        # Client widths at or above the capture width share the full-size tier
+        self.jpeg_cache.frame_width = int(self.camera.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or None
+        if isinstance(self.camera.cap, cv2.VideoCapture):
+            mode = describe_capture(self.camera.cap)
+            print(f"Capture mode: {mode['width']}x{mode['height']} {mode['fourcc'] or ''} "
+                  f"at {mode['fps']:g} FPS, buffer of {mode['buffer_size']} frames.")
+        if self.frame_sink_path:
+            # Open the sink before any thread starts, so a bad path stops nothing
+            try:
+                self.frame_sink = self._create_frame_sink()
+                self.frame_sink.open()
+            except Exception:
+                self.frame_sink = None
+                self.camera.cap.release()
+                raise
+        if self.camera.threaded:
+            self.camera.start_reader()
+        if self.config_watcher is not None:
+            self.config_watcher.start()
 
+        self.encode_settings = EncodeSettings(
+            jpeg_quality, output_width, jpeg_optimize, jpeg_progressive
+        )
         self.running = True
+        self.governor.reset()
+        self.frame_buffer.open()
+        self._pending_timestamps.clear()
+
+        # Capture frames once for every client
+        self.capturing = True
+        self.capture_thread = threading.Thread(target=self._capture_frames)
+        self.capture_thread.daemon = True
+
+        if self.workers:
+            self.frame_pool = self._create_frame_pool()
+            self.frame_pool.start()
+            self._worker_context_versions = None
+            self.emit_thread = threading.Thread(target=self._emit_frames)
+            self.emit_thread.daemon = True
+            self.emit_thread.start()
 
-        # Start Flask server in a separate thread
-        def run_server():
-            self.app.run(host=host, port=port, debug=False, threaded=True)
+        self.capture_thread.start()
+        self.recorder.start(self.encode_settings)
+        if self.frame_sink is not None:
+            self.frame_sink.start()
+            print(f"Writing raw frames to {self.frame_sink.path}")
 
-        self.server_thread = threading.Thread(target=run_server)
-        self.server_thread.daemon = True
-        self.server_thread.start()
+        # Serve the clients in the background
+        self.server = SERVERS[server](self, host, port)
+        try:
+            self.server.start()
+        except Exception:
+            self.server = None
+            self.stop_stream()
+            raise
 
-        print(f"Camera stream server started at http://{host}:{port}/")
+        print(f"Camera stream server started at http://{host}:{self.server.port}/")
 
     def stop_stream(self):
         """
-        Stop the camera stream and Flask server.
+        Stop the camera stream and the server.
         """
         if not self.running:
             raise RuntimeError("Camera stream is not running.")
 
         self.running = False
+        self.frame_buffer.close()
+        self.frame_streams.close_all()
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+
+        # Wait for the capture thread so the camera is not released mid-read
+        if self.capture_thread is not None:
+            self.capture_thread.join(timeout=2)
+            self.capture_thread = None
+
+        if self.frame_pool is not None:
+            # The emit thread stops on self.running; join it before the pool
+            # frees the shared memory the frames it publishes are views of
+            self.emit_thread.join(timeout=2)
+            self.frame_pool.close()
+            self.frame_pool = None
+            self.emit_thread = None
+
+        # Finish writing the replays and the recording
+        self.recorder.stop()
+        if self.frame_sink is not None:
+            self.frame_sink.close()
+            self.frame_sink = None
+
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
 
         # Clean up resources
+        self.camera.stop_reader()
         if self.camera.cap and self.camera.cap.isOpened():
             self.camera.cap.release()
 
         cv2.destroyAllWindows()
+        stats = self.jpeg_cache.stats()
+        print(f"JPEG cache: {stats['hits']} hits ({stats['repeats']} repeated frames), "
+              f"{stats['misses']} misses, {stats['tiers']} tiers.")
         print("Camera stream server stopped.")
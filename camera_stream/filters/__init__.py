@@ -1,21 +1,62 @@
 """
 Filters logic for the virtual camera.
+
+The filter implementations, the pipeline and the keyboard events are
+imported on first use, so listing or configuring filters stays fast.
 """
-from .config import _get_filter, _get_filters_from_list, _filters
+import importlib
+
+from .config import _get_filter, _get_filters_from_list, _filters, _get_capture_config, \
+                    _describe_filters, _update_filter_settings, _filter_names, declare_filter
+
+from .config_watcher import ConfigWatcher
 
-from .basic_filters import horizontal_flip, minimize_colors
+# Names imported on first access, by module
+_lazy_modules = {
+    ".pipeline": ["FilterPipeline", "FilterStage", "_run_thread_pipeline",
+                  "_init_process_pipeline", "_process_hook_references", "_run_process_pipeline",
+                  "_process_context"],
+    ".basic_filters": ["horizontal_flip", "minimize_colors", "triangulate_effect"],
+    ".zoom_in_snapshots": ["zoom_in_effect"],
+    ".events": ["EventsManager", "Event", "KeyTrigger"],
+    ".change_detector": ["ChangeDetector"],
+}
+_lazy_names = {name: module for module, names in _lazy_modules.items() for name in names}
 
-from .zoom_in_snapshots import zoom_in_effect
+def __getattr__(name):
+    module = _lazy_names.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
-from .events import EventsManager, Event
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names))
 
 __all__ = [
     "_get_filter",
     "_get_filters_from_list",
     "_filters",
+    "_filter_names",
+    "_get_capture_config",
+    "_describe_filters",
+    "_update_filter_settings",
+    "declare_filter",
+    "ConfigWatcher",
+    "FilterPipeline",
+    "FilterStage",
+    "_run_thread_pipeline",
+    "_init_process_pipeline",
+    "_process_hook_references",
+    "_run_process_pipeline",
+    "_process_context",
     "horizontal_flip",
     "minimize_colors",
+    "triangulate_effect",
     "zoom_in_effect",
     "Event",
-    "EventsManager"
-]
\ No newline at end of file
+    "EventsManager",
+    "KeyTrigger",
+    "ChangeDetector"
+]
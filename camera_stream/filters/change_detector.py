@@ -0,0 +1,161 @@
+"""
+Tile-level change detection between consecutive camera frames.
+"""
+
+import math
+import cv2
+import numpy as np
+
+
+class ChangeDetector:
+    def __init__(self, threshold=3.0, tile_size=64, sample_step=8, max_changed=0.5,
+                 peak_threshold=None, refresh_interval=30):
+        """
+        Compare frames on every sample_step-th pixel, so it costs a fraction
+        of a filter. A tile changed when the mean color of its samples
+        changed, which is averaged enough to ignore sensor noise, or when
+        one of its samples changed by a large step, so a small change that
+        keeps the mean of the tile is not missed.
+
+        Frames are compared with the reference, the tiles of the last
+        frames that changed, so a slow drift is detected once it adds up
+        to the threshold. Changes between the samples cannot be seen, so
+        the frame is processed whole every refresh_interval frames.
+
+        :param threshold: Difference of the mean level of a tile channel,
+                          from 0 to 255, above which the tile changed
+                          (default is 3.0).
+        :param tile_size: Size of the tiles in pixels (default is 64).
+        :param sample_step: Distance between the sampled pixels (default is 8).
+        :param max_changed: Fraction of changed tiles above which the frame
+                            is processed whole (default is 0.5).
+        :param peak_threshold: Difference of the level of a sampled pixel
+                               channel above which its tile changed
+                               (default is 8 times the threshold).
+        :param refresh_interval: Number of frames after which the frame is
+                                 processed whole again, or None to never
+                                 refresh (default is 30).
+        """
+        self.threshold = float(threshold)
+        self.tile_size = max(int(tile_size), 1)
+        self.sample_step = max(int(sample_step), 1)
+        self.max_changed = max_changed
+        self.peak_threshold = float(peak_threshold if peak_threshold is not None
+                                    else 8 * self.threshold)
+        self.refresh_interval = refresh_interval
+        self._reference = None  # Signature of the last accepted tiles
+        self._samples = None  # Sampled pixels of the last accepted tiles
+        self._shape = None
+        self._rows = None  # Pixel ranges of the tile rows and columns
+        self._columns = None
+        self._sample_rows = None  # First sample of the tile rows and columns
+        self._sample_columns = None
+        self._age = 0  # Frames since the frame was processed whole
+
+    def reset(self):
+        """
+        Forget the reference, so the next frame is processed whole.
+        """
+        self._reference = None
+        self._samples = None
+        self._shape = None
+
+    def _ranges(self, length):
+        """
+        Get the pixel range of every tile along one axis. The tiles split
+        the span of the samples, and neighboring ranges overlap by a pixel,
+        so a pixel sampled in a tile is always inside it.
+        """
+        tiles = math.ceil(length / self.tile_size)
+        span = math.ceil(length / self.sample_step) * self.sample_step
+        return [(i * span // tiles, min(length, math.ceil((i + 1) * span / tiles)))
+                for i in range(tiles)]
+
+    def _sample_starts(self, ranges, samples):
+        """
+        Get the index of the first sample inside every tile along one axis,
+        so the samples are split between the tiles that contain them.
+        """
+        return np.array([min(-(-start // self.sample_step), samples - 1) for start, _ in ranges])
+
+    def _sample(self, frame):
+        return np.ascontiguousarray(frame[::self.sample_step, ::self.sample_step])
+
+    def _signature(self, samples):
+        return cv2.resize(samples.astype(np.float32), (len(self._columns), len(self._rows)),
+                          interpolation=cv2.INTER_AREA)
+
+    def _peaks(self, samples):
+        """
+        Get the largest difference of a sampled pixel channel of every tile.
+        """
+        difference = cv2.absdiff(samples, self._samples)
+        # Reduce the channels with the columns, on rows of interleaved channels
+        channels = samples.shape[2] if samples.ndim == 3 else 1
+        difference = difference.reshape(samples.shape[0], -1)
+        difference = np.maximum.reduceat(difference, self._sample_columns * channels, axis=1)
+        return np.maximum.reduceat(difference, self._sample_rows, axis=0)
+
+    def _sample_mask(self, changed):
+        """
+        Expand a mask of tiles to the samples of the tiles.
+        """
+        rows = np.diff(np.append(self._sample_rows, self._samples.shape[0]))
+        columns = np.diff(np.append(self._sample_columns, self._samples.shape[1]))
+        return np.repeat(np.repeat(changed, rows, axis=0), columns, axis=1)
+
+    def compare(self, frame):
+        """
+        Compare a frame with the reference and accept its changed tiles.
+
+        :param frame: Frame read from the camera.
+        :return: List of (y0, y1, x0, x1) regions covering the changed tiles,
+                 empty when the frame did not change, or None when it must
+                 be processed whole: the first frame, a new size, too many
+                 changed tiles, or a refresh.
+        """
+        samples = self._sample(frame)
+        if frame.shape != self._shape or self._samples is None:
+            height, width = frame.shape[:2]
+            self._rows = self._ranges(height)
+            self._columns = self._ranges(width)
+            self._sample_rows = self._sample_starts(self._rows, samples.shape[0])
+            self._sample_columns = self._sample_starts(self._columns, samples.shape[1])
+            self._shape = frame.shape
+        elif self.refresh_interval is None or self._age < self.refresh_interval:
+            signature = self._signature(samples)
+            difference = cv2.absdiff(signature, self._reference)
+            if difference.ndim == 3:
+                difference = difference.max(axis=2)
+            changed = (difference > self.threshold) | (self._peaks(samples) > self.peak_threshold)
+            count = int(np.count_nonzero(changed))
+            if count == 0:
+                self._age += 1
+                return []
+
+            self._reference[changed] = signature[changed]
+            mask = self._sample_mask(changed)
+            self._samples[mask] = samples[mask]
+            if count <= self.max_changed * changed.size:
+                self._age += 1
+                return self._regions(changed)
+
+        # Processed whole: every tile of the frame is the new reference
+        self._reference = self._signature(samples)
+        self._samples = samples
+        self._age = 0
+        return None
+
+    def _regions(self, changed):
+        """
+        Get the regions of the runs of changed tiles in every tile row.
+        """
+        regions = []
+        for row in np.flatnonzero(changed.any(axis=1)):
+            columns = np.flatnonzero(changed[row])
+            breaks = np.flatnonzero(np.diff(columns) > 1)
+            y0, y1 = self._rows[row]
+            for start, end in zip(np.append(columns[0], columns[breaks + 1]),
+                                  np.append(columns[breaks], columns[-1])):
+                regions.append((y0, y1, self._columns[start][0], self._columns[end][1]))
+        return regions
@@ -1,35 +1,309 @@
 import os
 import json
+import math
+import copy
+import importlib
+import threading
+
+_config_path = os.path.join(os.path.dirname(__file__), 'filters_config.json')
 
 # Load filter configurations from JSON file
 def _load_filters_config():
     """
     Load filter configurations from the JSON file.
     """
-    config_path = os.path.join(os.path.dirname(__file__), 'filters_config.json')
     try:
-        with open(config_path, 'r') as f:
+        with open(_config_path, 'r') as f:
             return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError) as e:
         print(f"Error loading filters config: {e}")
         return {"filters": {}}
 
 filters_config = _load_filters_config()
+_config_lock = threading.Lock()  # Serializes config updates, readers never lock
+_config_version = 0
 _filter_registry = {}
+_filter_stages = {}
+
+# Module of each filter, imported the first time the filter is used, so
+# filters can be listed without importing OpenCV or their implementation
+_filter_modules = {
+    "horizontal_flip": ".basic_filters",
+    "minimize_colors": ".basic_filters",
+    "triangulate_effect": ".basic_filters",
+    "zoom_in_effect": ".zoom_in_snapshots",
+}
+
+def declare_filter(name, module):
+    """
+    Declare a filter without importing it. The module must call
+    register_filter() for it when imported.
+
+    :param name: Name of the filter.
+    :param module: Absolute module name, or relative to the filters package.
+    """
+    _filter_modules[name] = module
+
+def _filter_names():
+    """
+    Get the names of the declared and registered filters, without importing them.
+    """
+    return list(_filter_modules) + [name for name in _filter_registry if name not in _filter_modules]
+
+def _is_filter(name):
+    return name in _filter_modules or name in _filter_registry
 
-def register_filter(name, filter_func):
+def _load_filter(name):
+    """
+    Get a filter function by name, importing its module on first use.
+
+    :return: The filter function, or None if the filter is unknown.
+    """
+    func = _filter_registry.get(name)
+    if func is None and name in _filter_modules:
+        importlib.import_module(_filter_modules[name], __package__)
+        func = _filter_registry.get(name)
+    return func
+
+def register_filter(name, filter_func, stage=None):
     """
     Register a filter function.
+
+    :param name: Name of the filter.
+    :param filter_func: Function applied to each frame.
+    :param stage: Optional FilterStage class used by the FilterPipeline.
     """
     _filter_registry[name] = filter_func
+    if stage is not None:
+        _filter_stages[filter_func] = (name, stage)
 
-def _filters():
+def _get_filter_stage(filter_func):
+    """
+    Get the registered name and stage class of a filter function.
+
+    :return: Tuple of (name, stage class), or None if the filter has no stage.
+    """
+    return _filter_stages.get(filter_func)
+
+def _filter_reference(filter_func):
     """
-    List of available filters.
+    Get a reference to a filter that can be sent to a worker process:
+    its registered name, or the function itself if it is not registered.
     """
     for name, func in _filter_registry.items():
+        if func is filter_func:
+            return name
+    return filter_func
+
+def _resolve_filter_reference(reference):
+    """
+    Get the filter function of a reference made by _filter_reference().
+    """
+    if isinstance(reference, str):
+        return _get_filter(reference)
+    return reference
+
+def _get_filter_settings(name):
+    """
+    Get whether a filter is enabled and its parameters.
+
+    :return: Tuple of (enabled, parameters).
+    """
+    settings = filters_config.get('filters', {}).get(name, {})
+    return settings.get('enabled', True), settings.get('parameters', {})
+
+def _get_capture_config():
+    """
+    Get the capture settings of the camera from the filters config.
+    """
+    return filters_config.get('capture') or {}
+
+def _get_config_version():
+    """
+    Get the version of the filters configuration, bumped on every change.
+    """
+    return _config_version
+
+def _get_config_state():
+    """
+    Get the version and the filters of the configuration, to send to a
+    worker process.
+    """
+    return _config_version, filters_config.get('filters', {})
+
+def _load_config_state(state):
+    """
+    Mirror the configuration of the main process in a worker process.
+
+    :param state: Tuple from _get_config_state().
+    """
+    global _config_version
+    version, filters = state
+    filters_config['filters'] = filters
+    _config_version = version
+
+def _bump_config_version():
+    """
+    Mark the filters configuration as changed.
+    """
+    global _config_version
+    _config_version += 1
+
+def _check_parameter(filter_name, key, current, value):
+    """
+    Check that a new parameter value has the type of the current one.
+    """
+    def is_number(v):
+        return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+    if current is None or (value is None and isinstance(current, dict)):
+        return
+    if is_number(current):
+        valid = is_number(value) and math.isfinite(value)
+    else:
+        valid = isinstance(value, type(current))
+    if not valid:
+        raise ValueError(
+            f"Parameter '{key}' of filter '{filter_name}' must be a "
+            f"{'number' if is_number(current) else type(current).__name__}, got {value!r}."
+        )
+
+def _validate_filters_config(config):
+    """
+    Validate a filters config before it replaces the current one.
+
+    Parameters that exist in the current config must keep their type, so a
+    typo cannot reach the filters of a running stream.
+
+    :param config: Parsed filters config.
+    :raises ValueError: If the config is invalid.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("The filters config must be a JSON object.")
+    if not isinstance(config.get('capture') or {}, dict):
+        raise ValueError("'capture' must be an object.")
+    filters = config.get('filters', {})
+    if not isinstance(filters, dict):
+        raise ValueError("'filters' must be an object.")
+
+    for name, settings in filters.items():
+        if not isinstance(settings, dict):
+            raise ValueError(f"Filter '{name}' must be an object.")
+        if not isinstance(settings.get('enabled', True), bool):
+            raise ValueError(f"'enabled' of filter '{name}' must be true or false.")
+        params = settings.get('parameters', {})
+        if not isinstance(params, dict):
+            raise ValueError(f"'parameters' of filter '{name}' must be an object.")
+        current = filters_config.get('filters', {}).get(name, {}).get('parameters', {})
+        for key, value in params.items():
+            if key in current:
+                _check_parameter(name, key, current[key], value)
+        _check_filter_parameters(name, params)
+
+def _check_filter_parameters(name, params):
+    """
+    Check the parameters of a filter with its stage, so a value the
+    pipelines would skip is rejected before it reaches the config.
+    """
+    func = _load_filter(name)
+    registered = _get_filter_stage(func) if func is not None else None
+    if registered is None:
+        return
+    stage_class = registered[1]
+    if stage_class.parameters is not None:
+        unknown = sorted(set(params) - set(stage_class.parameters))
+        if unknown:
+            raise ValueError(f"Unknown parameters of filter '{name}': {', '.join(unknown)}.")
+    try:
+        stage_class(name).validate(params)
+    except (TypeError, ValueError, KeyError, AttributeError) as e:
+        raise ValueError(f"Invalid parameters for filter '{name}': {e}") from e
+
+def _apply_filters_config(config):
+    """
+    Validate a filters config and swap it in.
+
+    The sections are replaced by single assignments, so readers see either
+    the old or the new filters, and the stages are reconfigured before
+    their next frame.
+
+    :param config: Parsed filters config.
+    :raises ValueError: If the config is invalid.
+    """
+    with _config_lock:
+        _validate_filters_config(config)
+        filters_config['filters'] = config.get('filters', {})
+        filters_config['capture'] = config.get('capture') or {}
+        _bump_config_version()
+
+def _update_filter_settings(name, enabled=None, parameters=None, save=False):
+    """
+    Update the settings of one filter at runtime.
+
+    :param name: Name of the filter.
+    :param enabled: New enabled flag, unchanged when None.
+    :param parameters: Parameters to change, the others are kept.
+    :param save: Also write the config file (default is False).
+    :return: New settings of the filter.
+    :raises KeyError: If the filter is unknown.
+    :raises ValueError: If a value is invalid.
+    """
+    with _config_lock:
+        filters = filters_config.get('filters', {})
+        if name not in filters and not _is_filter(name):
+            raise KeyError(name)
+
+        # Copy on write, so readers never see a half-updated filter
+        settings = copy.deepcopy(filters.get(name, {}))
+        if enabled is not None:
+            settings['enabled'] = enabled
+        if parameters:
+            settings['parameters'] = {**settings.get('parameters', {}), **parameters}
+        config = {**filters_config, 'filters': {**filters, name: settings}}
+        _validate_filters_config(config)
+
+        filters_config['filters'] = config['filters']
+        _bump_config_version()
+        if save:
+            _save_filters_config(config)
+        return settings
+
+def _save_filters_config(config):
+    """
+    Write the filters config file atomically.
+    """
+    temp_path = f"{_config_path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(config, f, indent=2)
+        f.write("\n")
+    os.replace(temp_path, _config_path)
+
+def _describe_filters():
+    """
+    Describe every known filter for the /filters endpoint.
+
+    :return: Dictionary of the settings of each filter by name.
+    """
+    filters = filters_config.get('filters', {})
+    names = _filter_names()
+    names += [name for name in filters if name not in names]
+    return {
+        name: {
+            "enabled": filters.get(name, {}).get('enabled', True),
+            "description": filters.get(name, {}).get('description', ""),
+            "parameters": filters.get(name, {}).get('parameters', {}),
+            "registered": _is_filter(name),
+        }
+        for name in names
+    }
+
+def _filters():
+    """
+    List of available filters, importing the enabled ones.
+    """
+    for name in _filter_names():
         if filters_config.get('filters', {}).get(name, {}).get('enabled', True):
-            yield name, func
+            yield name, _load_filter(name)
 
 def _get_filters_from_list(filters):
     """
@@ -38,7 +312,7 @@ def _get_filters_from_list(filters):
     _filters = []
 
     for filter_name in filters:
-        func = _filter_registry.get(filter_name)
+        func = _load_filter(filter_name)
         if func: 
             _filters.append(func)
         else:
@@ -50,7 +324,7 @@ def _get_filter(filter_name):
     """
     Get a filter function by name.
     """
-    func = _filter_registry.get(filter_name)
+    func = _load_filter(filter_name)
     if func:
         return func
     
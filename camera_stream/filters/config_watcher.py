@@ -0,0 +1,85 @@
+"""
+Watcher reloading the filters config when its file changes.
+"""
+
+import os
+import json
+import threading
+from . import config
+
+
+class ConfigWatcher:
+    def __init__(self, path=None, interval=1.0):
+        """
+        Poll the modification time of the filters config file and apply it
+        when it changes.
+
+        A file that does not parse or validate is reported and ignored, so
+        the stream keeps running with the last good config.
+
+        :param path: Path of the config file (default is filters_config.json).
+        :param interval: Polling interval in seconds (default is 1.0).
+        """
+        self.path = path or config._config_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = self._stat()
+        self.reloads = 0
+        self.errors = 0
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self):
+        """
+        Start watching the file on a background thread.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._signature = self._stat()
+        self._thread = threading.Thread(target=self._watch, name="config-watcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching the file.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """
+        Reload the config if the file changed since the last check.
+
+        :return: True if a new config was applied.
+        """
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+
+        try:
+            with open(self.path, 'r') as f:
+                new_config = json.load(f)
+            config._apply_filters_config(new_config)
+        except (OSError, json.JSONDecodeError, ValueError) as e:
+            self.errors += 1
+            print(f"Ignoring filters config change: {e}")
+            return False
+
+        self.reloads += 1
+        print("Filters config reloaded.")
+        return True
@@ -1,52 +1,218 @@
-import keyboard
-from keyboard._keyboard_event import KEY_DOWN, KEY_UP
 import threading
 import time
 
+class KeyStateTable:
+    def __init__(self):
+        """
+        Thread-safe table of the keys held down.
+
+        Every key has two counters: the number of times it went down, and
+        the press count it had when it last went up, so a key is down while
+        the first is ahead of the second. Pressing and releasing a key is a
+        dictionary update, and a release without a matching press can never
+        leave the key stuck down.
+
+        Readers never lock while no key changed: snapshot() returns the
+        same immutable state until the next press or release.
+        """
+        self._lock = threading.Lock()  # Serializes the writers
+        self._presses = {}
+        self._releases = {}
+        self._version = 0
+        self._state = (0, {}, {})  # (version, presses, releases) of the last snapshot
+
+    def press(self, key):
+        """
+        Mark a key as down. Repeated presses of a held key are ignored.
+        """
+        with self._lock:
+            presses = self._presses.get(key, 0)
+            if presses > self._releases.get(key, 0):
+                return
+            self._presses[key] = presses + 1
+            self._version += 1
+
+    def release(self, key):
+        """
+        Mark a key as up.
+        """
+        with self._lock:
+            presses = self._presses.get(key, 0)
+            if presses == self._releases.get(key, 0):
+                return
+            self._releases[key] = presses
+            self._version += 1
+
+    def clear(self):
+        """
+        Release every key.
+        """
+        with self._lock:
+            for key, presses in self._presses.items():
+                self._releases[key] = presses
+            self._version += 1
+
+    def is_pressed(self, key):
+        return self._presses.get(key, 0) > self._releases.get(key, 0)
+
+    def state(self):
+        """
+        Get the immutable (version, presses, releases) state of the keys.
+        """
+        state = self._state
+        if state[0] != self._version:
+            with self._lock:
+                state = (self._version, dict(self._presses), dict(self._releases))
+                self._state = state
+        return state
+
+    def load(self, state):
+        """
+        Replace the keys with a state from another table, e.g. the table
+        of the main process in a worker process.
+
+        :param state: State returned by state().
+        """
+        with self._lock:
+            self._version, presses, releases = state
+            self._presses = dict(presses)
+            self._releases = dict(releases)
+            self._state = state
+
+    def snapshot(self, previous=None):
+        """
+        Get a consistent view of the keys.
+
+        :param previous: Snapshot taken by the same reader on the previous
+                         frame, to detect the keys pressed and released since.
+        :return: KeySnapshot.
+        """
+        return KeySnapshot(self.state(), previous._state if previous is not None else None)
+
+class KeySnapshot:
+    __slots__ = ("_state", "_previous")
+
+    def __init__(self, state, previous=None):
+        """
+        Immutable view of the key states, with the edges since a previous view.
+
+        :param state: Tuple of (version, presses, releases) from KeyStateTable.
+        :param previous: State of the previous snapshot, None for no edges.
+        """
+        self._state = state
+        self._previous = previous
+
+    @property
+    def changed(self):
+        """
+        Whether any key was pressed or released since the previous snapshot.
+        """
+        return self._previous is not None and self._previous[0] != self._state[0]
+
+    def is_pressed(self, key) -> bool:
+        """
+        Whether the key is down.
+        """
+        _, presses, releases = self._state
+        return presses.get(key, 0) > releases.get(key, 0)
+
+    def was_pressed(self, key) -> bool:
+        """
+        Whether the key went down since the previous snapshot, even if it
+        was released again before this one.
+        """
+        if not self.changed:
+            return False
+        return self._state[1].get(key, 0) > self._previous[1].get(key, 0)
+
+    def was_released(self, key) -> bool:
+        """
+        Whether the key went up since the previous snapshot.
+        """
+        if not self.changed:
+            return False
+        return self._state[2].get(key, 0) > self._previous[2].get(key, 0)
+
+    def pressed_keys(self):
+        """
+        Get the keys that are down.
+        """
+        _, presses, releases = self._state
+        return [key for key, count in presses.items() if count > releases.get(key, 0)]
+
 class EventsManager:
-    events = []
+    keys = KeyStateTable()
     def __init__(self):
+        # The keyboard module is only imported by the modes reading keys
+        import keyboard
+
+        # Name of each held key by scan code: a key is released under the
+        # name it was pressed with, even if a modifier changed in between
+        self._held = {}
         keyboard.hook(lambda e: self.on_action(e))
-    
+
     def on_action(self, event):
-        if event.event_type == KEY_DOWN:
+        # Event types of the keyboard module: KEY_DOWN and KEY_UP
+        if event.event_type == "down":
             self.on_key_press(event)
-        elif event.event_type == KEY_UP:
+        elif event.event_type == "up":
             self.on_key_release(event)
 
     def on_key_press(self, event):
-        EventsManager.add_event(Event(Event.KEY_EVENT, event.name))
+        if event.scan_code is not None:
+            self._held.setdefault(event.scan_code, event.name)
+        EventsManager.keys.press(event.name)
 
     def on_key_release(self, event):
-        for _event in EventsManager.events:
-            if _event.name == Event.KEY_EVENT and event.name == _event.data:
-                EventsManager.remove_event(_event)
+        name = self._held.pop(event.scan_code, None)
+        if name is not None and name != event.name:
+            EventsManager.keys.release(name)
+        EventsManager.keys.release(event.name)
 
     @staticmethod
     def add_event(event):
-        for _event in EventsManager.events:
-            if _event.name == event.name and _event.data == event.data:
-                return
-        EventsManager.events.append(event)
+        if event.name == Event.KEY_EVENT:
+            EventsManager.keys.press(event.data)
 
     @staticmethod
     def remove_event(event):
-        if event not in EventsManager.events:
-            return
-        EventsManager.events.remove(event)
+        if event.name == Event.KEY_EVENT:
+            EventsManager.keys.release(event.data)
 
     def clear_events(self):
-        EventsManager.events.clear()
+        EventsManager.keys.clear()
 
     def get_events(self):
-        return EventsManager.events
-    
+        return [Event(Event.KEY_EVENT, key) for key in EventsManager.keys.snapshot().pressed_keys()]
+
     @staticmethod
     def get_key_pressed(key) -> bool:
-        for event in EventsManager.events:
-            if event.name == Event.KEY_EVENT and event.data == key:
-                return True
-        return False
+        return EventsManager.keys.is_pressed(key)
+
+    @staticmethod
+    def snapshot(previous=None):
+        """
+        Get a consistent view of the keys, to read once per frame.
+
+        :param previous: Snapshot of the previous frame, for the edges.
+        :return: KeySnapshot.
+        """
+        return EventsManager.keys.snapshot(previous)
+
+class KeyTrigger:
+    def __init__(self, key):
+        """
+        Callable returning True once each time a key goes down, e.g. to
+        bind an action to a key. Poll it from a single thread.
+
+        :param key: Name of the key, e.g. "r".
+        """
+        self.key = key
+        self._keys = None
+
+    def __call__(self) -> bool:
+        self._keys = EventsManager.snapshot(self._keys)
+        return self._keys.was_pressed(self.key)
 
 class Event:
     CLICK_EVENT = "click"
@@ -0,0 +1,223 @@
+"""
+Vectorized low-poly renderer used by the triangulate_effect filter.
+"""
+
+import cv2
+import numpy as np
+
+
+class LowPolyRenderer:
+    def __init__(self, triangulation_level=1, motion_threshold=8.0, rebuild_interval=4):
+        """
+        Initialize the renderer.
+
+        The mesh is a Delaunay triangulation of corners and a stratified
+        grid of points. It is rasterized once into a label map, and every
+        frame only computes the mean color of each triangle with
+        np.bincount and paints the label map with the palette.
+
+        :param triangulation_level: Density of the mesh, higher values give
+                                    smaller triangles (default is 1).
+        :param motion_threshold: Mean gray level difference from the frame
+                                 the mesh was built on above which the mesh
+                                 is rebuilt (default is 8.0).
+        :param rebuild_interval: Minimum number of frames between rebuilds,
+                                 the mesh is only recolored in between
+                                 (default is 4).
+        """
+        self.triangulation_level = 1
+        self.motion_threshold = motion_threshold
+        self.rebuild_interval = rebuild_interval
+        self.configure(triangulation_level, motion_threshold, rebuild_interval)
+
+        self._shape = None
+        self._labels = None          # Triangle index of every pixel
+        self._sample_labels = None   # Labels of the quarter resolution samples
+        self._counts = None          # Samples per triangle
+        self._centroids = None       # Pixel used for triangles without samples
+        self._reference = None       # Thumbnail the mesh was built on
+        self._sample = None
+        self._thumbnail = None
+        self._palette = None
+        self._packed = None
+        self._age = 0                # Frames rendered since the last rebuild
+        self.triangles = 0
+        self.rebuilds = 0
+
+    def configure(self, triangulation_level=1, motion_threshold=8.0, rebuild_interval=4):
+        """
+        Update the parameters, rebuilding the mesh if the density changed.
+        """
+        triangulation_level = max(1, int(triangulation_level))
+        if triangulation_level != self.triangulation_level:
+            self._shape = None
+        self.triangulation_level = triangulation_level
+        self.motion_threshold = float(motion_threshold)
+        self.rebuild_interval = max(1, int(rebuild_interval))
+
+    def _points(self, frame):
+        """
+        Choose the mesh vertices: strong corners, a stratified grid and
+        points along the borders so the mesh covers the whole frame.
+        """
+        h, w = frame.shape[:2]
+        spacing = max(8, round(min(w, h) / (4 + 4 * self.triangulation_level)))
+
+        # Corners on a quarter resolution gray image
+        gray = cv2.cvtColor(
+            cv2.resize(frame, (w // 4, h // 4), interpolation=cv2.INTER_LINEAR),
+            cv2.COLOR_BGR2GRAY,
+        )
+        corners = cv2.goodFeaturesToTrack(
+            gray, maxCorners=150 * self.triangulation_level,
+            qualityLevel=0.01, minDistance=max(1, spacing // 8),
+        )
+        corners = np.empty((0, 2)) if corners is None else corners.reshape(-1, 2) * 4
+
+        # One jittered point per grid cell, with a fixed seed so the mesh
+        # does not flicker when it is rebuilt on a similar frame
+        rng = np.random.default_rng(self.triangulation_level)
+        gx, gy = np.meshgrid(np.arange(spacing / 2, w, spacing), np.arange(spacing / 2, h, spacing))
+        grid = np.stack([gx.ravel(), gy.ravel()], axis=1)
+        grid += rng.uniform(-spacing / 3, spacing / 3, grid.shape)
+
+        xs = np.append(np.arange(0, w - 1, spacing), w - 1)
+        ys = np.append(np.arange(0, h - 1, spacing), h - 1)
+        border = np.concatenate([
+            np.stack([xs, np.zeros_like(xs)], axis=1),
+            np.stack([xs, np.full_like(xs, h - 1)], axis=1),
+            np.stack([np.zeros_like(ys), ys], axis=1),
+            np.stack([np.full_like(ys, w - 1), ys], axis=1),
+        ])
+
+        points = np.concatenate([corners, grid, border])
+        points[:, 0] = np.clip(points[:, 0], 0, w - 1)
+        points[:, 1] = np.clip(points[:, 1], 0, h - 1)
+        return np.unique(np.round(points).astype(np.float32), axis=0)
+
+    def _thumbnail_of(self, sample):
+        """
+        Get a small gray version of the frame samples to detect motion.
+        """
+        thumbnail = cv2.resize(sample, (64, 36), dst=self._thumbnail, interpolation=cv2.INTER_AREA)
+        self._thumbnail = thumbnail
+        return cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+
+    @staticmethod
+    def _rasterize(triangles, h, w):
+        """
+        Rasterize non-overlapping triangles covering the frame into a label
+        map without a loop over the triangles.
+
+        Every row of every triangle is reduced to the pixel its span starts
+        on, from the left edges of the triangle. Sorted by position, the
+        starts split each image row into runs of a single triangle, which
+        np.repeat expands into the label map.
+
+        :param triangles: Array of (count, 3, 2) integer vertices.
+        :return: Label map of shape (h, w).
+        """
+        count = len(triangles)
+        order = np.argsort(triangles[:, :, 1], axis=1)[:, :, None]
+        vertices = np.take_along_axis(triangles, order, axis=1).astype(np.float32)
+        (x0, y0), (x1, y1), (x2, y2) = vertices[:, 0].T, vertices[:, 1].T, vertices[:, 2].T
+
+        # Inverse slopes of the long edge and of the two short edges, which
+        # both go through the middle vertex
+        long_slope = (x2 - x0) / np.maximum(y2 - y0, 1)
+        upper_slope = (x1 - x0) / np.maximum(y1 - y0, 1)
+        lower_slope = (x2 - x1) / np.maximum(y2 - y1, 1)
+
+        # One span per row of every triangle
+        heights = (y2 - y0).astype(np.intp) + 1
+        index = np.repeat(np.arange(count), heights)
+        row = np.arange(len(index), dtype=np.float32) - np.repeat(np.cumsum(heights) - heights, heights)
+        y = y0[index] + row
+        middle = y - y1[index]
+        long = x0[index] + row * long_slope[index]
+        short = x1[index] + middle * np.where(middle < 0, upper_slope[index], lower_slope[index])
+        start = np.clip(np.rint(np.minimum(long, short)), 0, w - 1).astype(np.int64)
+        width = np.clip(np.rint(np.maximum(long, short)), 0, w - 1).astype(np.int64) - start
+
+        # Sort the starts, then the widths so the widest of the spans
+        # starting on a pixel wins over the tips of its neighbors, with the
+        # triangle index in the low digits. A start of triangle 0 comes
+        # first on every row so rows are never left empty.
+        keys = (((y.astype(np.int64) * w + start) * 2 + 1) * w + width) * count + index
+        rows = np.arange(h, dtype=np.int64) * (w * 2 * w * count)
+        keys = np.sort(np.concatenate([rows, keys]))
+        positions = keys // (2 * w * count)
+        labels = keys % count
+        return np.repeat(labels, np.diff(positions, append=h * w)).reshape(h, w)
+
+    def _build_mesh(self, frame, thumbnail):
+        """
+        Triangulate the frame and rasterize the triangles into the label map.
+        """
+        h, w = frame.shape[:2]
+        subdiv = cv2.Subdiv2D((0, 0, w, h))
+        subdiv.insert(self._points(frame))
+
+        triangles = subdiv.getTriangleList().reshape(-1, 3, 2)
+        inside = (
+            (triangles[:, :, 0] >= 0) & (triangles[:, :, 0] < w)
+            & (triangles[:, :, 1] >= 0) & (triangles[:, :, 1] < h)
+        ).all(axis=1)
+        triangles = np.round(triangles[inside]).astype(np.int32)
+
+        # Rasterizing happens only when the mesh is rebuilt
+        self._labels = self._rasterize(triangles, h, w)
+
+        self.triangles = count = len(triangles)
+        self._sample_labels = np.ascontiguousarray(self._labels[::4, ::4]).ravel()
+        self._counts = np.bincount(self._sample_labels, minlength=count)[:count]
+        centroids = triangles.mean(axis=1).astype(np.intp)
+        self._centroids = (centroids[:, 1], centroids[:, 0])
+
+        self._palette = np.zeros((count, 4), dtype=np.uint8)
+        self._packed = np.empty((h, w), dtype=np.uint32)
+        self._reference = thumbnail
+        self._shape = frame.shape
+        self._age = 0
+        self.rebuilds += 1
+
+    def render(self, frame, out=None):
+        """
+        Render the frame as flat-shaded triangles.
+
+        :param frame: BGR frame.
+        :param out: Optional output buffer with the shape of the frame.
+        :return: Low-poly frame.
+        """
+        # Quarter resolution samples, to color the triangles and detect motion
+        h, w = frame.shape[:2]
+        self._sample = cv2.resize(frame, ((w + 3) // 4, (h + 3) // 4), dst=self._sample,
+                                  interpolation=cv2.INTER_NEAREST)
+        thumbnail = self._thumbnail_of(self._sample)
+
+        # Under motion, the mesh is only rebuilt every rebuild_interval
+        # frames and recolored in between
+        self._age += 1
+        if self._shape != frame.shape or (
+            self._age >= self.rebuild_interval
+            and cv2.absdiff(thumbnail, self._reference).mean() > self.motion_threshold
+        ):
+            self._build_mesh(frame, thumbnail)
+
+        # Mean color of every triangle from the samples
+        samples = self._sample.reshape(-1, 3)
+        count = self.triangles
+        counts = np.maximum(self._counts, 1)
+        for channel in range(3):
+            sums = np.bincount(self._sample_labels, weights=samples[:, channel], minlength=count)
+            self._palette[:, channel] = sums[:count] / counts
+
+        # Triangles too small to get a sample take the color of their centroid
+        empty = self._counts == 0
+        if empty.any():
+            self._palette[empty, :3] = frame[self._centroids[0][empty], self._centroids[1][empty]]
+
+        # Paint the label map with the palette packed as 32-bit BGRA values
+        np.take(self._palette.view(np.uint32).ravel(), self._labels, out=self._packed)
+        bgra = self._packed.view(np.uint8).reshape(h, w, 4)
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
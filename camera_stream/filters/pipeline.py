@@ -0,0 +1,396 @@
+"""
+Fused filter pipeline with configuration resolved once and reused buffers.
+"""
+
+import sys
+import threading
+import time
+import numpy as np
+from .config import _get_filter_stage, _get_filter_settings, _get_config_version, \
+                    _filter_reference, _resolve_filter_reference, _get_config_state, \
+                    _load_config_state
+from .events import EventsManager
+from .change_detector import ChangeDetector
+
+
+class FilterStage:
+    # Whether process() can write into `out` when `out` is also the input
+    in_place = False
+    # Whether the stage changes the pixels, so a compressed camera frame
+    # must be decoded for it instead of being passed through
+    pixel = True
+    # Whether the output changes over time for the same input, like an
+    # animation, so an unchanged frame must still be processed
+    time_dependent = False
+    # Whether every output pixel only depends on one input pixel, at the
+    # same position or moved by map_region(), so the changed tiles of a
+    # frame can be processed alone
+    tiled = False
+    # Names of the parameters of the filter, or None to accept any
+    parameters = None
+
+    def __init__(self, name):
+        """
+        Initialize the stage of a registered filter.
+
+        :param name: Name of the filter in the filters config.
+        """
+        self.name = name
+
+    def configure(self, params):
+        """
+        Resolve the filter parameters into per-filter state.
+
+        Called when the pipeline is built and every time the filters config
+        changes, so process() never has to read the config.
+
+        :param params: Parameters of the filter from the filters config.
+        """
+
+    def validate(self, params):
+        """
+        Check new parameters before they replace the current ones in the
+        filters config, by configuring this stage with them. Stages whose
+        configure() changes shared state must check them without it.
+
+        :param params: New parameters of the filter.
+        :raises ValueError: If a parameter is invalid.
+        """
+        self.configure(params)
+
+    def process(self, frame, out):
+        """
+        Process a frame.
+
+        :param frame: Frame to process.
+        :param out: Preallocated buffer with the shape of the frame, or None.
+        :return: Processed frame, either `out` or a new array.
+        """
+        raise NotImplementedError
+
+    def map_region(self, region, shape):
+        """
+        Get the region of the output a region of the input ends up in, for
+        tiled stages moving pixels around.
+
+        :param region: Tuple of (y0, y1, x0, x1) in the input.
+        :param shape: Shape of the frame.
+        :return: Tuple of (y0, y1, x0, x1) in the output.
+        """
+        return region
+
+
+class _FunctionStage(FilterStage):
+    def __init__(self, func):
+        """
+        Stage calling a plain frame hook.
+
+        :param func: Function applied to each frame. A hook animated on the
+                     clock declares it with `func.time_dependent = True`.
+        """
+        super().__init__(getattr(func, "__name__", "hook"))
+        self.func = func
+        self.time_dependent = getattr(func, "time_dependent", False)
+
+    def process(self, frame, out):
+        return self.func(frame)
+
+
+class FilterPipeline:
+    def __init__(self, hooks, buffers=3, metrics=None, change_threshold=None):
+        """
+        Initialize the pipeline from a list of frame hooks.
+
+        :param hooks: List of frame hooks, usually Camera.frame_hooks.
+        :param buffers: Number of output buffers to rotate. A buffer still
+                        referenced outside the pipeline, e.g. by the frame
+                        buffer, an encoder, the recorder or the frame sink,
+                        is replaced with a new one instead of overwritten.
+        :param metrics: Optional StreamMetrics timing every stage.
+        :param change_threshold: Reuse the previous output when no tile of
+                                 the frame changed by more than this mean
+                                 level, and only process the changed tiles
+                                 when every stage is tiled (default is None
+                                 to process every frame whole).
+        """
+        self.hooks = hooks
+        self.metrics = metrics
+        self.stages = []
+        self._timers = []
+        self._stage_cache = {}
+        self._version = None
+        self._hook_count = 0
+        self._buffers = [None] * buffers
+        self._buffer_index = 0
+        self.detector = ChangeDetector(change_threshold) if change_threshold is not None else None
+        self.repeated = False  # Whether the last call returned the previous output
+        self._reusable = False  # Whether no stage is time-dependent
+        self._tiled = False
+        self._last = None  # Last output, while it is one of the buffers
+        self._cost = 0.0  # Duration of the last whole frame
+
+    def invalidate(self):
+        """
+        Rebuild the stages before the next frame, e.g. after adding a hook.
+        """
+        self._version = None
+
+    def _build(self):
+        """
+        Resolve the filters config into the list of active stages.
+        """
+        stages = []
+        for hook in self.hooks:
+            stage = self._stage_cache.get(hook)
+            registered = _get_filter_stage(hook)
+            if registered is None:
+                if stage is None:
+                    stage = self._stage_cache[hook] = _FunctionStage(hook)
+                stages.append(stage)
+                continue
+
+            name, stage_class = registered
+            enabled, params = _get_filter_settings(name)
+            if not enabled:
+                continue
+            configured = stage is not None
+            if stage is None:
+                stage = stage_class(name)
+            try:
+                stage.configure(params)
+            except (TypeError, ValueError, KeyError) as e:
+                # Keep the last working parameters rather than stop the stream
+                print(f"Invalid parameters for filter '{name}': {e}")
+                if not configured:
+                    continue
+            self._stage_cache[hook] = stage
+            stages.append(stage)
+
+        self.stages = stages
+        if self.metrics is not None:
+            self._timers = [self.metrics.stage(f"filter:{stage.name}") for stage in stages]
+        self._version = _get_config_version()
+        self._hook_count = len(self.hooks)
+
+        # The previous output was made with other stages or parameters
+        self._reusable = not any(stage.time_dependent for stage in stages)
+        self._tiled = self._reusable and all(stage.tiled for stage in stages)
+        self._last = None
+        if self.detector is not None:
+            self.detector.reset()
+
+    def _next_buffer(self, frame):
+        """
+        Get the next output buffer, allocating it if the frame shape changed
+        or the frame it holds is still in use.
+        """
+        self._buffer_index = (self._buffer_index + 1) % len(self._buffers)
+        buffer = self._buffers[self._buffer_index]
+        # The list, the local variable and the argument of getrefcount() are
+        # the only references of a free buffer, views of it count as users
+        if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype or \
+                sys.getrefcount(buffer) > 3:
+            buffer = self._buffers[self._buffer_index] = np.empty_like(frame)
+        return buffer
+
+    def _refresh(self):
+        """
+        Rebuild the stages if the filters config or the hooks changed.
+        """
+        if self._version != _get_config_version() or self._hook_count != len(self.hooks):
+            self._build()
+
+    @property
+    def needs_pixels(self):
+        """
+        Whether an active stage changes the pixels of the frames.
+        """
+        self._refresh()
+        return any(stage.pixel for stage in self.stages)
+
+    def __call__(self, frame):
+        """
+        Run every active stage on a frame.
+
+        :param frame: Frame read from the camera.
+        :return: Processed frame.
+        """
+        self._refresh()
+        self.repeated = False
+
+        if not self.stages:
+            return frame
+        if self.detector is not None and self._reusable:
+            return self._process_changes(frame)
+        return self._process(frame)
+
+    def _process(self, frame):
+        """
+        Run every active stage on the whole frame.
+        """
+        timed = self.metrics is not None and self.metrics.enabled
+        out = self._next_buffer(frame)
+        for index, stage in enumerate(self.stages):
+            dst = out if (frame is not out or stage.in_place) else None
+            if dst is not None and dst.shape != frame.shape:
+                dst = None
+            if timed:
+                start = time.perf_counter()
+                frame = stage.process(frame, dst)
+                self._timers[index].observe(time.perf_counter() - start)
+            else:
+                frame = stage.process(frame, dst)
+        return frame
+
+    def _process_regions(self, frame, regions):
+        """
+        Run every active stage on the changed regions of a frame only, on
+        a copy of the previous output.
+        """
+        out = self._next_buffer(frame)
+        np.copyto(out, self._last)
+        for index, stage in enumerate(self.stages):
+            src = frame if index == 0 else out
+            inputs = [src[y0:y1, x0:x1] for y0, y1, x0, x1 in regions]
+            targets = [stage.map_region(region, frame.shape) for region in regions]
+            moved = targets != regions
+            if moved and index > 0:
+                # Read every region before writing any, as they can overlap
+                inputs = [region.copy() for region in inputs]
+            for region, (y0, y1, x0, x1) in zip(inputs, targets):
+                target = out[y0:y1, x0:x1]
+                dst = target if (index == 0 or stage.in_place or moved) else None
+                result = stage.process(region, dst)
+                if result is not target:
+                    target[...] = result
+            regions = targets
+        return out
+
+    def unchanged(self, frame):
+        """
+        Compare a frame with the previous ones when the stages run
+        elsewhere, like on the workers of an OrderedFramePool, so the
+        frames are compared in capture order before they are fanned out.
+
+        :param frame: Frame read from the camera.
+        :return: True when no tile changed and no active stage is
+                 time-dependent, so the previous output can be reused.
+        """
+        self._refresh()
+        if self.detector is None or not self.stages or not self._reusable:
+            return False
+        start = time.perf_counter()
+        regions = self.detector.compare(frame)
+        unchanged = regions is not None and not regions
+
+        metrics = self.metrics
+        if metrics is not None and metrics.enabled:
+            metrics.observe("detect_changes", time.perf_counter() - start)
+            if unchanged:
+                metrics.count("unchanged_frames")
+        return unchanged
+
+    def _process_changes(self, frame):
+        """
+        Run the stages on the tiles of a frame that changed: reuse the
+        previous output when none did, and process the frame whole when
+        the stages cannot be run on tiles.
+        """
+        start = time.perf_counter()
+        regions = self.detector.compare(frame)
+        detected = time.perf_counter()
+
+        last = self._last
+        if last is not None and regions is not None and not regions:
+            self.repeated = True
+            frame = last
+        elif last is not None and regions and self._tiled:
+            frame = self._process_regions(frame, regions)
+        else:
+            frame = self._process(frame)
+            self._cost = time.perf_counter() - detected
+            last = None
+        # Keep the output only while the following frames cannot overwrite it
+        self._last = frame if any(frame is buffer for buffer in self._buffers) else None
+
+        metrics = self.metrics
+        if metrics is not None and metrics.enabled:
+            end = time.perf_counter()
+            metrics.observe("detect_changes", detected - start)
+            if last is not None:
+                metrics.count("unchanged_frames" if self.repeated else "tiled_frames")
+                metrics.count("cpu_saved_seconds", max(0.0, self._cost - (end - detected)))
+        return frame
+
+
+# Pipelines of the workers of an OrderedFramePool. Each worker thread or
+# process gets its own pipeline, so output buffers are never shared. Workers
+# get frames out of order, so changes are detected before the fan-out and
+# the workers process every frame whole.
+_thread_pipelines = threading.local()
+_process_pipeline = None
+
+
+def _run_thread_pipeline(hooks, frame, metrics=None):
+    """
+    Run the pipeline of the calling worker thread on a frame.
+
+    :param hooks: Shared list of frame hooks, usually Camera.frame_hooks.
+    :param frame: Frame to process.
+    :param metrics: Optional StreamMetrics timing every stage.
+    :return: Processed frame.
+    """
+    pipeline = getattr(_thread_pipelines, "pipeline", None)
+    if pipeline is None or pipeline.hooks is not hooks or pipeline.metrics is not metrics:
+        pipeline = _thread_pipelines.pipeline = FilterPipeline(hooks, metrics=metrics)
+    return pipeline(frame)
+
+
+def _process_hook_references(hooks):
+    """
+    Get the hooks to send to worker processes: registered filters are sent
+    by name and looked up in the worker's filter registry.
+    """
+    return [_filter_reference(hook) for hook in hooks]
+
+
+def _init_process_pipeline(hooks):
+    """
+    Build the pipeline of a worker process.
+
+    :param hooks: List of hook references from _process_hook_references().
+                  Hooks that are not registered are pickled, so they must be
+                  module-level functions.
+    """
+    global _process_pipeline
+    _process_pipeline = FilterPipeline([_resolve_filter_reference(hook) for hook in hooks])
+
+
+def _process_context():
+    """
+    Get the state of the main process that worker processes mirror before
+    each frame: the filters config, changed over HTTP or reloaded from the
+    file, and the keys held down.
+
+    :return: Tuple of the config state and the key state, each starting
+             with its version.
+    """
+    return _get_config_state(), EventsManager.keys.state()
+
+
+def _run_process_pipeline(frame, context=None):
+    """
+    Run the pipeline of the calling worker process on a frame.
+
+    :param frame: Frame to process.
+    :param context: Latest state from _process_context() published by the
+                    main process, or None.
+    :return: Processed frame.
+    """
+    if context is not None:
+        config_state, key_state = context
+        if config_state[0] != _get_config_version():
+            _load_config_state(config_state)
+        if key_state[0] != EventsManager.keys.state()[0]:
+            EventsManager.keys.load(key_state)
+    return _process_pipeline(frame)
@@ -1,6 +1,10 @@
+import time
+import threading
 import cv2
+import numpy as np
 from .events import EventsManager
 from .config import filters_config, register_filter
+from .pipeline import FilterStage
 
 def _empty(frame):
     """
@@ -14,99 +18,214 @@ def zoom_in_effect(frame):
     """
     if not filters_config.get('filters', {}).get('zoom_in_effect', {}).get('enabled', True):
         return _empty(frame)
-    
-    config_key = filters_config.get('filters', {}).get('zoom_in_effect', {}).get('parameters', {}).get('key', 'space')
 
-    if EventsManager.get_key_pressed(config_key):
-        return ZoomInSnapshot.create_snapshot(frame)
-    
-    return ZoomInSnapshot.update(frame)
+    params = filters_config.get('filters', {}).get('zoom_in_effect', {}).get('parameters', {})
+    ZoomInSnapshot.configure(params)
 
-# Register the filter
-register_filter('zoom_in_effect', zoom_in_effect)
-
-class Snapshot:
-    def __init__(self, scale=1, scale_speed=0.01):
-        # Get parameters from config if available
-        params = filters_config.get('filters', {}).get('zoom_in_effect', {}).get('parameters', {})
-        
-        self.scale = params.get('initial_scale', scale)
-        self.scale_speed = params.get('scale_speed', scale_speed)
-        self.max_scale = params.get('max_scale', 3)
-        self.opacity = params.get('opacity', 1.0)
-        self.total_duration = params.get('total_duration', 1.0)
-        self.animation_time = params.get('initial_animation_time', 0)
-        self._snapshot = None
-
-    def update(self, frame):
-        # Create a snapshot of the current frame with the current scale
-        self._snapshot = cv2.resize(frame.copy(), None, fx=self.scale, fy=self.scale)
-
-        # Calculate progress (0 to 1) based on animation time
-        progress = min(self.animation_time / self.total_duration, 1.0)
+    global _last_keys
+    keys = _last_keys = EventsManager.snapshot(_last_keys)
+    key = params.get('key', 'space')
+    if keys.is_pressed(key) or keys.was_pressed(key):
+        return ZoomInSnapshot.create_snapshot(frame)
 
-        # Update scale and opacity based on animation progress
-        self.scale = 1 + (2 * progress)  # Scale from 1 to 3
-        self.opacity = max(0, 1 - progress)  # Opacity from 1 to 0
+    return ZoomInSnapshot.update(frame)
 
-        # Increment animation time
-        self.animation_time += self.scale_speed
+_last_keys = None  # Key snapshot of the previous zoom_in_effect() call
+
+class ZoomInStage(FilterStage):
+    in_place = True
+    # Snapshots zoom in on the clock, and key presses are read every frame
+    time_dependent = True
+    parameters = ("max_snapshots", "max_scale", "opacity", "total_duration", "key")
+
+    def __init__(self, name):
+        super().__init__(name)
+        # Each pipeline has its own buffers, so worker threads never share them
+        self.compositor = _ZoomCompositor()
+        self.keys = None  # Key snapshot of the previous frame
+
+    def configure(self, params):
+        self.key = params.get('key', 'space')
+        ZoomInSnapshot.configure(params)
+
+    def validate(self, params):
+        # configure() changes the settings shared by every pipeline
+        if not isinstance(params.get('key', 'space'), str):
+            raise ValueError("'key' must be a string.")
+        ZoomInSnapshot.parse(params)
+
+    def process(self, frame, out):
+        # A tap shorter than a frame still starts a snapshot
+        keys = self.keys = EventsManager.snapshot(self.keys)
+        if keys.is_pressed(self.key) or keys.was_pressed(self.key):
+            return ZoomInSnapshot.create_snapshot(frame, out, self.compositor)
+        return ZoomInSnapshot.update(frame, out, self.compositor)
 
-        return self.scale <= self.max_scale and self.opacity > 0
+# Register the filter
+register_filter('zoom_in_effect', zoom_in_effect, stage=ZoomInStage)
+
+class _SnapshotRing:
+    def __init__(self, capacity):
+        """
+        Fixed-capacity ring buffer of preallocated snapshot slots.
+
+        A slot only holds the start time of its snapshot, so creating a
+        snapshot never allocates, and a full ring evicts the oldest one.
+
+        :param capacity: Maximum number of live snapshots.
+        """
+        self.capacity = max(1, int(capacity))
+        self.start_times = np.full(self.capacity, -np.inf)
+        self.head = 0  # Slot of the next snapshot
+
+    def add(self, start_time):
+        """
+        Start a snapshot in the oldest slot.
+        """
+        self.start_times[self.head] = start_time
+        self.head = (self.head + 1) % self.capacity
+
+    def progress(self, now, duration):
+        """
+        Get the animation progress of the live snapshots, newest first.
+
+        :return: Array of progress values from 0 to 1, expired snapshots excluded.
+        """
+        # Newest slot first, as the layers are blended from newest to oldest
+        order = (self.head - 1 - np.arange(self.capacity)) % self.capacity
+        progress = (now - self.start_times[order]) / duration
+        return progress[(progress >= 0) & (progress < 1)]
+
+    def clear(self):
+        self.start_times.fill(-np.inf)
+
+class _ZoomCompositor:
+    def __init__(self):
+        """
+        Composite zoomed layers of a frame without per-frame allocations.
+
+        Each layer only resizes the visible center crop of the frame into a
+        reused frame-sized buffer, instead of upscaling the whole frame and
+        cropping it. All layers are blended into one float accumulator and
+        rounded once at the end.
+        """
+        self._layer = None
+        self._accumulator = None
+
+    def _ensure_buffers(self, frame):
+        if self._layer is None or self._layer.shape != frame.shape:
+            self._layer = np.empty_like(frame)
+            self._accumulator = np.empty(frame.shape, dtype=np.float32)
+
+    def _render_layer(self, frame, scale):
+        """
+        Render the frame zoomed by `scale` around its center into the layer buffer.
+        """
+        frame_h, frame_w = frame.shape[:2]
+        crop_w = max(1, round(frame_w / scale))
+        crop_h = max(1, round(frame_h / scale))
+        x, y = (frame_w - crop_w) // 2, (frame_h - crop_h) // 2
+        return cv2.resize(
+            frame[y:y + crop_h, x:x + crop_w], (frame_w, frame_h),
+            dst=self._layer, interpolation=cv2.INTER_LINEAR,
+        )
+
+    def render(self, frame, layers, out=None):
+        """
+        Blend the zoomed layers over the frame.
+
+        :param frame: Frame to zoom into.
+        :param layers: List of (scale, opacity) in blending order. Scales
+                       below 1 are rendered at 1 so a layer always covers
+                       the whole frame.
+        :param out: Optional output buffer, may be the frame itself.
+        :return: Composited frame.
+        """
+        # Layers under a fully opaque one are never visible
+        start = 0
+        for i, (_, opacity) in enumerate(layers):
+            if opacity >= 1.0:
+                start = i
+        layers = [(scale, opacity) for scale, opacity in layers[start:] if opacity > 0]
+        if not layers:
+            return frame
+
+        self._ensure_buffers(frame)
+        accumulator = self._accumulator
+        accumulator[...] = frame
+        for scale, opacity in layers:
+            layer = self._render_layer(frame, max(scale, 1.0))
+            cv2.accumulateWeighted(layer, accumulator, min(opacity, 1.0))
+
+        if out is None:
+            out = np.empty_like(frame)
+        return cv2.convertScaleAbs(accumulator, out)
 
 class ZoomInSnapshot:
-    snapshots = []
     max_snapshots = 10
+    max_scale = 3.0
+    total_duration = 0.33  # Seconds for a snapshot to zoom in and fade out
+    ring = _SnapshotRing(max_snapshots)
+    compositor = _ZoomCompositor()
+    clock = time.monotonic
+    _lock = threading.Lock()
 
     # Initialize with config parameters
     @staticmethod
     def load_config():
-        if 'zoom_in_effect' in filters_config.get('filters', {}):
-            params = filters_config['filters']['zoom_in_effect'].get('parameters', {})
-            ZoomInSnapshot.max_snapshots = params.get('max_snapshots', ZoomInSnapshot.max_snapshots)
+        params = filters_config.get('filters', {}).get('zoom_in_effect', {}).get('parameters', {})
+        ZoomInSnapshot.configure(params)
+
+    @staticmethod
+    def parse(params):
+        """
+        Convert the zoom_in_effect parameters.
+
+        :return: Tuple of (max_scale, total_duration, max_snapshots).
+        """
+        return (float(params.get('max_scale', 3.0)),
+                max(float(params.get('total_duration', 0.33)), 1e-3),
+                int(params.get('max_snapshots', 10)))
+
+    @staticmethod
+    def configure(params):
+        """
+        Apply the zoom_in_effect parameters, keeping the live snapshots
+        unless the number of slots changes.
+        """
+        max_scale, total_duration, max_snapshots = ZoomInSnapshot.parse(params)
+        ZoomInSnapshot.max_scale = max_scale
+        ZoomInSnapshot.total_duration = total_duration
+        if max_snapshots != ZoomInSnapshot.max_snapshots:
+            with ZoomInSnapshot._lock:
+                ZoomInSnapshot.max_snapshots = max_snapshots
+                ZoomInSnapshot.ring = _SnapshotRing(max_snapshots)
 
     def __init__(self):
         # Load configuration when instantiated
         ZoomInSnapshot.load_config()
 
     @staticmethod
-    def create_snapshot(frame):
-        if len(ZoomInSnapshot.snapshots) >= ZoomInSnapshot.max_snapshots:
-            ZoomInSnapshot.snapshots.pop()
-        ZoomInSnapshot.snapshots.append(Snapshot())
-        return ZoomInSnapshot.update(frame)
+    def create_snapshot(frame, out=None, compositor=None):
+        with ZoomInSnapshot._lock:
+            ZoomInSnapshot.ring.add(ZoomInSnapshot.clock())
+        return ZoomInSnapshot.update(frame, out, compositor)
 
     @staticmethod
-    def update(frame):
-        result_frame = frame.copy()
-
-        # Remove expired snapshots and update remaining ones
-        ZoomInSnapshot.snapshots = [s for s in ZoomInSnapshot.snapshots if s.update(frame)]
-
-        for snapshot in ZoomInSnapshot.snapshots[::-1]:
-            if snapshot._snapshot is None:
-                continue
-
-            # Center the snapshot
-            h, w = snapshot._snapshot.shape[:2]
-            frame_h, frame_w = frame.shape[:2]
-            x, y = (frame_w - w) // 2, (frame_h - h) // 2
-
-            # Calculate valid regions
-            x_start, y_start = max(0, x), max(0, y)
-            x_end, y_end = min(frame_w, x + w), min(frame_h, y + h)
-            snap_x_start, snap_y_start = max(0, -x), max(0, -y)
-            snap_x_end = snap_x_start + (x_end - x_start)
-            snap_y_end = snap_y_start + (y_end - y_start)
-
-            # Get regions of interest
-            roi = result_frame[y_start:y_end, x_start:x_end]
-            snap_roi = snapshot._snapshot[snap_y_start:snap_y_end, snap_x_start:snap_x_end]
-
-            if roi.shape == snap_roi.shape:
-                if snapshot.opacity < 1.0:
-                    cv2.addWeighted(snap_roi, snapshot.opacity, roi, 1.0 - snapshot.opacity, 0, roi)
-                else:
-                    result_frame[y_start:y_end, x_start:x_end] = snap_roi
-
+    def update(frame, out=None, compositor=None):
+        # Progress is driven by the clock, so the animation does not depend
+        # on the frame rate or on how often the filter is called
+        with ZoomInSnapshot._lock:
+            progress = ZoomInSnapshot.ring.progress(
+                ZoomInSnapshot.clock(), ZoomInSnapshot.total_duration
+            )
+
+        layers = [
+            (1 + (ZoomInSnapshot.max_scale - 1) * p, 1 - p)  # Zoom in and fade out
+            for p in progress.tolist()
+        ]
+        compositor = compositor or ZoomInSnapshot.compositor
+        result_frame = compositor.render(frame, layers, out)
+        if result_frame is frame and out is None:
+            return frame.copy()
         return result_frame
@@ -0,0 +1,442 @@
+"""
+HTTP server backends of the camera stream.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import make_server
+from flask import render_template
+from utils import FRAME_HEADER, frame_header
+from filters import _describe_filters
+
+
+class FlaskServer:
+    def __init__(self, camera_stream, host="127.0.0.1", port=7277):
+        """
+        Threaded Werkzeug server running the Flask app of a camera stream.
+
+        Every client is served by its own thread, so it suits a handful of
+        viewers such as OBS and a preview monitor.
+
+        :param camera_stream: CameraStream to serve.
+        :param host: Host address to bind the server.
+        :param port: Port number to bind the server.
+        """
+        self.camera_stream = camera_stream
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """
+        Bind the port and serve requests on a background thread.
+        """
+        self._server = make_server(self.host, self.port, self.camera_stream.app, threaded=True)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop accepting requests. Streaming clients end when the frame
+        buffer is closed.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join(timeout=2)
+            self._server = None
+            self._thread = None
+
+
+class _AsyncClient:
+    def __init__(self, settings, stats=None):
+        """
+        Depth-1 frame slot of an async stream client, dropping the oldest
+        frame like FrameSubscription does for threaded clients.
+
+        :param settings: Encode settings of the client.
+        :param stats: Optional ClientStats of the client.
+        """
+        self.settings = settings
+        self.stats = stats
+        self.item = None
+        self.ready = asyncio.Event()
+        self.acked = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        if self.item is not None:
+            self.dropped += 1
+        self.item = item
+        self.ready.set()
+
+    async def get(self):
+        await self.ready.wait()
+        self.ready.clear()
+        item, self.item = self.item, None
+        return item
+
+    def ack(self, sequence):
+        if sequence >= self.sent:
+            self.acked.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+        self.acked.set()
+
+
+class AsyncServer:
+    def __init__(self, camera_stream, host="127.0.0.1", port=7277, encode_workers=2,
+                 shutdown_timeout=2.0):
+        """
+        aiohttp server serving every client from a single event loop.
+
+        One bridge thread reads the frame buffer and hands each frame to the
+        clients on the loop. Frames are encoded once per tier and per frame on
+        a small thread pool, and writes wait for each client's socket without
+        blocking the others, so a slow viewer only drops frames.
+
+        :param camera_stream: CameraStream to serve.
+        :param host: Host address to bind the server.
+        :param port: Port number to bind the server.
+        :param encode_workers: Number of threads encoding JPEGs (default is 2).
+        :param shutdown_timeout: Time given to open connections to close
+                                 when stopping, in seconds (default is 2.0).
+        """
+        self.camera_stream = camera_stream
+        self.host = host
+        self.port = port
+        self.encode_workers = encode_workers
+        self.shutdown_timeout = shutdown_timeout
+        self._loop = None
+        self._thread = None
+        self._bridge_thread = None
+        self._executor = None
+        self._started = threading.Event()
+        self._start_error = None
+        self._stop_event = None
+        self._clients = set()
+        self._streams = {}
+        self._next_stream_id = 0
+        self._encodes = {}
+        self._index = None
+
+    def _create_app(self):
+        try:
+            from aiohttp import web
+        except ImportError:
+            raise RuntimeError("The async server requires aiohttp: pip install aiohttp") from None
+
+        app = web.Application()
+        app.router.add_get('/', self._handle_index)
+        app.router.add_get('/video_feed', self._handle_video_feed)
+        app.router.add_get('/frames', self._handle_frames)
+        app.router.add_post('/ack', self._handle_ack)
+        app.router.add_get('/filters', self._handle_filters)
+        app.router.add_patch('/filters/{name}', self._handle_update_filter)
+        app.router.add_get('/recorder', self._handle_recorder)
+        app.router.add_post('/recorder/{action}', self._handle_recorder_action)
+        app.router.add_get('/metrics', self._handle_metrics)
+        app.router.add_get('/stats.json', self._handle_stats)
+        return web, app
+
+    def start(self):
+        """
+        Bind the port and run the event loop on a background thread.
+        """
+        web, app = self._create_app()
+
+        # Render the page with the Flask template so both servers serve the same one
+        with self.camera_stream.app.test_request_context():
+            self._index = render_template('index.html')
+
+        self._executor = ThreadPoolExecutor(max_workers=self.encode_workers,
+                                            thread_name_prefix="encode")
+        self._started.clear()
+        self._start_error = None
+        self._thread = threading.Thread(target=self._run, args=(web, app))
+        self._thread.daemon = True
+        self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            self._thread.join()
+            self._executor.shutdown(wait=False)
+            raise self._start_error
+
+        self._bridge_thread = threading.Thread(target=self._bridge_frames)
+        self._bridge_thread.daemon = True
+        self._bridge_thread.start()
+
+    def _run(self, web, app):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._serve(web, app))
+        finally:
+            self._loop.close()
+
+    async def _serve(self, web, app):
+        self._stop_event = asyncio.Event()
+        runner = web.AppRunner(app, shutdown_timeout=self.shutdown_timeout, access_log=None)
+        try:
+            await runner.setup()
+            site = web.TCPSite(runner, self.host, self.port)
+            await site.start()
+            if runner.addresses:
+                self.port = runner.addresses[0][1]
+        except Exception as e:
+            self._start_error = e
+            self._started.set()
+            await runner.cleanup()
+            return
+
+        self._started.set()
+        await self._stop_event.wait()
+
+        # Release the streaming handlers so they return before the cleanup
+        for client in list(self._clients):
+            client.close()
+        await runner.cleanup()
+
+    def stop(self):
+        """
+        Close every client and stop the event loop.
+        """
+        if self._thread is None:
+            return
+        if self._loop is not None and self._stop_event is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                pass  # The loop already ended
+        self._thread.join(timeout=self.shutdown_timeout + 2)
+        if self._bridge_thread is not None:
+            self._bridge_thread.join(timeout=2)
+        self._executor.shutdown(wait=False)
+        self._thread = None
+        self._bridge_thread = None
+        self._loop = None
+
+    def _bridge_frames(self):
+        """
+        Read the published frames on a thread and dispatch them on the loop.
+        """
+        frame_buffer = self.camera_stream.frame_buffer
+        subscription = frame_buffer.subscribe()
+        try:
+            while self._thread is not None and not subscription.closed:
+                item = subscription.get()
+                if item is None:
+                    continue
+                loop = self._loop
+                if loop is None or loop.is_closed():
+                    break
+                try:
+                    loop.call_soon_threadsafe(self._dispatch, item)
+                except RuntimeError:
+                    break  # The loop was closed
+        finally:
+            frame_buffer.unsubscribe(subscription)
+            loop = self._loop
+            if loop is not None and not loop.is_closed():
+                try:
+                    loop.call_soon_threadsafe(self._close_clients)
+                except RuntimeError:
+                    pass
+
+    def _dispatch(self, item):
+        for client in self._clients:
+            client.put(item)
+
+    def _close_clients(self):
+        for client in list(self._clients):
+            client.close()
+
+    async def _encode(self, sequence, frame, settings, chunk):
+        """
+        Get the encoded frame of a tier, encoding it once on the thread pool
+        however many clients of the tier wait for it.
+        """
+        cache = self.camera_stream.jpeg_cache
+        encode = cache.get_chunk if chunk else cache.get_jpeg
+        key = (settings, chunk)
+        entry = self._encodes.get(key)
+        if entry is None or entry[0] < sequence:
+            future = self._loop.run_in_executor(self._executor, encode, sequence, frame, settings)
+            entry = self._encodes[key] = (sequence, future)
+        elif entry[0] > sequence:
+            return await self._loop.run_in_executor(self._executor, encode, sequence, frame, settings)
+        return await entry[1]
+
+    def _open_client(self, request):
+        camera_stream = self.camera_stream
+        settings = camera_stream._open_tier(_int_arg(request, 'q'), _int_arg(request, 'w'))
+        stats = camera_stream.metrics.add_client(request.remote, settings)
+        client = _AsyncClient(settings, stats)
+        if not camera_stream.running:
+            client.close()
+        self._clients.add(client)
+        return client
+
+    def _close_client(self, client):
+        self._clients.discard(client)
+        client.close()
+        self.camera_stream.jpeg_cache.close_tier(client.settings)
+        if not any(other.settings == client.settings for other in self._clients):
+            # Forget the last encode of the tier
+            self._encodes.pop((client.settings, True), None)
+            self._encodes.pop((client.settings, False), None)
+        if client.stats is not None:
+            client.stats.dropped = client.dropped
+            self.camera_stream.metrics.remove_client(client.stats)
+
+    def _count_sent(self, client, size, start):
+        metrics = self.camera_stream.metrics
+        if metrics.enabled:
+            metrics.observe("send", time.perf_counter() - start)
+            if client.stats is not None:
+                client.stats.frames += 1
+                client.stats.bytes += size
+                client.stats.dropped = client.dropped
+
+    async def _handle_index(self, request):
+        from aiohttp import web
+        return web.Response(text=self._index, content_type='text/html')
+
+    async def _handle_video_feed(self, request):
+        from aiohttp import web
+        response = web.StreamResponse(headers={
+            'Content-Type': 'multipart/x-mixed-replace; boundary=frame',
+        })
+        client = self._open_client(request)
+        try:
+            await response.prepare(request)
+            while not client.closed:
+                item = await client.get()
+                if item is None:
+                    continue
+                sequence, frame, _ = item
+                chunk = await self._encode(sequence, frame, client.settings, True)
+                start = time.perf_counter()
+                await response.write(chunk)
+                self._count_sent(client, len(chunk), start)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._close_client(client)
+        return response
+
+    async def _handle_frames(self, request):
+        from aiohttp import web
+        client = self._open_client(request)
+        self._next_stream_id += 1
+        stream_id = str(self._next_stream_id)
+        self._streams[stream_id] = client
+        response = web.StreamResponse(headers={
+            'Content-Type': 'application/octet-stream',
+            'Cache-Control': 'no-store',
+            'X-Stream-Id': stream_id,
+        })
+        try:
+            await response.prepare(request)
+            client.acked.set()
+            while not client.closed:
+                # Send the next frame once the previous one was acknowledged
+                try:
+                    await asyncio.wait_for(client.acked.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    pass
+                item = await client.get()
+                if item is None:
+                    continue
+                sequence, frame, captured = item
+                jpeg = await self._encode(sequence, frame, client.settings, False)
+                client.acked.clear()
+                client.sent = sequence
+                start = time.perf_counter()
+                await response.write(frame_header(sequence, captured, jpeg))
+                await response.write(jpeg)
+                self._count_sent(client, FRAME_HEADER.size + len(jpeg), start)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._streams.pop(stream_id, None)
+            self._close_client(client)
+        return response
+
+    async def _handle_ack(self, request):
+        from aiohttp import web
+        client = self._streams.get(request.query.get('stream', ''))
+        if client is None:
+            return web.Response(status=404)
+        client.ack(_int_arg(request, 'seq') or 0)
+        latency = _float_arg(request, 'latency')
+        metrics = self.camera_stream.metrics
+        if latency is not None and metrics.enabled:
+            metrics.observe("glass_to_glass", latency / 1000.0)
+        return web.Response(status=204)
+
+    async def _handle_filters(self, request):
+        from aiohttp import web
+        return web.json_response(_describe_filters())
+
+    async def _handle_update_filter(self, request):
+        from aiohttp import web
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        status, response = self.camera_stream._update_filter(
+            request.match_info['name'], body, request.query.get('save') in ('1', 'true')
+        )
+        return web.json_response(response, status=status)
+
+    async def _handle_recorder(self, request):
+        from aiohttp import web
+        return web.json_response(self.camera_stream.recorder.status())
+
+    async def _handle_recorder_action(self, request):
+        from aiohttp import web
+        status, response = self.camera_stream._recorder_action(
+            request.match_info['action'], request.query
+        )
+        return web.json_response(response, status=status)
+
+    async def _handle_metrics(self, request):
+        from aiohttp import web
+        return web.Response(text=self.camera_stream.metrics.prometheus(),
+                            content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def _handle_stats(self, request):
+        from aiohttp import web
+        return web.json_response(self.camera_stream.metrics.snapshot())
+
+
+def _int_arg(request, name):
+    try:
+        return int(request.query[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def _float_arg(request, name):
+    try:
+        return float(request.query[name])
+    except (KeyError, ValueError):
+        return None
+
+
+# Server backends by name
+SERVERS = {
+    "flask": FlaskServer,
+    "async": AsyncServer,
+}
@@ -1,6 +1,12 @@
-
-from .processors import *
+from .processors import AudioEngine, AudioAnalyzer, AudioRing, AudioFeatures, SILENCE, \
+                        DEFAULT_BANDS, read_wav
 
 __all__ = [
-
+    "AudioEngine",
+    "AudioAnalyzer",
+    "AudioRing",
+    "AudioFeatures",
+    "SILENCE",
+    "DEFAULT_BANDS",
+    "read_wav",
 ]
@@ -0,0 +1,464 @@
+"""
+Real-time audio analysis for audio-reactive filters.
+
+An input stream writes samples into a preallocated ring buffer, a
+background thread computes the features of every hop, and filters read
+the latest features without locking.
+"""
+
+import os
+import threading
+import time
+import wave
+from collections import namedtuple
+import numpy as np
+
+# Frequency bands of the band energies, in Hz
+DEFAULT_BANDS = (
+    (20, 60),       # Sub-bass
+    (60, 250),      # Bass
+    (250, 500),     # Low mids
+    (500, 2000),    # Mids
+    (2000, 4000),   # High mids
+    (4000, 6000),   # Presence
+    (6000, 20000),  # Brilliance
+)
+
+
+class AudioFeatures(namedtuple("AudioFeatures",
+                               ["sequence", "timestamp", "rms", "bands", "onset", "beats", "bpm"])):
+    """
+    Features of the newest analyzed audio window.
+
+    :param sequence: Number of windows analyzed so far.
+    :param timestamp: Monotonic time of the last sample of the window.
+    :param rms: Root mean square level of the window, from 0 to 1.
+    :param bands: Read-only array of the power per band (see DEFAULT_BANDS),
+                  1 for a full-scale sine.
+    :param onset: Onset strength: spectral flux relative to its recent mean.
+    :param beats: Number of beats detected so far. Compare it with the value
+                  of the previous frame to react to the beats in between.
+    :param bpm: Tempo estimated from the recent beats, or None.
+    """
+    __slots__ = ()
+
+    def as_dict(self):
+        values = self._asdict()
+        values["bands"] = self.bands.tolist()
+        return values
+
+
+def _silent_bands(count):
+    bands = np.zeros(count, dtype=np.float32)
+    bands.flags.writeable = False
+    return bands
+
+
+SILENCE = AudioFeatures(0, 0.0, 0.0, _silent_bands(len(DEFAULT_BANDS)), 0.0, 0, None)
+
+
+def read_wav(path):
+    """
+    Read a PCM WAV file as mono float samples.
+
+    :param path: Path of an 8, 16, 24 or 32-bit PCM WAV file.
+    :return: Tuple of (samples, samplerate) with float32 samples from -1 to 1.
+    """
+    with wave.open(path, "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        samplerate = wav.getframerate()
+        data = wav.readframes(wav.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        values = np.where(values >= 1 << 23, values - (1 << 24), values)
+        samples = values.astype(np.float32) / (1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(data, dtype="<i4").astype(np.float32) / (1 << 31)
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width} bytes.")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return samples, samplerate
+
+
+class AudioRing:
+    def __init__(self, capacity):
+        """
+        Preallocated ring buffer of mono samples.
+
+        There is a single writer, the audio callback, which copies the
+        samples and then publishes the new total. Readers never block it:
+        they copy a window and check afterwards that it was not overwritten
+        while they copied.
+
+        :param capacity: Number of samples kept.
+        """
+        self.capacity = int(capacity)
+        self.buffer = np.zeros(self.capacity, dtype=np.float32)
+        self.written = 0  # Total number of samples written
+        self.mark = (0, time.monotonic())  # (written, time) of the last write
+
+    def write(self, samples, timestamp=None):
+        """
+        Append samples, overwriting the oldest ones.
+
+        :param samples: 1-D array of samples.
+        :param timestamp: Monotonic time of the last sample (default is now).
+        """
+        count = len(samples)
+        if count > self.capacity:
+            samples = samples[-self.capacity:]
+        written = self.written + count
+        size = len(samples)
+        start = (written - size) % self.capacity
+        first = min(size, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:size - first] = samples[first:]
+        self.written = written
+        self.mark = (written, time.monotonic() if timestamp is None else timestamp)
+
+    def read(self, end, out):
+        """
+        Copy the samples that end at a given position.
+
+        :param end: Total sample count at the end of the window.
+        :param out: Array filled with the len(out) samples before `end`.
+        :return: True if the window was complete, False if part of it was
+                 not written yet or already overwritten.
+        """
+        size = len(out)
+        begin = end - size
+        if begin < 0 or end > self.written or self.written - begin > self.capacity:
+            return False
+        start = begin % self.capacity
+        first = min(size, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:] = self.buffer[:size - first]
+        # The writer may have wrapped around while we copied
+        return self.written - begin <= self.capacity
+
+
+class AudioAnalyzer:
+    def __init__(self, samplerate, fft_size=2048, hop_size=512, bands=DEFAULT_BANDS,
+                 onset_threshold=1.5, history=1.0, min_beat_interval=0.25):
+        """
+        Compute the features of successive audio windows.
+
+        The band energies are the windowed power spectrum multiplied by a
+        precomputed band matrix. Onsets are detected on the spectral flux
+        of the log band energies, against the mean of the last second.
+
+        :param samplerate: Sample rate in Hz.
+        :param fft_size: Window size in samples (default is 2048).
+        :param hop_size: Samples between two windows (default is 512).
+        :param bands: Frequency bands as (low, high) in Hz.
+        :param onset_threshold: Onset strength counted as a beat (default is 1.5).
+        :param history: Seconds of flux the onset strength is relative to.
+        :param min_beat_interval: Minimum time between two beats in seconds.
+        """
+        self.samplerate = samplerate
+        self.fft_size = int(fft_size)
+        self.hop_size = int(hop_size)
+        self.onset_threshold = onset_threshold
+        self.min_beat_interval = min_beat_interval
+
+        self.window = np.hanning(self.fft_size).astype(np.float32)
+        self._windowed = np.empty(self.fft_size, dtype=np.float32)
+        self._power = np.empty(self.fft_size // 2 + 1, dtype=np.float32)
+
+        # Each row sums the power bins of a band
+        frequencies = np.fft.rfftfreq(self.fft_size, 1.0 / samplerate)
+        self.band_matrix = np.zeros((len(bands), len(frequencies)), dtype=np.float32)
+        for i, (low, high) in enumerate(bands):
+            selected = (frequencies >= low) & (frequencies < high)
+            if not selected.any():
+                # Band narrower than a bin: use the nearest bin
+                selected[np.argmin(np.abs(frequencies - (low + high) / 2))] = True
+            self.band_matrix[i, selected] = 1.0
+        # Parseval with the window energy, so a full-scale sine has a power of 1
+        self._scale = np.float32(4.0 / (self.fft_size * np.square(self.window).sum()))
+
+        self._flux = np.zeros(max(1, int(history * samplerate / self.hop_size)))
+        self._flux_index = 0
+        self._flux_count = 0
+        self._previous_log = None
+        self._beat_times = np.full(8, np.nan)
+        self._beat_index = 0
+        self.last_beat = -np.inf
+        self.beats = 0
+
+    def analyze(self, samples, timestamp):
+        """
+        Analyze one window.
+
+        :param samples: Array of fft_size samples.
+        :param timestamp: Time of the last sample in seconds.
+        :return: Tuple of (rms, bands, onset, beat) where bands is a new array.
+        """
+        rms = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+
+        np.multiply(samples, self.window, out=self._windowed)
+        spectrum = np.fft.rfft(self._windowed)
+        np.square(spectrum.real, out=self._power, casting="unsafe")
+        self._power += np.square(spectrum.imag, dtype=np.float32)
+        bands = self.band_matrix @ self._power
+        bands *= self._scale
+
+        log_bands = np.log1p(bands * 1e3)
+        if self._previous_log is None:
+            flux = 0.0
+        else:
+            flux = float(np.maximum(log_bands - self._previous_log, 0).sum())
+        self._previous_log = log_bands
+
+        mean = self._flux[:self._flux_count].mean() if self._flux_count else 0.0
+        onset = flux / mean if mean > 1e-6 else 0.0
+        self._flux[self._flux_index] = flux
+        self._flux_index = (self._flux_index + 1) % len(self._flux)
+        self._flux_count = min(self._flux_count + 1, len(self._flux))
+
+        beat = (onset >= self.onset_threshold and rms > 1e-3
+                and timestamp - self.last_beat >= self.min_beat_interval)
+        if beat:
+            self.last_beat = timestamp
+            self.beats += 1
+            self._beat_times[self._beat_index] = timestamp
+            self._beat_index = (self._beat_index + 1) % len(self._beat_times)
+        return rms, bands, onset, beat
+
+    @property
+    def bpm(self):
+        """
+        Tempo from the median interval of the recent beats, or None.
+        """
+        times = np.sort(self._beat_times[~np.isnan(self._beat_times)])
+        if len(times) < 3:
+            return None
+        interval = float(np.median(np.diff(times)))
+        if not 0.25 <= interval <= 1.5:
+            return None
+        return 60.0 / interval
+
+
+class AudioEngine:
+    current = None  # Engine started last, read by the filters
+
+    def __init__(self, source=None, samplerate=44100, fft_size=2048, hop_size=512,
+                 bands=DEFAULT_BANDS, buffer_seconds=2.0, realtime=True, loop=True,
+                 metrics=None):
+        """
+        Initialize the audio engine.
+
+        The input callback only copies the samples into the ring buffer.
+        The analysis runs on its own thread and publishes an immutable
+        AudioFeatures, so neither the audio callback nor the frame threads
+        ever wait for it. When the analysis falls behind, it skips to the
+        newest window and counts the hops it skipped.
+
+        :param source: Input device index or name for sounddevice (default is
+                       None for the default input), or the path of a WAV file.
+        :param samplerate: Sample rate of an input device, WAV files use theirs.
+        :param fft_size: Analysis window in samples (default is 2048).
+        :param hop_size: Samples between two analyses (default is 512).
+        :param bands: Frequency bands as (low, high) in Hz.
+        :param buffer_seconds: Duration kept in the ring buffer.
+        :param realtime: Feed WAV files at their real rate (default is True),
+                         or as fast as the analysis runs.
+        :param loop: Restart WAV files at the end (default is True).
+        :param metrics: Optional StreamMetrics timing the analysis.
+        """
+        self.source = source
+        self.wav = None
+        if isinstance(source, str) and os.path.isfile(source):
+            self.wav, samplerate = read_wav(source)
+        self.samplerate = samplerate
+        self.fft_size = int(fft_size)
+        self.hop_size = int(hop_size)
+        self.bands = tuple(bands)
+        self.realtime = realtime
+        self.loop = loop
+        self.metrics = metrics
+
+        capacity = max(int(buffer_seconds * samplerate), 4 * self.fft_size)
+        self.ring = AudioRing(capacity)
+        self.analyzer = AudioAnalyzer(samplerate, self.fft_size, self.hop_size, self.bands)
+        self._window = np.empty(self.fft_size, dtype=np.float32)
+        self.features = SILENCE._replace(bands=_silent_bands(len(self.bands)))
+
+        self._stream = None
+        self._threads = []
+        self._running = False
+        self._position = self.fft_size  # Sample count at the end of the next window
+        self.analyzed = 0
+        self.skipped = 0
+        self.status_errors = 0  # Input overflows reported by the device
+
+    @staticmethod
+    def latest():
+        """
+        Get the newest features of the current engine, or SILENCE when no
+        engine runs. Safe to call from any thread, every frame.
+        """
+        engine = AudioEngine.current
+        return engine.features if engine is not None else SILENCE
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """
+        Start the input and the analysis thread.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._position = self.ring.written + self.fft_size
+
+        if self.wav is not None:
+            self._start_thread(self._feed_wav, "audio-wav")
+        else:
+            try:
+                import sounddevice as sd
+            except (ImportError, OSError) as e:
+                self._running = False
+                raise RuntimeError(f"Audio input needs sounddevice and PortAudio: {e}") from e
+            self._stream = sd.InputStream(
+                device=self.source,
+                channels=1,
+                samplerate=self.samplerate,
+                blocksize=self.hop_size,
+                dtype="float32",
+                callback=self._callback,
+            )
+            self._stream.start()
+
+        self._start_thread(self._analyze_loop, "audio-analysis")
+        AudioEngine.current = self
+
+    def stop(self):
+        """
+        Stop the input and the analysis thread.
+        """
+        self._running = False
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        if AudioEngine.current is self:
+            AudioEngine.current = None
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _callback(self, indata, frames, time_info, status):
+        # Runs on the PortAudio thread: copy the samples and return
+        if status:
+            self.status_errors += 1
+        self.ring.write(indata[:, 0])
+
+    def _feed_wav(self):
+        """
+        Write the WAV samples into the ring in blocks of hop_size samples.
+        """
+        samples = self.wav
+        interval = self.hop_size / self.samplerate
+        position = 0
+        next_time = time.monotonic()
+        clock = next_time  # Time of the next sample when not paced
+        while self._running:
+            if position >= len(samples):
+                if not self.loop:
+                    break
+                position = 0
+            block = samples[position:position + self.hop_size]
+            position += len(block)
+
+            if self.realtime:
+                next_time += len(block) / self.samplerate
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                # Do not overwrite samples the analysis did not read yet
+                while self._running and \
+                        self.ring.written + len(block) - self._position > \
+                        self.ring.capacity - self.fft_size:
+                    time.sleep(interval / 8)
+            clock += len(block) / self.samplerate
+            self.ring.write(block, next_time if self.realtime else clock)
+
+    def _analyze_loop(self):
+        interval = self.hop_size / self.samplerate
+        while self._running:
+            if not self.step():
+                time.sleep(interval / 4)
+
+    def step(self):
+        """
+        Analyze the next window if all of its samples were written.
+
+        :return: True if a window was analyzed.
+        """
+        written, written_time = self.ring.mark
+        if written < self._position:
+            return False
+
+        # Skip to the newest window rather than fall further behind live input
+        behind = (written - self._position) // self.hop_size
+        if behind > 4 and self.realtime:
+            self._position += behind * self.hop_size
+            self.skipped += behind
+
+        if not self.ring.read(self._position, self._window):
+            self._position = self.ring.written
+            self.skipped += 1
+            return False
+
+        timestamp = written_time - (written - self._position) / self.samplerate
+        timed = self.metrics is not None and self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        rms, bands, onset, _ = self.analyzer.analyze(self._window, timestamp)
+        bands.flags.writeable = False
+        self.analyzed += 1
+        # A single reference assignment publishes the features atomically
+        self.features = AudioFeatures(self.analyzed, timestamp, rms, bands, onset,
+                                      self.analyzer.beats, self.analyzer.bpm)
+        if timed:
+            self.metrics.observe("audio", time.perf_counter() - start)
+        self._position += self.hop_size
+        return True
+
+    def process(self, samples):
+        """
+        Analyze samples synchronously, without starting the threads, e.g.
+        to test or benchmark the analysis.
+
+        :param samples: 1-D float32 array of mono samples.
+        :return: Number of windows analyzed.
+        """
+        analyzed = self.analyzed
+        # Timestamps follow the samples, so beats are timed as if played
+        clock = self.ring.mark[1]
+        for start in range(0, len(samples), self.hop_size):
+            block = samples[start:start + self.hop_size]
+            clock += len(block) / self.samplerate
+            self.ring.write(block, clock)
+            while self.step():
+                pass
+        return self.analyzed - analyzed
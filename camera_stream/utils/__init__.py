@@ -1,9 +1,60 @@
 """
 Utility functions for the camera streaming module.
+
+Modules are imported on first access, so a command only loads OpenCV
+and NumPy when it uses them.
 """
+import importlib
+
+# Names imported on first access, by module
+_lazy_modules = {
+    ".camera_utils": ["Camera"],
+    ".capture_reader": ["CaptureReader"],
+    ".capture_settings": ["CaptureSettings", "describe_capture", "probe_modes"],
+    ".frame_buffer": ["FrameBuffer", "FrameSubscription"],
+    ".frame_rate": ["FrameRateGovernor"],
+    ".parallel": ["OrderedFramePool"],
+    ".shared_frames": ["SharedFramePool"],
+    ".jpeg_cache": ["EncodedFrameCache", "EncodeSettings", "CompressedFrame"],
+    ".metrics": ["StreamMetrics", "Histogram"],
+    ".frame_transport": ["AckGate", "AckGateRegistry", "FRAME_HEADER", "frame_header"],
+    ".recorder": ["Recorder"],
+    ".frame_sink": ["FrameSink", "SharedFrameReader"],
+}
+_lazy_names = {name: module for module, names in _lazy_modules.items() for name in names}
+
+def __getattr__(name):
+    module = _lazy_names.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
-from .camera_utils import Camera
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names))
 
 __all__ = [
-    "Camera"
-]
\ No newline at end of file
+    "Camera",
+    "CaptureReader",
+    "CaptureSettings",
+    "describe_capture",
+    "probe_modes",
+    "FrameBuffer",
+    "FrameSubscription",
+    "FrameRateGovernor",
+    "OrderedFramePool",
+    "SharedFramePool",
+    "EncodedFrameCache",
+    "EncodeSettings",
+    "CompressedFrame",
+    "StreamMetrics",
+    "Histogram",
+    "AckGate",
+    "AckGateRegistry",
+    "FRAME_HEADER",
+    "frame_header",
+    "Recorder",
+    "FrameSink",
+    "SharedFrameReader"
+]
@@ -2,19 +2,77 @@
 Utility functions for camera operations.
 """
 
+import time
 import cv2
+from .capture_reader import CaptureReader
+from .capture_settings import CaptureSettings
+from .frame_rate import CaptureClock
+from .jpeg_cache import CompressedFrame
 
 
 class Camera:
-    def __init__(self, source=0):
+    def __init__(self, source=0, threaded=False, capture=None, passthrough=False):
         """
         Initialize the camera with the given source.
 
         :param source: Camera source (default is 0 for the default camera).
+        :param threaded: Grab frames on a dedicated thread and always process
+                         the newest one (default is False to read inline).
+        :param capture: CaptureSettings requested from the driver (default is
+                        None to keep the driver defaults).
+        :param passthrough: Read the JPEG frames of MJPG cameras without
+                            decoding them, and only decode them when a hook
+                            changes the pixels (default is False).
         """
         self.source = source
+        self.threaded = threaded
+        self.capture = capture or CaptureSettings()
+        self.passthrough = passthrough
+        self.reader = None  # CaptureReader of the threaded mode
+        self.clock = CaptureClock()  # Capture time of the frames
         self.cap = None
         self.frame_hooks = []  # List to hold frame processing hooks
+        self.pipeline = None  # Optional FilterPipeline built from the hooks
+        self.metrics = None  # Optional StreamMetrics timing capture and hooks
+
+    def open(self):
+        """
+        Open the camera source.
+
+        :return: The capture object. Sources that already behave like a
+                 cv2.VideoCapture, such as the benchmark sources, are used as is.
+        """
+        cap = self.source if hasattr(self.source, "read") else self.capture.open(self.source)
+        self.clock.reset()
+        if self.passthrough and cap.isOpened():
+            # Raw buffers: JPEG bytes with MJPG, decoded frames otherwise
+            cap.set(cv2.CAP_PROP_FORMAT, -1)
+        return cap
+
+    @property
+    def needs_pixels(self):
+        """
+        Whether a hook changes the pixels, so compressed frames must be decoded.
+        """
+        if self.pipeline is not None:
+            return self.pipeline.needs_pixels
+        return bool(self.frame_hooks)
+
+    def start_reader(self):
+        """
+        Start grabbing frames from the opened capture on a dedicated thread.
+        """
+        if self.reader is None:
+            self.reader = CaptureReader(self.cap, clock=self.clock)
+        self.reader.start()
+
+    def stop_reader(self):
+        """
+        Stop the grab thread, before the capture is released.
+        """
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
 
     def test_camera(self):
         """
@@ -22,7 +80,7 @@ class Camera:
 
         :return: True if the camera is working, False otherwise.
         """
-        cap = cv2.VideoCapture(self.source)
+        cap = self.open()
         if not cap.isOpened():
             return False
         ret, _ = cap.read()
@@ -33,7 +91,7 @@ class Camera:
         """
         Preview the camera stream in a window.
         """
-        cap = cv2.VideoCapture(self.source)
+        cap = self.open()
         if not cap.isOpened():
             raise ValueError(f"Camera source {self.source} is not available.")
 
@@ -46,8 +104,7 @@ class Camera:
                     )
                     break
 
-                for hook in self.frame_hooks:
-                    frame = hook(frame)
+                frame = self._process(frame)
 
                 cv2.imshow("Camera Preview", frame)
                 if cv2.waitKey(1) & 0xFF == ord("q"):
@@ -67,18 +124,89 @@ class Camera:
         :param hook: Function to process frames.
         """
         self.frame_hooks.append(hook)
+        if self.pipeline is not None:
+            self.pipeline.invalidate()
 
-    def _update(self):
+    def _read(self):
         """
-        Update the camera stream.
+        Read a frame from the camera.
 
-        :return: Returns the frame
+        :return: Tuple of (frame, timestamp) where the timestamp is the
+                 capture time in seconds reported by the camera, or the
+                 monotonic clock when the camera does not report one. In
+                 passthrough mode, JPEG frames are CompressedFrame objects.
+        """
+        timed = self.metrics is not None and self.metrics.enabled
+        if timed:
+            start = time.perf_counter()
+
+        if self.reader is not None:
+            item = self.reader.read()
+            if item is None:
+                if self.reader.failed:
+                    raise RuntimeError("Failed to read frame from camera.")
+                raise TimeoutError("No frame from camera.")
+            frame, timestamp = item
+        else:
+            ret, frame = self.cap.read() if self.cap else (False, None)
+            if not ret:
+                raise RuntimeError("Failed to read frame from camera.")
+            timestamp = self.clock.timestamp(self.cap)
+
+        if timed:
+            self.metrics.observe("capture", time.perf_counter() - start)
+        if self.passthrough and CompressedFrame.is_jpeg(frame):
+            frame = CompressedFrame(frame)
+        return frame, timestamp
+
+    def _process(self, frame):
         """
-        ret, frame = self.cap.read() if self.cap else (False, None)
-        if not ret:
-            raise RuntimeError("Failed to read frame from camera.")
+        Run the frame hooks on a frame.
+
+        :param frame: Frame read from the camera.
+        :return: Returns the processed frame
+        """
+        metrics = self.metrics
+        if isinstance(frame, CompressedFrame):
+            if not self.needs_pixels:
+                return frame
+            if metrics is not None and metrics.enabled:
+                start = time.perf_counter()
+                frame = frame.decode()
+                metrics.observe("decode", time.perf_counter() - start)
+            else:
+                frame = frame.decode()
+
+        if metrics is not None and metrics.enabled:
+            start = time.perf_counter()
+            frame = self._run_hooks(frame, metrics)
+            metrics.observe("process", time.perf_counter() - start)
+            return frame
+        return self._run_hooks(frame)
+
+    def _run_hooks(self, frame, metrics=None):
+        """
+        Run the pipeline, or every hook in order when there is none.
+        """
+        if self.pipeline is not None:
+            return self.pipeline(frame)
 
         for hook in self.frame_hooks:
+            if metrics is None:
+                frame = hook(frame)
+                continue
+            start = time.perf_counter()
             frame = hook(frame)
+            metrics.observe(f"filter:{getattr(hook, '__name__', 'hook')}",
+                            time.perf_counter() - start)
 
         return frame
+
+    def _update(self):
+        """
+        Update the camera stream.
+
+        :return: Returns the frame
+        """
+        frame, _ = self._read()
+        return self._process(frame)
@@ -0,0 +1,125 @@
+"""
+Threaded capture reader keeping only the newest camera frame.
+"""
+
+import threading
+from .frame_rate import CaptureClock
+
+
+class CaptureReader:
+    def __init__(self, cap, buffers=4, clock=None):
+        """
+        Initialize the reader of an opened capture.
+
+        A dedicated thread grabs frames as soon as the camera delivers them
+        and retrieves them into a rotating set of preallocated arrays, so
+        the driver buffer never fills up with stale frames and no array is
+        allocated per frame. Readers always get the newest frame; frames
+        that were overwritten before being read are counted as dropped.
+
+        A frame returned by read() is not overwritten before the next
+        read(). Copy it to keep it longer.
+
+        :param cap: Opened cv2.VideoCapture or compatible object.
+        :param buffers: Number of preallocated frame arrays (default is 4,
+                        at least 3).
+        :param clock: CaptureClock of the source (default is a new one).
+        """
+        self.cap = cap
+        self.clock = clock or CaptureClock()
+        self._buffers = [None] * max(3, int(buffers))
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._latest = None      # (index, timestamp, sequence) of the newest frame
+        self._lent = None        # Index of the buffer returned by the last read()
+        self._read_sequence = 0
+        self.sequence = 0
+        self.grabbed = 0
+        self.dropped = 0
+        self.failed = False
+
+    def start(self):
+        """
+        Start the grab thread.
+        """
+        if self._running:
+            return
+        self._running = True
+        self.failed = False
+        self._thread = threading.Thread(target=self._grab_frames, name="capture-reader")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the grab thread. The capture is not released.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _next_index(self, index):
+        """
+        Get the buffer to retrieve into, skipping the newest frame and the
+        frame lent to the reader.
+        """
+        with self._condition:
+            latest = self._latest[0] if self._latest is not None else None
+            lent = self._lent
+        for _ in range(len(self._buffers)):
+            index = (index + 1) % len(self._buffers)
+            if index != latest and index != lent:
+                return index
+        return index
+
+    def _grab_frames(self):
+        index = -1
+        while self._running:
+            if not self.cap.grab():
+                with self._condition:
+                    self.failed = True
+                    self._running = False
+                    self._condition.notify_all()
+                break
+            timestamp = self.clock.timestamp(self.cap)
+
+            index = self._next_index(index)
+            ret, frame = self.cap.retrieve(self._buffers[index])
+            if not ret:
+                continue
+            # retrieve() writes into the array when its shape matches, and
+            # returns a new one otherwise (first frame, resolution change)
+            self._buffers[index] = frame
+
+            with self._condition:
+                self.grabbed += 1
+                self.sequence += 1
+                if self._latest is not None and self._latest[2] > self._read_sequence:
+                    self.dropped += 1
+                self._latest = (index, timestamp, self.sequence)
+                self._condition.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        Wait for a frame newer than the last one read.
+
+        :param timeout: Maximum time to wait in seconds.
+        :return: Tuple of (frame, timestamp), or None on timeout or when the
+                 camera stopped delivering frames.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (self._latest is not None and self._latest[2] > self._read_sequence)
+                or not self._running,
+                timeout,
+            )
+            if self._latest is None or self._latest[2] <= self._read_sequence:
+                return None
+            index, timestamp, sequence = self._latest
+            self._read_sequence = sequence
+            self._lent = index
+            return self._buffers[index], timestamp
@@ -0,0 +1,202 @@
+"""
+Capture mode negotiation: backend, FOURCC, resolution, frame rate and
+driver buffer size.
+"""
+
+import time
+from collections import namedtuple
+import cv2
+
+# OpenCV capture backends by name
+BACKENDS = {
+    "any": cv2.CAP_ANY,
+    "v4l2": cv2.CAP_V4L2,
+    "dshow": cv2.CAP_DSHOW,
+    "msmf": cv2.CAP_MSMF,
+    "avfoundation": cv2.CAP_AVFOUNDATION,
+    "gstreamer": cv2.CAP_GSTREAMER,
+    "ffmpeg": cv2.CAP_FFMPEG,
+}
+
+# Modes tried by probe_modes(): (FOURCC, width, height, fps)
+PROBE_MODES = [
+    (fourcc, width, height, fps)
+    for fourcc in ("MJPG", "YUYV")
+    for width, height in ((640, 480), (1280, 720), (1920, 1080))
+    for fps in (30, 60)
+]
+
+
+def fourcc_name(code):
+    """
+    Get the four characters of a FOURCC code read from CAP_PROP_FOURCC.
+    """
+    code = int(code)
+    if code <= 0:
+        return None
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+
+
+class CaptureSettings(namedtuple("CaptureSettings",
+                                 ["backend", "fourcc", "width", "height", "fps", "buffer_size"])):
+    """
+    Capture mode requested from the camera driver. None keeps the driver default.
+
+    :param backend: OpenCV backend name, e.g. "v4l2" (see BACKENDS).
+    :param fourcc: Pixel format, e.g. "MJPG" or "YUYV".
+    :param width: Frame width in pixels.
+    :param height: Frame height in pixels.
+    :param fps: Frame rate.
+    :param buffer_size: Number of frames buffered by the driver
+                        (CAP_PROP_BUFFERSIZE), 1 for the lowest latency.
+    """
+    __slots__ = ()
+
+    def __new__(cls, backend=None, fourcc=None, width=None, height=None, fps=None,
+                buffer_size=None):
+        if backend is not None:
+            backend = str(backend).lower()
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown capture backend '{backend}'.")
+        if fourcc is not None:
+            fourcc = str(fourcc).upper()
+            if len(fourcc) != 4:
+                raise ValueError(f"FOURCC must be 4 characters, got '{fourcc}'.")
+        return super().__new__(
+            cls,
+            backend,
+            fourcc,
+            int(width) if width else None,
+            int(height) if height else None,
+            float(fps) if fps else None,
+            int(buffer_size) if buffer_size else None,
+        )
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create the settings from the "capture" section of the filters config.
+
+        :param config: Dictionary with any of the settings fields.
+        """
+        config = config or {}
+        return cls(**{field: config.get(field) for field in cls._fields})
+
+    def with_overrides(self, **overrides):
+        """
+        Get a copy of the settings with the given values replaced.
+
+        :param overrides: Settings fields, ignored when None.
+        :return: New capture settings.
+        """
+        values = self._asdict()
+        values.update({key: value for key, value in overrides.items() if value is not None})
+        return CaptureSettings(**values)
+
+    def open(self, source):
+        """
+        Open a camera source and apply the settings.
+
+        :param source: Camera index or video path.
+        :return: The opened cv2.VideoCapture.
+        """
+        backend = BACKENDS[self.backend] if self.backend else cv2.CAP_ANY
+        cap = cv2.VideoCapture(source, backend)
+        if cap.isOpened():
+            self.apply(cap)
+        return cap
+
+    def apply(self, cap):
+        """
+        Request the settings from an opened capture.
+
+        The pixel format is set first, since V4L2 drivers only list the
+        resolutions and frame rates of the current format.
+
+        :param cap: Opened cv2.VideoCapture.
+        """
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        if self.width:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            cap.set(cv2.CAP_PROP_FPS, self.fps)
+        if self.buffer_size:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+
+
+def describe_capture(cap):
+    """
+    Get the mode the driver actually negotiated.
+
+    :param cap: Opened cv2.VideoCapture.
+    :return: Dictionary with the FOURCC, width, height, fps and buffer size.
+    """
+    return {
+        "fourcc": fourcc_name(cap.get(cv2.CAP_PROP_FOURCC)),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "buffer_size": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+
+
+def measure_fps(cap, frames=30, warmup=5, timeout=5.0):
+    """
+    Measure the frame rate a capture actually delivers.
+
+    :param cap: Opened cv2.VideoCapture.
+    :param frames: Number of frames to time.
+    :param warmup: Number of frames read first, while the camera settles.
+    :param timeout: Maximum time to measure in seconds.
+    :return: Measured frame rate, or 0.0 if no frame could be read.
+    """
+    for _ in range(warmup):
+        if not cap.grab():
+            return 0.0
+    start = time.perf_counter()
+    count = 0
+    while count < frames and time.perf_counter() - start < timeout:
+        if not cap.grab():
+            break
+        count += 1
+    elapsed = time.perf_counter() - start
+    return count / elapsed if count and elapsed > 0 else 0.0
+
+
+def probe_modes(source=0, backend=None, modes=PROBE_MODES, frames=30):
+    """
+    List the modes a camera accepts and the frame rate measured for each.
+
+    Every mode is requested on a freshly opened capture, read back, and
+    timed, since drivers silently fall back to another mode.
+
+    :param source: Camera index or video path.
+    :param backend: OpenCV backend name (default is None for any).
+    :param modes: Modes to try as (FOURCC, width, height, fps) tuples.
+    :param frames: Number of frames timed per mode.
+    :return: List of dictionaries with the requested and actual modes, the
+             measured fps, and whether the driver accepted the mode.
+    """
+    results = []
+    for fourcc, width, height, fps in modes:
+        settings = CaptureSettings(backend, fourcc, width, height, fps, 1)
+        cap = settings.open(source)
+        if not cap.isOpened():
+            cap.release()
+            raise ValueError(f"Camera source {source} is not available.")
+        try:
+            actual = describe_capture(cap)
+            measured = measure_fps(cap, frames)
+        finally:
+            cap.release()
+        results.append({
+            "requested": {"fourcc": fourcc, "width": width, "height": height, "fps": fps},
+            "actual": actual,
+            "measured_fps": measured,
+            "accepted": (actual["fourcc"] == fourcc and actual["width"] == width
+                         and actual["height"] == height),
+        })
+    return results
@@ -0,0 +1,140 @@
+"""
+Shared frame buffer used to fan out processed frames to stream clients.
+"""
+
+import threading
+
+
+class FrameSubscription:
+    def __init__(self):
+        """
+        Bounded queue of depth 1 holding the next frame for one client.
+
+        Publishing into a full queue drops the oldest frame, so a slow client
+        skips frames instead of building up latency.
+        """
+        self._condition = threading.Condition()
+        self._item = None
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, sequence, frame, timestamp=None):
+        """
+        Put a frame in the queue, replacing the unread one if any.
+
+        :param sequence: Sequence number of the frame.
+        :param frame: Processed frame.
+        :param timestamp: Wall-clock capture time of the frame in seconds.
+        """
+        with self._condition:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = (sequence, frame, timestamp)
+            self._condition.notify()
+
+    def get(self, timeout=1.0):
+        """
+        Wait for the next frame.
+
+        :param timeout: Maximum time to wait in seconds.
+        :return: Tuple of (sequence, frame, timestamp), or None on timeout
+                 or when closed.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._item is not None or self.closed, timeout
+            )
+            if self.closed:
+                return None
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        """
+        Close the queue and release the waiting client.
+        """
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class FrameBuffer:
+    def __init__(self):
+        """
+        Initialize an empty frame buffer.
+
+        The capture thread publishes every processed frame here, and the
+        frame is pushed to the queue of each subscribed client.
+        """
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self.frame = None
+        self.sequence = 0
+        self.timestamp = None
+        self.closed = False
+
+    def publish(self, frame, timestamp=None):
+        """
+        Publish a new frame to every subscribed client.
+
+        :param frame: Processed frame to share with the clients.
+        :param timestamp: Wall-clock capture time of the frame in seconds,
+                          used by clients to measure the stream latency.
+        :return: Sequence number assigned to the frame.
+        """
+        with self._lock:
+            self.sequence += 1
+            self.frame = frame
+            self.timestamp = timestamp
+            for subscription in self._subscriptions:
+                subscription.put(self.sequence, frame, timestamp)
+            return self.sequence
+
+    @property
+    def subscribers(self):
+        """
+        Number of subscribed clients.
+        """
+        return len(self._subscriptions)
+
+    def subscribe(self):
+        """
+        Subscribe a new client to the published frames.
+
+        :return: Frame subscription of the client.
+        """
+        subscription = FrameSubscription()
+        with self._lock:
+            if self.closed:
+                subscription.close()
+            else:
+                self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Unsubscribe a client from the published frames.
+
+        :param subscription: Frame subscription returned by subscribe().
+        """
+        with self._lock:
+            self._subscriptions.discard(subscription)
+        subscription.close()
+
+    def open(self):
+        """
+        Reset the buffer so it can be used for a new stream.
+        """
+        with self._lock:
+            self.frame = None
+            self.closed = False
+
+    def close(self):
+        """
+        Close the buffer and release every waiting client.
+        """
+        with self._lock:
+            self.closed = True
+            subscriptions, self._subscriptions = self._subscriptions, set()
+        for subscription in subscriptions:
+            subscription.close()
@@ -0,0 +1,93 @@
+"""
+Frame-rate governor and capture clock of the capture thread.
+"""
+
+import time
+import cv2
+
+
+class CaptureClock:
+    def __init__(self):
+        """
+        Capture time of the frames of one source.
+
+        The camera timestamp (CAP_PROP_POS_MSEC) is used when the source
+        reports one, and the monotonic clock otherwise. The choice is made
+        on the first frame and kept, so the timestamps of a source never
+        jump between the two clocks.
+        """
+        self.camera_clock = None  # Whether the camera timestamps are used
+
+    def reset(self):
+        """
+        Choose the clock again on the next frame, e.g. for a new source.
+        """
+        self.camera_clock = None
+
+    def timestamp(self, cap):
+        """
+        Get the capture time of the frame just read or grabbed.
+
+        :param cap: Capture the frame was read from.
+        :return: Timestamp in seconds.
+        """
+        if self.camera_clock is None:
+            msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+            # Video files report 0 ms for their first frame
+            self.camera_clock = msec > 0 or \
+                (msec == 0 and cap.get(cv2.CAP_PROP_POS_FRAMES) == 1)
+        if self.camera_clock:
+            return cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        return time.monotonic()
+
+
+class FrameRateGovernor:
+    def __init__(self, target_fps=None):
+        """
+        Initialize the governor.
+
+        :param target_fps: Target frame rate (default is None to keep every frame).
+        """
+        self.target_fps = target_fps
+        self.interval = 1.0 / target_fps if target_fps else 0.0
+        self._next_timestamp = None
+        self.skipped = 0
+
+    def reset(self):
+        """
+        Forget the schedule, e.g. when the camera is reopened.
+        """
+        self._next_timestamp = None
+
+    def accept(self, timestamp):
+        """
+        Decide whether a captured frame should be processed.
+
+        Frames are paced on the camera timestamp rather than on the wall
+        clock, so filter time does not shift the schedule. A quarter interval
+        of jitter is tolerated. A timestamp older than the last accepted
+        frame, e.g. a looping file or a restarted camera, restarts the
+        schedule instead of skipping frames until it catches up.
+
+        :param timestamp: Capture timestamp of the frame in seconds.
+        :return: True if the frame is due, False if it should be skipped.
+        """
+        if not self.interval:
+            return True
+
+        if self._next_timestamp is not None and \
+                timestamp < self._next_timestamp - self.interval:
+            # The clock went backwards
+            self._next_timestamp = None
+        elif self._next_timestamp is not None and \
+                timestamp < self._next_timestamp - self.interval / 4:
+            self.skipped += 1
+            return False
+
+        if self._next_timestamp is None or \
+                timestamp - self._next_timestamp >= self.interval:
+            # First frame, or the camera fell behind: restart the schedule
+            self._next_timestamp = timestamp + self.interval
+        else:
+            self._next_timestamp += self.interval
+        return True
@@ -0,0 +1,337 @@
+"""
+Memory-mapped raw frame sink for consumers on the same host, such as
+TouchDesigner or OBS, and the reader mapping its frames.
+
+File layout, little-endian:
+
+    file header (64 bytes): magic "CSFR", version, slots, slot_header,
+                            slot_size, latest
+    slot 0 header (64 bytes): seq, frame, timestamp, width, height,
+                              channels, stride
+    slot 0 pixels (slot_size bytes)
+    slot 1 header and pixels, ...
+
+`latest` is the number of the newest complete frame, which is in slot
+(latest - 1) % slots, or 0 before the first frame. `seq` is the seqlock
+counter of a slot: it is odd while the writer fills the slot, and a
+reader that sees the same even value before and after reading got a
+consistent frame. Pixel rows are `stride` bytes apart, padded to a
+multiple of 64 so every row starts on a 64-byte boundary.
+"""
+
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+from .jpeg_cache import CompressedFrame
+
+MAGIC = b"CSFR"
+VERSION = 1
+
+HEADER_DTYPE = np.dtype({
+    "names": ["magic", "version", "slots", "slot_header", "slot_size", "latest"],
+    "formats": ["S4", "<u4", "<u4", "<u4", "<u8", "<u8"],
+    "offsets": [0, 4, 8, 12, 16, 24],
+    "itemsize": 64,
+})
+
+SLOT_DTYPE = np.dtype({
+    "names": ["seq", "frame", "timestamp", "width", "height", "channels", "stride"],
+    "formats": ["<u8", "<u8", "<f8", "<u4", "<u4", "<u4", "<u4"],
+    "offsets": [0, 8, 16, 24, 28, 32, 36],
+    "itemsize": 64,
+})
+
+# /dev/shm keeps the file in memory on Linux
+DEFAULT_PATH = os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+    "camera_stream.frames",
+)
+
+SharedFrame = namedtuple("SharedFrame", ["frame", "number", "timestamp", "slot", "seq"])
+
+
+def _stride(width, channels):
+    return -(-width * channels // 64) * 64
+
+
+def _slot_offset(slot, slot_size):
+    return HEADER_DTYPE.itemsize + slot * (SLOT_DTYPE.itemsize + slot_size)
+
+
+class FrameSink:
+    def __init__(self, frame_buffer=None, path=DEFAULT_PATH, max_width=1920, max_height=1080,
+                 channels=3, slots=2):
+        """
+        Write the processed frames as raw BGR pixels into a memory-mapped
+        file, so local consumers get them without a JPEG round trip.
+
+        The frames alternate between the slots, so a reader can use a
+        zero-copy view of the newest frame while the writer fills the other
+        slot. With a frame buffer, a sink thread subscribes to it like a
+        client and writes the newest frames; a slow consumer never slows
+        down the stream.
+
+        :param frame_buffer: Optional FrameBuffer to write the frames of.
+        :param path: Path of the file (default is camera_stream.frames in
+                     /dev/shm, or in the temporary directory).
+        :param max_width: Largest frame width the slots hold (default is 1920).
+        :param max_height: Largest frame height the slots hold (default is 1080).
+        :param channels: Largest number of channels (default is 3 for BGR).
+        :param slots: Number of frame slots (default is 2, at least 2).
+        """
+        self.frame_buffer = frame_buffer
+        self.path = path
+        self.slots = max(2, int(slots))
+        # Pixel rows start on 64-byte boundaries
+        self.slot_size = max_height * _stride(max_width, channels)
+        self._mmap = None
+        self._header = None
+        self._slot_headers = []
+        self._thread = None
+        self._running = False
+        self.frames = 0
+        self.skipped = 0  # Frames larger than a slot
+
+    def open(self):
+        """
+        Create the file and map it.
+        """
+        if self._mmap is not None:
+            return
+        size = _slot_offset(self.slots, self.slot_size)
+        with open(self.path, "w+b") as f:
+            f.truncate(size)
+            self._mmap = mmap.mmap(f.fileno(), size)
+
+        self._header = np.ndarray((), HEADER_DTYPE, buffer=self._mmap)
+        self._slot_headers = [
+            np.ndarray((), SLOT_DTYPE, buffer=self._mmap, offset=_slot_offset(slot, self.slot_size))
+            for slot in range(self.slots)
+        ]
+        self._header["version"] = VERSION
+        self._header["slots"] = self.slots
+        self._header["slot_header"] = SLOT_DTYPE.itemsize
+        self._header["slot_size"] = self.slot_size
+        self._header["latest"] = 0
+        # Readers check the magic last, once the layout is written
+        self._header["magic"] = MAGIC
+        self.frames = 0
+
+    def close(self, unlink=True):
+        """
+        Unmap the file, and remove it by default. Readers that mapped it
+        keep their mapping.
+        """
+        self.stop()
+        if self._mmap is None:
+            return
+        self._header = None
+        self._slot_headers = []
+        self._mmap.close()
+        self._mmap = None
+        if unlink:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def write(self, frame, timestamp=None):
+        """
+        Write a frame into the next slot.
+
+        :param frame: BGR or grayscale frame, or a CompressedFrame.
+        :param timestamp: Wall-clock capture time (default is now).
+        :return: Number of the frame, or None if it does not fit in a slot.
+        """
+        if isinstance(frame, CompressedFrame):
+            frame = frame.decode()
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        stride = _stride(width, channels)
+        if frame.dtype != np.uint8 or height * stride > self.slot_size:
+            self.skipped += 1
+            return None
+
+        number = self.frames + 1
+        slot = (number - 1) % self.slots
+        header = self._slot_headers[slot]
+        offset = _slot_offset(slot, self.slot_size) + SLOT_DTYPE.itemsize
+        pixels = np.ndarray(frame.shape, np.uint8, buffer=self._mmap, offset=offset,
+                            strides=(stride, channels, 1)[:frame.ndim])
+
+        seq = int(header["seq"])
+        header["seq"] = seq + 1  # Odd: the slot is being written
+        pixels[...] = frame
+        header["frame"] = number
+        header["timestamp"] = time.time() if timestamp is None else timestamp
+        header["width"] = width
+        header["height"] = height
+        header["channels"] = channels
+        header["stride"] = stride
+        header["seq"] = seq + 2
+        self._header["latest"] = number
+        self.frames = number
+        return number
+
+    def start(self):
+        """
+        Open the file and write the frames of the frame buffer on a thread.
+        """
+        if self._running:
+            return
+        self.open()
+        self._running = True
+        self._thread = threading.Thread(target=self._write_frames, name="frame-sink")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the sink thread. The file stays mapped until close().
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _write_frames(self):
+        subscription = self.frame_buffer.subscribe()
+        try:
+            while self._running:
+                item = subscription.get(timeout=0.5)
+                if item is None:
+                    if subscription.closed:
+                        break
+                    continue
+                _, frame, timestamp = item
+                self.write(frame, timestamp)
+        except Exception as e:
+            print(f"Error writing frame to {self.path}: {e}")
+        finally:
+            self.frame_buffer.unsubscribe(subscription)
+
+
+class SharedFrameReader:
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        Map the frames written by a FrameSink, possibly in another process.
+
+        Only NumPy and the standard library are needed, so the reader can
+        be used from TouchDesigner or any other embedded Python.
+
+        :param path: Path of the sink file.
+        """
+        self.path = path
+        self._mmap = None
+        self._header = None
+        self.slots = 0
+        self.slot_size = 0
+        self.last = 0  # Number of the last frame read
+        self.retries = 0
+
+    def open(self, timeout=5.0):
+        """
+        Map the file, waiting for the sink to create it.
+
+        :param timeout: Maximum time to wait in seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with open(self.path, "rb") as f:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                header = np.ndarray((), HEADER_DTYPE, buffer=self._mmap)
+                if header["magic"] == MAGIC:
+                    break
+                self._mmap.close()
+                self._mmap = None
+            except (OSError, ValueError):
+                self._mmap = None
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"No frame sink at {self.path}.")
+            time.sleep(0.05)
+
+        if int(header["version"]) != VERSION:
+            raise ValueError(f"Unsupported frame sink version {int(header['version'])}.")
+        self._header = header
+        self.slots = int(header["slots"])
+        self.slot_size = int(header["slot_size"])
+
+    def close(self):
+        self._header = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # A returned view still uses the mapping
+            self._mmap = None
+
+    @property
+    def latest(self):
+        """
+        Number of the newest frame, 0 before the first one.
+        """
+        return int(self._header["latest"])
+
+    def _slot_header(self, slot):
+        return np.ndarray((), SLOT_DTYPE, buffer=self._mmap,
+                          offset=_slot_offset(slot, self.slot_size))
+
+    def read(self, copy=False, wait=None):
+        """
+        Get the newest frame.
+
+        Without a copy, the frame is a read-only view of the file: it stays
+        valid until the writer reuses its slot, `slots - 1` frames later.
+        Call is_valid() after using it to detect a frame overwritten
+        meanwhile.
+
+        :param copy: Copy the frame out of the file (default is False).
+        :param wait: Seconds to wait for a frame newer than the last one
+                     read (default is None to return the newest at once).
+        :return: SharedFrame, or None if there is no frame (yet).
+        """
+        if wait is not None:
+            deadline = time.monotonic() + wait
+            while self.latest <= self.last:
+                if time.monotonic() > deadline:
+                    return None
+                time.sleep(0.0005)
+
+        while True:
+            number = self.latest
+            if number == 0:
+                return None
+            slot = (number - 1) % self.slots
+            header = self._slot_header(slot)
+            seq = int(header["seq"])
+            if seq % 2 or int(header["frame"]) != number:
+                # Overwritten since `latest` was read, try the new one
+                self.retries += 1
+                continue
+
+            height = int(header["height"])
+            channels = int(header["channels"])
+            shape = (height, int(header["width"]), channels) if channels > 1 \
+                else (height, int(header["width"]))
+            frame = np.ndarray(shape, np.uint8, buffer=self._mmap,
+                               offset=_slot_offset(slot, self.slot_size) + SLOT_DTYPE.itemsize,
+                               strides=(int(header["stride"]), channels, 1)[:len(shape)])
+            timestamp = float(header["timestamp"])
+            if copy:
+                frame = frame.copy()
+                if int(header["seq"]) != seq:
+                    self.retries += 1
+                    continue
+            self.last = number
+            return SharedFrame(frame, number, timestamp, slot, seq)
+
+    def is_valid(self, shared_frame):
+        """
+        Check that a frame returned by read() was not overwritten since.
+        """
+        return int(self._slot_header(shared_frame.slot)["seq"]) == shared_frame.seq
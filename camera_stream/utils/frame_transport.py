@@ -0,0 +1,125 @@
+"""
+Binary frame transport: JPEG frames with sequence numbers and capture
+timestamps over a chunked HTTP response, paced by client acknowledgements.
+"""
+
+import itertools
+import struct
+import threading
+import time
+
+# Sequence number, capture time and send time in wall-clock seconds, and
+# JPEG length, followed by the JPEG bytes
+FRAME_HEADER = struct.Struct("<QddI")
+
+
+def frame_header(sequence, timestamp, jpeg):
+    """
+    Pack the header of a binary frame.
+
+    :param sequence: Sequence number of the frame.
+    :param timestamp: Wall-clock capture time of the frame in seconds.
+    :param jpeg: Encoded JPEG bytes sent after the header.
+    :return: Header bytes.
+    """
+    return FRAME_HEADER.pack(sequence, timestamp or 0.0, time.time(), len(jpeg))
+
+
+class AckGate:
+    def __init__(self, stream_id):
+        """
+        Window of one unacknowledged frame for a binary stream client.
+
+        The server waits for the client to acknowledge the last frame it
+        sent before taking the next one from the client's subscription, so
+        a slow client always receives the newest frame instead of a queue.
+
+        :param stream_id: Identifier of the stream, sent back with the acks.
+        """
+        self.stream_id = stream_id
+        self._condition = threading.Condition()
+        self.sent = 0
+        self.acked = 0
+        self.closed = False
+
+    def mark_sent(self, sequence):
+        """
+        Record the sequence number of the frame that was sent.
+        """
+        with self._condition:
+            self.sent = sequence
+
+    def ack(self, sequence):
+        """
+        Acknowledge every frame up to a sequence number.
+        """
+        with self._condition:
+            if sequence > self.acked:
+                self.acked = sequence
+                self._condition.notify_all()
+
+    def wait(self, timeout=1.0):
+        """
+        Wait until the last frame sent is acknowledged.
+
+        :param timeout: Maximum time to wait in seconds, so a lost ack only
+                        stalls the stream briefly.
+        :return: True if the frame was acknowledged, False on timeout or
+                 when closed.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.acked >= self.sent or self.closed, timeout
+            ) and not self.closed
+
+    def close(self):
+        """
+        Close the gate and release the waiting stream.
+        """
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class AckGateRegistry:
+    def __init__(self):
+        """
+        Gates of the connected binary stream clients, by stream id.
+        """
+        self._lock = threading.Lock()
+        self._gates = {}
+        self._ids = itertools.count(1)
+
+    def open(self):
+        """
+        Register a new binary stream.
+
+        :return: Gate of the stream.
+        """
+        with self._lock:
+            gate = AckGate(str(next(self._ids)))
+            self._gates[gate.stream_id] = gate
+        return gate
+
+    def get(self, stream_id):
+        """
+        Get the gate of a stream, or None if it is closed.
+        """
+        return self._gates.get(stream_id)
+
+    def close(self, gate):
+        """
+        Unregister a stream and release it.
+        """
+        with self._lock:
+            self._gates.pop(gate.stream_id, None)
+        gate.close()
+
+    def close_all(self):
+        """
+        Release every stream, e.g. when the server stops.
+        """
+        with self._lock:
+            gates, self._gates = list(self._gates.values()), {}
+        for gate in gates:
+            gate.close()
@@ -0,0 +1,352 @@
+"""
+Encode-once JPEG cache shared by every MJPEG subscriber.
+"""
+
+import threading
+import time
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# Number of repeated frames remembered, clients only ask for recent ones
+_MAX_REPEATS = 64
+
+# Client tiers are rounded to these steps, so clients asking for nearby
+# values share a tier, and at most MAX_TIERS tiers are encoded per frame
+QUALITY_STEP = 10
+WIDTH_STEP = 160
+MAX_TIERS = 8
+
+
+class EncodeSettings(namedtuple("EncodeSettings", ["quality", "width", "optimize", "progressive"])):
+    """
+    JPEG encoding tier of a stream client.
+
+    :param quality: JPEG quality from 1 to 100 (None for the OpenCV default).
+    :param width: Output width in pixels (None for the capture width).
+    :param optimize: Whether to optimize the Huffman tables.
+    :param progressive: Whether to encode a progressive JPEG.
+    """
+    __slots__ = ()
+
+    def __new__(cls, quality=None, width=None, optimize=False, progressive=False):
+        if quality is not None:
+            quality = min(max(int(quality), 1), 100)
+        if width is not None:
+            width = max(int(width), 16)
+        return super().__new__(cls, quality, width, bool(optimize), bool(progressive))
+
+    def with_overrides(self, quality=None, width=None):
+        """
+        Get a copy of the settings with the given values replaced.
+
+        :param quality: JPEG quality override, ignored when None.
+        :param width: Output width override, ignored when None.
+        :return: New encode settings.
+        """
+        return EncodeSettings(
+            quality if quality is not None else self.quality,
+            width if width is not None else self.width,
+            self.optimize,
+            self.progressive,
+        )
+
+    def encode_params(self):
+        """
+        Get the parameters to pass to cv2.imencode.
+
+        :return: List of OpenCV JPEG encoding flags.
+        """
+        params = []
+        if self.quality is not None:
+            params += [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        if self.optimize:
+            params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        if self.progressive:
+            params += [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+        return params
+
+
+class CompressedFrame:
+    __slots__ = ("jpeg", "_decoded")
+
+    def __init__(self, jpeg):
+        """
+        JPEG frame delivered by the camera, passed through to the clients
+        without decoding it.
+
+        :param jpeg: JPEG bytes, or the raw buffer read from the camera.
+        """
+        self.jpeg = jpeg if isinstance(jpeg, bytes) else np.asarray(jpeg).tobytes()
+        self._decoded = None
+
+    @staticmethod
+    def is_jpeg(buffer):
+        """
+        Check whether a raw camera buffer holds a JPEG image.
+        """
+        return buffer is not None and buffer.ndim < 3 and buffer.size > 2 and \
+            buffer.flat[0] == 0xFF and buffer.flat[1] == 0xD8
+
+    def decode(self):
+        """
+        Decode the frame, once.
+
+        :return: BGR frame.
+        """
+        if self._decoded is None:
+            self._decoded = cv2.imdecode(np.frombuffer(self.jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if self._decoded is None:
+                raise RuntimeError("Failed to decode camera frame.")
+        return self._decoded
+
+
+def _multipart_chunk(jpeg_bytes):
+    """
+    Wrap JPEG bytes into a multipart chunk for the MJPEG stream.
+
+    :param jpeg_bytes: Encoded JPEG image.
+    :return: Multipart chunk with the boundary and headers.
+    """
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n')
+
+
+def encode_frame(frame, settings):
+    """
+    Scale and encode a frame according to the encode settings.
+
+    :param frame: Frame to encode, or a CompressedFrame sent as is when the
+                  settings do not ask for another quality or size.
+    :param settings: Encode settings of the tier.
+    :return: Encoded JPEG bytes.
+    """
+    if isinstance(frame, CompressedFrame):
+        if settings.quality is None and settings.width is None and \
+                not settings.optimize and not settings.progressive:
+            return frame.jpeg
+        frame = frame.decode()
+
+    frame_h, frame_w = frame.shape[:2]
+    if settings.width is not None and settings.width < frame_w:
+        height = max(1, round(frame_h * settings.width / frame_w))
+        frame = cv2.resize(frame, (settings.width, height), interpolation=cv2.INTER_AREA)
+
+    ret, buffer = cv2.imencode('.jpg', frame, settings.encode_params())
+    if not ret:
+        raise RuntimeError("Failed to encode frame.")
+    return buffer.tobytes()
+
+
+class _Tier:
+    def __init__(self):
+        """
+        Cached chunk of one encode settings tier.
+        """
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.origin = 0  # Sequence of the frame the JPEG was encoded from
+        self.jpeg = None
+        self.chunk = None
+        self.encode_time = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.repeats = 0
+        self.clients = 0  # Clients registered with open_tier()
+
+
+class EncodedFrameCache:
+    def __init__(self, max_tiers=MAX_TIERS):
+        """
+        Initialize an empty cache.
+
+        Only the chunk of the newest frame sequence is kept for each tier,
+        since clients always wait for the latest frame in the frame buffer.
+
+        :param max_tiers: Number of tiers above which new clients get the
+                          fallback tier of open_tier() (default is MAX_TIERS).
+        """
+        self._lock = threading.Lock()
+        self._tiers = {}
+        self._origins = {}  # Sequence of the earlier frame of each repeated frame
+        # Counters of the tiers closed by their last client
+        self._closed_totals = {"hits": 0, "misses": 0, "repeats": 0}
+        self.max_tiers = max_tiers
+        self.frame_width = None  # Width of the frames, set from the capture and the frames
+        self.metrics = None  # Optional StreamMetrics timing the encode stage
+
+    def _get_tier(self, settings):
+        """
+        Get the tier of settings opened with open_tier(), or a tier that is
+        not cached for other settings, so only open_tier() adds tiers.
+        """
+        with self._lock:
+            tier = self._tiers.get(settings)
+        return tier if tier is not None else _Tier()
+
+    def is_open(self, settings):
+        """
+        Check whether a client opened the tier of settings with open_tier().
+        """
+        with self._lock:
+            return settings in self._tiers
+
+    def _normalize(self, settings, fallback):
+        """
+        Round the quality and width of a client tier to the tier steps,
+        except the values of the fallback tier, and drop a width that
+        would not scale the frames down.
+        """
+        quality, width = settings.quality, settings.width
+        if quality is not None and quality != fallback.quality:
+            quality = min(max(round(quality / QUALITY_STEP) * QUALITY_STEP, QUALITY_STEP), 100)
+        if width is not None and width != fallback.width:
+            width = max(round(width / WIDTH_STEP) * WIDTH_STEP, WIDTH_STEP)
+        if width is not None and self.frame_width and width >= self.frame_width:
+            width = None
+        return EncodeSettings(quality, width, settings.optimize, settings.progressive)
+
+    def open_tier(self, settings, fallback=EncodeSettings()):
+        """
+        Register a client of a tier. Every call must be paired with a
+        close_tier() call with the returned settings.
+
+        :param settings: Encode settings requested by the client.
+        :param fallback: Settings of the stream, used as is and given to
+                         the client when max_tiers tiers are already open.
+        :return: Encode settings of the tier the client gets.
+        """
+        settings = self._normalize(settings, fallback)
+        with self._lock:
+            if settings not in self._tiers and len(self._tiers) >= self.max_tiers:
+                settings = fallback
+            tier = self._tiers.get(settings)
+            if tier is None:
+                tier = self._tiers[settings] = _Tier()
+            tier.clients += 1
+        return settings
+
+    def close_tier(self, settings):
+        """
+        Unregister a client of a tier, and drop the tier with its last client.
+
+        :param settings: Encode settings returned by open_tier().
+        """
+        with self._lock:
+            tier = self._tiers.get(settings)
+            if tier is None:
+                return
+            tier.clients -= 1
+            if tier.clients <= 0:
+                del self._tiers[settings]
+                for key in self._closed_totals:
+                    self._closed_totals[key] += getattr(tier, key)
+
+    def repeat(self, sequence, origin):
+        """
+        Record that a frame has the pixels of an earlier one, so every tier
+        reuses the JPEG of the earlier frame instead of encoding it again.
+
+        :param sequence: Sequence number of the repeated frame.
+        :param origin: Sequence number of the earlier frame.
+        """
+        with self._lock:
+            self._origins[sequence] = self._origins.get(origin, origin)
+            if len(self._origins) > _MAX_REPEATS:
+                del self._origins[next(iter(self._origins))]
+
+    def get_jpeg(self, sequence, frame, settings=EncodeSettings()):
+        """
+        Get the JPEG bytes of a frame, encoding it once per tier.
+
+        :param sequence: Sequence number of the frame.
+        :param frame: Frame to encode on a cache miss.
+        :param settings: Encode settings of the client's tier, from
+                         open_tier(). Frames of other settings are encoded
+                         every time.
+        :return: The same bytes object for every subscriber of the tier.
+        """
+        tier = self._get_tier(settings)
+        with tier.lock:
+            return self._encode(tier, sequence, frame, settings)
+
+    def get_chunk(self, sequence, frame, settings=EncodeSettings()):
+        """
+        Get the multipart chunk of a frame, encoding it once per tier.
+
+        :param sequence: Sequence number of the frame.
+        :param frame: Frame to encode on a cache miss.
+        :param settings: Encode settings of the client's tier, from
+                         open_tier(). Frames of other settings are encoded
+                         every time.
+        :return: The same bytes object for every subscriber of the tier.
+        """
+        tier = self._get_tier(settings)
+        with tier.lock:
+            jpeg = self._encode(tier, sequence, frame, settings)
+            if sequence != tier.sequence:
+                # A late client's older frame is not cached
+                return _multipart_chunk(jpeg)
+            if tier.chunk is None:
+                tier.chunk = _multipart_chunk(jpeg)
+            return tier.chunk
+
+    def _encode(self, tier, sequence, frame, settings):
+        """
+        Get the JPEG bytes of a frame from a tier, encoding it on a miss.
+        Must be called with the tier lock held.
+        """
+        if sequence == tier.sequence and tier.jpeg is not None:
+            tier.hits += 1
+            return tier.jpeg
+
+        metrics = self.metrics
+        origin = self._origins.get(sequence, sequence)
+        if origin == tier.origin and tier.jpeg is not None:
+            # Same pixels as the cached frame
+            tier.hits += 1
+            tier.repeats += 1
+            if sequence > tier.sequence:
+                tier.sequence = sequence
+            if metrics is not None and metrics.enabled:
+                metrics.count("reused_encodes")
+                metrics.count("cpu_saved_seconds", tier.encode_time)
+            return tier.jpeg
+
+        tier.misses += 1
+        if not isinstance(frame, CompressedFrame):
+            self.frame_width = frame.shape[1]
+        if metrics is not None and metrics.enabled:
+            start = time.perf_counter()
+            jpeg = encode_frame(frame, settings)
+            encode_time = time.perf_counter() - start
+            metrics.observe("encode", encode_time)
+        else:
+            jpeg = encode_frame(frame, settings)
+            encode_time = 0.0
+
+        # Never replace a newer frame with a late client's older one
+        if sequence > tier.sequence:
+            tier.sequence = sequence
+            tier.origin = origin
+            tier.jpeg = jpeg
+            tier.chunk = None
+            tier.encode_time = encode_time
+        return jpeg
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        :return: Dictionary with the number of hits, misses and tiers, the
+                 hits of repeated frames being also counted in repeats.
+        """
+        with self._lock:
+            tiers = list(self._tiers.values())
+            totals = dict(self._closed_totals)
+        return {
+            "hits": totals["hits"] + sum(tier.hits for tier in tiers),
+            "misses": totals["misses"] + sum(tier.misses for tier in tiers),
+            "repeats": totals["repeats"] + sum(tier.repeats for tier in tiers),
+            "tiers": len(tiers),
+        }
@@ -0,0 +1,296 @@
+"""
+Per-stage latency metrics of the stream, exported as Prometheus text or JSON.
+"""
+
+import bisect
+import threading
+import time
+import numpy as np
+
+# Upper bounds of the histogram buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.0075, 0.01, 0.015, 0.02,
+                   0.033, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=1024):
+        """
+        Latency histogram of one stage.
+
+        Bucket counts are cumulative, as Prometheus expects, while the
+        percentiles are computed over a rolling window of the latest samples.
+
+        :param buckets: Upper bounds of the buckets in seconds.
+        :param window: Number of latest samples kept for the percentiles.
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._samples = np.zeros(window, dtype=np.float64)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        """
+        Record a duration.
+
+        :param seconds: Duration in seconds.
+        """
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._samples[self.count % len(self._samples)] = seconds
+            self.count += 1
+            self.sum += seconds
+
+    def cumulative_counts(self):
+        """
+        Get the number of samples at or below each bucket bound, the last
+        value being the total count (the +Inf bucket).
+        """
+        with self._lock:
+            counts = list(self._counts)
+        return list(np.cumsum(counts))
+
+    def summary(self):
+        """
+        Summarize the rolling window.
+
+        :return: Dictionary with the count and the window statistics in ms.
+        """
+        with self._lock:
+            count, total = self.count, self.sum
+            samples = self._samples[:min(count, len(self._samples))].copy()
+        if not len(samples):
+            return {"count": 0}
+        p50, p95, p99 = np.percentile(samples, (50, 95, 99)) * 1000
+        return {
+            "count": count,
+            "total_s": total,
+            "mean_ms": float(samples.mean() * 1000),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(samples.max() * 1000),
+        }
+
+
+class ClientStats:
+    def __init__(self, client_id, address=None, tier=None):
+        """
+        Counters of one stream client.
+
+        :param client_id: Identifier of the client, unique per stream.
+        :param address: Remote address of the client.
+        :param tier: Encode settings of the client.
+        """
+        self.client_id = client_id
+        self.address = address
+        self.tier = tier
+        self.connected = time.time()
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+
+    def as_dict(self):
+        return {
+            "id": self.client_id,
+            "address": self.address,
+            "tier": self.tier._asdict() if hasattr(self.tier, "_asdict") else self.tier,
+            "connected_s": time.time() - self.connected,
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "dropped": self.dropped,
+        }
+
+
+class StreamMetrics:
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS, window=1024):
+        """
+        Registry of the stage histograms, client counters and gauges.
+
+        Instrumented code checks `enabled` before reading the clock, so
+        disabled metrics cost one attribute lookup per stage.
+
+        :param enabled: Whether the stages are timed (default is True).
+        :param buckets: Upper bounds of the histogram buckets in seconds.
+        :param window: Number of latest samples kept for the percentiles.
+        """
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._clients = {}
+        self._gauges = {}
+        self._counters = {}
+        self._descriptions = {}  # Help text of the counters
+        self._next_client_id = 0
+        # Totals of the disconnected clients, so the counters never decrease
+        self._closed_totals = {"frames": 0, "bytes": 0, "dropped": 0}
+
+    def stage(self, name):
+        """
+        Get the histogram of a stage, creating it on first use.
+
+        :param name: Name of the stage, e.g. "capture", "encode" or
+                     "filter:minimize_colors".
+        :return: Histogram of the stage.
+        """
+        histogram = self._stages.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.get(name)
+                if histogram is None:
+                    histogram = self._stages[name] = Histogram(self.buckets, self.window)
+        return histogram
+
+    def observe(self, name, seconds):
+        """
+        Record the duration of a stage.
+        """
+        self.stage(name).observe(seconds)
+
+    def counter(self, name, help_text):
+        """
+        Register a counter, so it is exported from 0 with a description.
+
+        :param name: Name of the counter, without the camera_stream_ prefix
+                     and the _total suffix, e.g. "unchanged_frames".
+        :param help_text: Description of the counter.
+        """
+        with self._lock:
+            self._descriptions[name] = help_text
+            self._counters.setdefault(name, 0)
+
+    def count(self, name, value=1):
+        """
+        Add to a counter, creating it on first use.
+
+        :param name: Name of the counter, without the camera_stream_ prefix
+                     and the _total suffix, e.g. "unchanged_frames".
+        :param value: Value to add, 1 by default.
+        """
+        if value < 0:
+            raise ValueError(f"Counter '{name}' can only increase.")
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, func, help_text=""):
+        """
+        Register a value read when the metrics are exported.
+
+        :param name: Name of the metric, without the camera_stream_ prefix.
+        :param func: Function returning the current value.
+        :param help_text: Description of the metric.
+        """
+        self._gauges[name] = (func, help_text)
+
+    def add_client(self, address=None, tier=None):
+        """
+        Register a connected client.
+
+        :return: Counters of the client.
+        """
+        with self._lock:
+            self._next_client_id += 1
+            client = self._clients[self._next_client_id] = ClientStats(
+                self._next_client_id, address, tier
+            )
+        return client
+
+    def remove_client(self, client):
+        """
+        Unregister a disconnected client, keeping its counts in the totals.
+        """
+        with self._lock:
+            if self._clients.pop(client.client_id, None) is not None:
+                self._closed_totals["frames"] += client.frames
+                self._closed_totals["bytes"] += client.bytes
+                self._closed_totals["dropped"] += client.dropped
+
+    def _client_totals(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            totals = dict(self._closed_totals)
+        for client in clients:
+            totals["frames"] += client.frames
+            totals["bytes"] += client.bytes
+            totals["dropped"] += client.dropped
+        return clients, totals
+
+    def snapshot(self):
+        """
+        Get every metric as a JSON-serializable dictionary.
+        """
+        with self._lock:
+            stages = dict(self._stages)
+            counters = dict(self._counters)
+        clients, totals = self._client_totals()
+        return {
+            "enabled": self.enabled,
+            "stages": {name: histogram.summary() for name, histogram in sorted(stages.items())},
+            "clients": [client.as_dict() for client in clients],
+            "totals": totals,
+            "counters": counters,
+            "gauges": {name: func() for name, (func, _) in self._gauges.items()},
+        }
+
+    def prometheus(self):
+        """
+        Get every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            stages = dict(self._stages)
+            counters = dict(self._counters)
+            descriptions = dict(self._descriptions)
+
+        lines += [
+            "# HELP camera_stream_stage_seconds Duration of a stage of the frame pipeline.",
+            "# TYPE camera_stream_stage_seconds histogram",
+        ]
+        for name, histogram in sorted(stages.items()):
+            counts = histogram.cumulative_counts()
+            label = f'stage="{_escape_label(name)}"'
+            for bound, count in zip(histogram.buckets, counts):
+                lines.append(f'camera_stream_stage_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'camera_stream_stage_seconds_bucket{{{label},le="+Inf"}} {counts[-1]}')
+            lines.append(f"camera_stream_stage_seconds_sum{{{label}}} {histogram.sum}")
+            lines.append(f"camera_stream_stage_seconds_count{{{label}}} {histogram.count}")
+
+        clients, totals = self._client_totals()
+        for key, metric, help_text in (
+                ("frames", "sent_frames", "Frames sent to the clients."),
+                ("bytes", "sent_bytes", "Bytes sent to the clients."),
+                ("dropped", "dropped_frames", "Frames skipped by slow clients.")):
+            lines += [f"# HELP camera_stream_{metric}_total {help_text}",
+                      f"# TYPE camera_stream_{metric}_total counter",
+                      f"camera_stream_{metric}_total {totals[key]}",
+                      f"# HELP camera_stream_client_{metric} {help_text[:-1]}, per connected client.",
+                      f"# TYPE camera_stream_client_{metric} gauge"]
+            for client in clients:
+                lines.append(f'camera_stream_client_{metric}{{client="{client.client_id}"}} '
+                             f'{getattr(client, key)}')
+
+        for name, value in sorted(counters.items()):
+            metric = f"camera_stream_{name}_total"
+            if name in descriptions:
+                lines.append(f"# HELP {metric} {descriptions[name]}")
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+        lines += [
+            "# HELP camera_stream_clients Number of connected clients.",
+            "# TYPE camera_stream_clients gauge",
+            f"camera_stream_clients {len(clients)}",
+        ]
+        for name, (func, help_text) in self._gauges.items():
+            metric = f"camera_stream_{name}"
+            if help_text:
+                lines.append(f"# HELP {metric} {help_text}")
+            lines += [f"# TYPE {metric} gauge", f"{metric} {func()}"]
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
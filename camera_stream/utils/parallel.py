@@ -0,0 +1,178 @@
+"""
+Worker pool processing several frames concurrently with ordered output.
+"""
+
+import queue
+import threading
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .shared_frames import SharedFramePool, SharedState, _run_in_slot, _run_with_state
+
+
+class OrderedFramePool:
+    # Returned by get() in place of a frame queued with repeat()
+    REPEATED = object()
+
+    def __init__(self, process, workers, use_processes=False,
+                 initializer=None, initargs=(), max_pending=None,
+                 shared_memory=False, hold=3, shared_state=False):
+        """
+        Initialize the pool.
+
+        Frames are submitted by the capture stage, processed concurrently by
+        the workers, and handed to the encode stage in submission order.
+        Both sides are connected by a bounded queue of pending frames.
+
+        :param process: Function processing a frame. It must be picklable
+                        (a module-level function) when using processes.
+        :param workers: Number of worker threads or processes.
+        :param use_processes: Use a process pool instead of a thread pool,
+                              for filters that hold the GIL.
+        :param initializer: Optional function called once in every worker.
+        :param initargs: Arguments of the initializer.
+        :param max_pending: Maximum number of frames in flight (default is
+                            twice the number of workers).
+        :param shared_memory: Send frames to worker processes through a
+                              SharedFramePool instead of pickling them.
+        :param hold: Number of extra shared-memory slots for the returned
+                     frames still referenced by clients. A slot is reused
+                     once no client references its frame; when every slot
+                     is in use, frames are pickled instead.
+        :param shared_state: Pass the value of publish() to the process
+                             function of worker processes as second
+                             argument, through a SharedState rather than
+                             with every frame.
+        """
+        self.process = process
+        self.workers = max(1, int(workers))
+        self.use_processes = use_processes
+        self.initializer = initializer
+        self.initargs = initargs
+        self.max_pending = max_pending or self.workers * 2
+        self._executor = None
+        self._slots = None
+        self._pending = None
+        self.shared_memory = shared_memory and use_processes
+        self.hold = hold
+        self.transport = None
+        self.shared_state = shared_state and use_processes
+        self.state = None
+        self.dropped = 0
+
+    def start(self):
+        """
+        Start the workers.
+        """
+        executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        self._executor = executor_class(
+            max_workers=self.workers,
+            initializer=self.initializer,
+            initargs=self.initargs,
+        )
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = queue.Queue()
+        if self.shared_state:
+            self.state = SharedState()
+
+    def publish(self, value):
+        """
+        Publish the value the workers get with the next frames they process.
+
+        :param value: Picklable value.
+        """
+        self.state.publish(value)
+
+    def submit(self, frame, timeout=1.0):
+        """
+        Submit a frame to the workers.
+
+        :param frame: Frame to process.
+        :param timeout: Maximum time to wait for a free slot in seconds.
+        :return: True if the frame was submitted, False if it was dropped
+                 because the workers are falling behind.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            self.dropped += 1
+            return False
+
+        if self.shared_memory and self.transport is None:
+            # Sized on the first frame; enough slots for the frames in
+            # flight and the ones held for the clients
+            self.transport = SharedFramePool(
+                self.max_pending + self.hold + 1, frame.shape, frame.dtype
+            )
+
+        payload = None
+        if self.transport is not None and self.transport.fits(frame):
+            payload = self.transport.put(frame)
+
+        process = self.process
+        if self.state is not None:
+            process = functools.partial(_run_with_state, process, self.state.descriptor)
+
+        # Futures are queued in submission order, which is the output order
+        if payload is not None:
+            process = functools.partial(_run_in_slot, process, self.transport.descriptor)
+            self._pending.put((self._executor.submit(process, payload), payload[0]))
+        else:
+            self._pending.put((self._executor.submit(process, frame), None))
+        return True
+
+    def repeat(self):
+        """
+        Queue a repeat of the previous frame in submission order, for a
+        frame that did not change, without sending it to the workers.
+        """
+        self._pending.put((None, None))
+
+    def get(self, timeout=1.0):
+        """
+        Get the next processed frame in submission order.
+
+        :param timeout: Maximum time to wait for a frame in seconds.
+        :return: The processed frame, REPEATED for a frame queued with
+                 repeat(), or None on timeout.
+        """
+        try:
+            future, slot = self._pending.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if future is None:
+            return self.REPEATED
+
+        try:
+            result = future.result()
+        except BaseException:
+            if slot is not None:
+                self.transport.release(slot)
+            raise
+        finally:
+            self._slots.release()
+
+        if slot is None:
+            return result
+        if not isinstance(result, tuple):
+            # The result did not fit in the slot and was sent back pickled
+            self.transport.release(slot)
+            return result
+
+        # The slot is released once the frame and every view of it are
+        # dropped: by the frame buffer, the clients and the encoders
+        frame = self.transport.view(slot, result[1])
+        weakref.finalize(frame, self.transport.release, slot)
+        return frame
+
+    def close(self):
+        """
+        Stop the workers and drop the pending frames.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        if self.state is not None:
+            self.state.close()
+            self.state = None
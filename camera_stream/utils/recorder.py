@@ -0,0 +1,407 @@
+"""
+Instant-replay buffer and recorder of the processed stream.
+"""
+
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+from .jpeg_cache import EncodeSettings
+
+# Output formats: "avi" is decoded and written by cv2.VideoWriter as MJPG,
+# "mjpeg" appends the JPEG bytes as they are
+FORMATS = ("avi", "mjpeg")
+
+# Shortest segment of a recording, so a file is never opened per frame
+MIN_SEGMENT_SECONDS = 1.0
+
+
+class _VideoFile:
+    def __init__(self, path, fmt, fps):
+        """
+        Output file the writer thread appends JPEG frames to.
+        """
+        self.path = path
+        self.format = fmt
+        self.fps = fps
+        self.frames = 0
+        self._file = None
+        self._writer = None
+        self._size = None
+
+    def write(self, jpeg):
+        if self.format == "mjpeg":
+            if self._file is None:
+                self._file = open(self.path, "wb")
+            self._file.write(jpeg)
+        else:
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                return
+            if self._writer is None:
+                self._size = (frame.shape[1], frame.shape[0])
+                self._writer = cv2.VideoWriter(
+                    self.path, cv2.VideoWriter_fourcc(*"MJPG"), self.fps, self._size
+                )
+            elif (frame.shape[1], frame.shape[0]) != self._size:
+                frame = cv2.resize(frame, self._size)
+            self._writer.write(frame)
+        self.frames += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+
+class Recorder:
+    def __init__(self, frame_buffer, jpeg_cache, max_bytes=0, directory="recordings",
+                 replay_seconds=30.0, fps=30.0, max_pending=300, trigger=None):
+        """
+        Record the published frames without slowing down the live stream.
+
+        A recorder thread subscribes to the frame buffer like a client,
+        gets the JPEG of each frame from the shared cache, so frames are
+        encoded once for the viewers and the recorder, and keeps them in a
+        replay ring bounded by its size in bytes. Files are only written by
+        a separate writer thread: saving a replay hands it references to
+        the buffered JPEGs, and a recording hands it each new frame through
+        a bounded queue, dropping frames rather than waiting for the disk.
+
+        :param frame_buffer: FrameBuffer of the processed frames.
+        :param jpeg_cache: EncodedFrameCache shared with the clients.
+        :param max_bytes: Size of the replay ring in bytes (default is 0 to
+                          disable instant replays).
+        :param directory: Directory of the saved files (default is "recordings").
+        :param replay_seconds: Default duration of a replay in seconds.
+        :param fps: Frame rate of the AVI files when it cannot be measured.
+        :param max_pending: Frames of a recording waiting for the writer
+                            thread before new ones are dropped.
+        :param trigger: Optional callable polled once per frame, saving a
+                        replay when it returns True, e.g. a KeyTrigger.
+        """
+        self.frame_buffer = frame_buffer
+        self.jpeg_cache = jpeg_cache
+        self.max_bytes = int(max_bytes)
+        self.directory = directory
+        self.replay_seconds = replay_seconds
+        self.fps = fps
+        self.trigger = trigger
+        self.settings = EncodeSettings()
+
+        self._lock = threading.Lock()
+        self._ring = deque()  # (timestamp, jpeg) of the buffered frames
+        self._ring_bytes = 0
+        self._times = deque(maxlen=60)  # Times of the latest frames, for the frame rate
+        self._jobs = queue.Queue()
+        self.max_pending = max_pending
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._writer_thread = None
+        self._recording = None  # (path, format, segment_seconds) while recording
+        self._paths = set()  # Paths handed out, possibly not written yet
+        self.recorded_frames = 0
+        self.dropped_frames = 0
+        self.saved = []  # Paths of the finished files
+        self.errors = 0
+
+    @property
+    def buffering(self):
+        return self.max_bytes > 0
+
+    @property
+    def recording(self):
+        return self._recording is not None
+
+    def start(self, settings=None):
+        """
+        Start the recorder and writer threads.
+
+        :param settings: EncodeSettings of the recorded JPEGs (default is
+                         the default settings).
+        """
+        if self._running:
+            return
+        if settings is not None:
+            self.settings = settings
+        self._running = True
+        self._thread = threading.Thread(target=self._record_frames, name="recorder")
+        self._thread.daemon = True
+        self._writer_thread = threading.Thread(target=self._write_files, name="recorder-writer")
+        self._writer_thread.daemon = True
+        self._thread.start()
+        self._writer_thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Stop the threads after the pending files are written.
+
+        :param timeout: Maximum time to wait for the writer thread in seconds.
+        """
+        if not self._running:
+            return
+        if self.recording:
+            self.stop_recording()
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self._jobs.put(None)  # Sentinel, after the pending jobs
+        if self._writer_thread is not None:
+            self._writer_thread.join(timeout=timeout)
+            self._writer_thread = None
+
+    def _path(self, prefix, fmt):
+        """
+        Get a new file path in the directory, e.g. replay_20250412-213000.avi.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{prefix}_{time.strftime('%Y%m%d-%H%M%S')}"
+        path = os.path.join(self.directory, f"{name}.{fmt}")
+        index = 1
+        with self._lock:
+            while path in self._paths or os.path.exists(path):
+                path = os.path.join(self.directory, f"{name}-{index}.{fmt}")
+                index += 1
+            self._paths.add(path)
+        return path
+
+    def save_replay(self, seconds=None, fmt="avi"):
+        """
+        Save the last seconds of the replay ring in the background.
+
+        :param seconds: Duration to save (default is replay_seconds).
+        :param fmt: "avi" or "mjpeg" (see FORMATS).
+        :return: Path of the file being written.
+        """
+        if not self.buffering:
+            raise RuntimeError("The replay buffer is disabled.")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format '{fmt}'.")
+        seconds = self.replay_seconds if seconds is None else float(seconds)
+        with self._lock:
+            frames = list(self._ring)
+        if frames:
+            newest = frames[-1][0]
+            frames = [item for item in frames if item[0] >= newest - seconds]
+        if not frames:
+            raise RuntimeError("The replay buffer is empty.")
+
+        path = self._path("replay", fmt)
+        # The writer thread gets references to the JPEGs, nothing is copied
+        self._jobs.put(("replay", path, fmt, frames))
+        return path
+
+    def start_recording(self, fmt="avi", segment_seconds=None):
+        """
+        Record every new frame until stop_recording().
+
+        :param fmt: "avi" or "mjpeg" (see FORMATS).
+        :param segment_seconds: Start a new file every so many seconds, at
+                                least MIN_SEGMENT_SECONDS (default is None
+                                for a single file).
+        :return: Path of the first file.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format '{fmt}'.")
+        if segment_seconds is not None and \
+                not (math.isfinite(segment_seconds) and segment_seconds >= MIN_SEGMENT_SECONDS):
+            raise ValueError(f"The segment must be at least {MIN_SEGMENT_SECONDS:.1f} seconds.")
+        if self.recording:
+            raise RuntimeError("Already recording.")
+        path = self._path("recording", fmt)
+        with self._lock:
+            if self._recording is not None:
+                raise RuntimeError("Already recording.")
+            self._recording = (path, fmt, segment_seconds)
+        self._wake.set()
+        return path
+
+    def stop_recording(self):
+        """
+        Stop recording. The writer thread closes the file once it wrote
+        the pending frames.
+
+        :return: Path of the first file of the recording.
+        """
+        with self._lock:
+            recording, self._recording = self._recording, None
+        if recording is None:
+            raise RuntimeError("Not recording.")
+        self._jobs.put(("stop", recording))
+        return recording[0]
+
+    def _record_frames(self):
+        """
+        Recorder thread: get the JPEG of each published frame, buffer it,
+        and pass it to the writer thread while recording.
+        """
+        subscription = None
+        settings = None  # Tier of the recorded JPEGs while subscribed
+        try:
+            while self._running:
+                if not self.buffering and not self.recording:
+                    # Nothing to record: do not subscribe to the frames
+                    if subscription is not None:
+                        self.frame_buffer.unsubscribe(subscription)
+                        subscription = None
+                        self.jpeg_cache.close_tier(settings)
+                    self._wake.wait(0.5)
+                    self._wake.clear()
+                    continue
+                if subscription is None:
+                    subscription = self.frame_buffer.subscribe()
+                    settings = self.jpeg_cache.open_tier(self.settings, self.settings)
+
+                item = subscription.get()
+                if item is None:
+                    if subscription.closed:
+                        subscription = None
+                        self.jpeg_cache.close_tier(settings)
+                        time.sleep(0.1)  # The stream is stopping or restarting
+                    continue
+                sequence, frame, captured = item
+                jpeg = self.jpeg_cache.get_jpeg(sequence, frame, settings)
+                timestamp = captured if captured is not None else time.time()
+                self._add(timestamp, jpeg)
+
+                recording = self._recording
+                if recording is not None:
+                    # Drop the frame rather than wait for the disk
+                    if self._jobs.qsize() < self.max_pending:
+                        self._jobs.put(("frame", recording, timestamp, jpeg))
+                        self.recorded_frames += 1
+                    else:
+                        self.dropped_frames += 1
+
+                if self.trigger is not None and self.buffering and self.trigger():
+                    try:
+                        print(f"Saving replay to {self.save_replay()}")
+                    except RuntimeError as e:
+                        print(f"Could not save replay: {e}")
+        except Exception as e:
+            print(f"Error recording frame: {e}")
+        finally:
+            if subscription is not None:
+                self.frame_buffer.unsubscribe(subscription)
+                self.jpeg_cache.close_tier(settings)
+
+    def _add(self, timestamp, jpeg):
+        """
+        Append a frame to the replay ring, evicting the oldest frames over
+        max_bytes.
+        """
+        with self._lock:
+            self._times.append(timestamp)
+            if not self.buffering:
+                return
+            self._ring.append((timestamp, jpeg))
+            self._ring_bytes += len(jpeg)
+            while self._ring_bytes > self.max_bytes and len(self._ring) > 1:
+                _, evicted = self._ring.popleft()
+                self._ring_bytes -= len(evicted)
+
+    def _measured_fps(self):
+        """
+        Frame rate of the latest frames, or the default fps.
+        """
+        with self._lock:
+            times = list(self._times)
+        if len(times) > 1 and times[-1] > times[0]:
+            return (len(times) - 1) / (times[-1] - times[0])
+        return self.fps
+
+    def _write_files(self):
+        """
+        Writer thread: the only thread touching the disk.
+        """
+        output = None
+        segment_start = None
+        segment = 0
+        stopped = set()  # Recordings whose last frames may still be queued
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            try:
+                if job[0] == "replay":
+                    _, path, fmt, frames = job
+                    fps = (len(frames) - 1) / (frames[-1][0] - frames[0][0]) \
+                        if len(frames) > 1 and frames[-1][0] > frames[0][0] else self.fps
+                    video = _VideoFile(path, fmt, fps)
+                    try:
+                        for _, jpeg in frames:
+                            video.write(jpeg)
+                    finally:
+                        video.close()
+                    self.saved.append(path)
+                elif job[0] == "frame":
+                    _, recording, timestamp, jpeg = job
+                    if recording in stopped:
+                        continue
+                    path, fmt, segment_seconds = recording
+                    if output is not None and segment_seconds and \
+                            timestamp - segment_start >= segment_seconds:
+                        output.close()
+                        self.saved.append(output.path)
+                        output = None
+                        segment += 1
+                    if output is None:
+                        if segment_start is None:
+                            segment = 0
+                        segment_start = timestamp
+                        root, extension = os.path.splitext(path)
+                        segment_path = path if segment == 0 else f"{root}_{segment:03d}{extension}"
+                        # The frame rate of an AVI is fixed when it is opened
+                        output = _VideoFile(segment_path, fmt, self._measured_fps())
+                    output.write(jpeg)
+                elif job[0] == "stop":
+                    stopped.add(job[1])
+                    if output is not None:
+                        output.close()
+                        self.saved.append(output.path)
+                    output = None
+                    segment_start = None
+            except Exception as e:
+                self.errors += 1
+                print(f"Error writing recording: {e}")
+
+        if output is not None:
+            output.close()
+            self.saved.append(output.path)
+
+    def status(self):
+        """
+        Get the state of the replay ring and of the recording.
+
+        :return: Dictionary for /recorder.
+        """
+        with self._lock:
+            frames = len(self._ring)
+            size = self._ring_bytes
+            seconds = self._ring[-1][0] - self._ring[0][0] if frames > 1 else 0.0
+            recording = self._recording
+        return {
+            "replay": {
+                "enabled": self.buffering,
+                "frames": frames,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "seconds": seconds,
+            },
+            "recording": recording[0] if recording is not None else None,
+            "recorded_frames": self.recorded_frames,
+            "dropped_frames": self.dropped_frames,
+            "pending_frames": self._jobs.qsize(),
+            "saved": self.saved[-10:],
+            "errors": self.errors,
+        }
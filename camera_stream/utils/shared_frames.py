@@ -0,0 +1,259 @@
+"""
+Shared-memory frame pool used to hand frames to worker processes
+without pickling them, and shared state published to them.
+"""
+
+import pickle
+import queue
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class SharedFramePool:
+    def __init__(self, slots, shape, dtype=np.uint8, name=None):
+        """
+        Create a pool of frame slots in one shared-memory block, or attach
+        to an existing one when `name` is given.
+
+        Only slot indices and shape metadata cross the process boundary;
+        both sides read and write NumPy views of the slots in place.
+
+        :param slots: Number of frame slots.
+        :param shape: Largest frame shape a slot can hold, e.g. (1080, 1920, 3).
+        :param dtype: Data type of the frames (default is uint8).
+        :param name: Name of an existing pool to attach to (default is None
+                     to create a new pool).
+        """
+        self.slots = int(slots)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slot_size = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.owner = name is None
+
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=self.slot_size * self.slots)
+            self._free = queue.Queue()
+            for slot in range(self.slots):
+                self._free.put(slot)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._free = None
+
+    @property
+    def descriptor(self):
+        """
+        Picklable description of the pool, to attach to it from a worker.
+        """
+        return (self._shm.name, self.slots, self.shape, self.dtype.str)
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        Attach to a pool created by another process.
+
+        :param descriptor: Descriptor of the pool.
+        :return: Attached frame pool.
+        """
+        name, slots, shape, dtype = descriptor
+        return cls(slots, shape, dtype, name=name)
+
+    def view(self, slot, shape=None):
+        """
+        Get a NumPy view of a slot.
+
+        :param slot: Index of the slot.
+        :param shape: Shape of the frame in the slot (default is the pool shape).
+        :return: Array backed by the shared memory.
+        """
+        shape = self.shape if shape is None else tuple(shape)
+        count = int(np.prod(shape))
+        if count * self.dtype.itemsize > self.slot_size:
+            raise ValueError(f"Frame of shape {shape} does not fit in a slot of shape {self.shape}.")
+        return np.ndarray(shape, dtype=self.dtype, buffer=self._shm.buf,
+                          offset=slot * self.slot_size)
+
+    def acquire(self, timeout=None):
+        """
+        Take a free slot. Only the process that created the pool manages slots.
+
+        :param timeout: Maximum time to wait in seconds (default is None to
+                        wait forever, 0 to not wait).
+        :return: Index of the slot, or None if no slot is free.
+        """
+        try:
+            if timeout == 0:
+                return self._free.get_nowait()
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, slot):
+        """
+        Return a slot to the pool.
+
+        :param slot: Index of the slot.
+        """
+        self._free.put(slot)
+
+    def put(self, frame, timeout=0):
+        """
+        Copy a frame into a free slot.
+
+        :param frame: Frame to share.
+        :param timeout: Maximum time to wait for a free slot in seconds.
+        :return: Tuple of (slot, shape) to send to a worker, or None if no
+                 slot is free.
+        """
+        slot = self.acquire(timeout)
+        if slot is None:
+            return None
+        np.copyto(self.view(slot, frame.shape), frame)
+        return slot, frame.shape
+
+    def fits(self, frame):
+        """
+        Check whether a frame fits in a slot of the pool.
+        """
+        return frame.dtype == self.dtype and frame.nbytes <= self.slot_size
+
+    def close(self):
+        """
+        Detach from the pool, and free it if this process created it.
+        """
+        try:
+            self._shm.close()
+        except BufferError:
+            # Views of the slots are still in use, the memory is released
+            # with the last one
+            pass
+        if self.owner:
+            self._shm.unlink()
+
+
+class SharedState:
+    # seq is odd while the parent writes the value, length is its size
+    HEADER_DTYPE = np.dtype([("seq", "<u8"), ("length", "<u8")])
+
+    def __init__(self, size=1 << 20, name=None):
+        """
+        Latest value of a picklable object, published by the parent process
+        and read by the worker processes, so a value that rarely changes is
+        not sent with every task.
+
+        The value is pickled into one shared-memory block behind a seqlock
+        counter. Workers only unpickle it again when the counter changed.
+
+        :param size: Largest size of the pickled value in bytes (default
+                     is 1 MiB).
+        :param name: Name of an existing state to attach to (default is None
+                     to create a new state).
+        """
+        self.owner = name is None
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True,
+                                                   size=self.HEADER_DTYPE.itemsize + size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._header = np.ndarray((), self.HEADER_DTYPE, buffer=self._shm.buf)
+        self.size = self._shm.size - self.HEADER_DTYPE.itemsize
+        self._seq = None  # Counter of the cached value, in a worker
+        self._value = None
+
+    @property
+    def descriptor(self):
+        """
+        Picklable description of the state, to attach to it from a worker.
+        """
+        return self._shm.name
+
+    def publish(self, value):
+        """
+        Replace the value. Only the process that created the state writes.
+
+        :param value: Picklable value.
+        :raises ValueError: If the pickled value is larger than the state.
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.size:
+            raise ValueError(f"State of {len(data)} bytes does not fit in {self.size} bytes.")
+        start = self.HEADER_DTYPE.itemsize
+        self._header["seq"] += 1
+        self._shm.buf[start:start + len(data)] = data
+        self._header["length"] = len(data)
+        self._header["seq"] += 1
+
+    def read(self):
+        """
+        Get the latest value, or None before the first one.
+        """
+        start = self.HEADER_DTYPE.itemsize
+        while True:
+            seq = int(self._header["seq"])
+            if seq == self._seq:
+                return self._value
+            if seq == 0:
+                return None
+            if seq % 2:
+                continue  # The parent is writing
+            data = bytes(self._shm.buf[start:start + int(self._header["length"])])
+            if int(self._header["seq"]) == seq:
+                self._seq, self._value = seq, pickle.loads(data)
+                return self._value
+
+    def close(self):
+        """
+        Detach from the state, and free it if this process created it.
+        """
+        self._header = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+
+# Pools and states attached by a worker process, by name
+_attached_pools = {}
+_attached_states = {}
+
+
+def _run_with_state(process, name, frame):
+    """
+    Run a frame function in a worker process with the latest value of a
+    SharedState as second argument.
+
+    :param process: Module-level function taking a frame and the value.
+    :param name: Descriptor of the SharedState.
+    :param frame: Frame to process.
+    :return: Processed frame.
+    """
+    state = _attached_states.get(name)
+    if state is None:
+        state = _attached_states[name] = SharedState(name=name)
+    return process(frame, state.read())
+
+
+def _run_in_slot(process, descriptor, payload):
+    """
+    Run a frame function in a worker process on a shared-memory slot.
+
+    The result is written back into the same slot, so only the slot index
+    and the shape are sent back to the parent process. A result that does
+    not fit in the slot, e.g. a larger frame or another dtype, is returned
+    as is and pickled.
+
+    :param process: Module-level function processing a frame.
+    :param descriptor: Descriptor of the SharedFramePool.
+    :param payload: Tuple of (slot, shape) returned by SharedFramePool.put().
+    :return: Tuple of (slot, shape) of the processed frame, or the frame.
+    """
+    pool = _attached_pools.get(descriptor[0])
+    if pool is None:
+        pool = _attached_pools[descriptor[0]] = SharedFramePool.attach(descriptor)
+
+    slot, shape = payload
+    frame = pool.view(slot, shape)
+    result = process(frame)
+    if result is not frame:
+        if not pool.fits(result):
+            return result
+        np.copyto(pool.view(slot, result.shape), result)
+    return slot, result.shape